@@ -1,12 +1,25 @@
 import sys
 import os
 import re
+import time
 import logging
-import shelve
-import pickle
-from collections import deque
+import dbm
+from collections import deque, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from extgfa.bfs import bfs
-import extgfa.utilities
+from extgfa.region_index import RegionIndex, node_interval
+from extgfa.gfa_paths import PathIndex
+from extgfa.distance_index import DistanceIndex, chunk_dijkstra
+from extgfa.bubble_index import BubbleIndex
+from extgfa.node_index import ShelveNodeIndex, SqliteNodeIndex, read_node_table
+from extgfa.node_filter import NodeFilter
+from extgfa.container import Container
+from extgfa.chunk_index import read_chunk_index, read_chunk_summaries, read_index_flags, SQLITE_FLAG
+from extgfa.chunk_stats import ChunkStats
+from extgfa.chunk_trace import TraceWriter, LOAD
+from extgfa.chunk_tiers import FULL, TOPOLOGY, SUMMARY, hop_distances, strip_node
+import extgfa.sequence_utils
+from extgfa.sequence_utils import node_length
 
 
 logger = logging.getLogger(__name__)
@@ -17,6 +30,7 @@ class Node:
 	def __init__(self, identifier):
 		self.id = identifier  # size is between 28 and 32 bytes
 		self.seq = ""
+		self.seq_len = 0
 		self.start = set()  # 96 bytes for 4 neighbors
 		self.end = set()  # 96 bytes
 		self.visited = False  # 28 bytes (used for bubble and superbubble detection)
@@ -52,32 +66,73 @@ class ChGraph:
 
 	def __init__(self, graph_file):
 		# check for index and db
-		if not graph_file.endswith(".gfa"):
-			logging.error("the graph needs to end with .gfa")
+		if not graph_file.endswith((".gfa", ".xgfa")):
+			logging.error("the graph needs to end with .gfa, or .xgfa for the single-file container")
 			sys.exit(1)
 
 		if not os.path.exists(graph_file):
 			logging.error(f"graph file {graph_file} does not exist")
 			sys.exit(1)
 
-		if not os.path.exists(graph_file[:-4] + ".db"):
-			logger.error(f"Could not find DB associated with {graph_file}\nMake sure this is the chunked graph")
-			sys.exit(1)
-
-		if not os.path.exists(graph_file[:-4] + ".index"):
-			logger.error(f"Could not find the offsets index associated with {graph_file}\nMake sure this is the chunked graph")
-			sys.exit(1)
+		self.container = None
+		if graph_file.endswith(".xgfa"):
+			# everything is in the container, the offsets point directly into the file
+			self.container = Container(graph_file)
+			self.offsets = self.container.chunk_directory()
+			self.node_chunks = None
+			self.node_index = self.container.node_index()
+		else:
+			if not os.path.exists(graph_file[:-4] + ".index"):
+				logger.error(f"Could not find the offsets index associated with {graph_file}\nMake sure this is the chunked graph")
+				sys.exit(1)
+
+			# graphs partitioned with --node-index sqlite have no dbm database, the index records which one was written
+			# depending on the dbm backend, the database can be one or several files with different extensions
+			has_dbm = bool(dbm.whichdb(graph_file[:-4] + ".db"))
+			if read_index_flags(graph_file[:-4] + ".index") & SQLITE_FLAG:
+				sqlite_index = True
+			else:
+				# indices written before the flag existed, when there is no dbm database
+				sqlite_index = not has_dbm and os.path.exists(graph_file[:-4] + ".sqlite")
+			if sqlite_index and not os.path.exists(graph_file[:-4] + ".sqlite") or not sqlite_index and not has_dbm:
+				logger.error(f"Could not find DB associated with {graph_file}\nMake sure this is the chunked graph")
+				sys.exit(1)
 
-		with open(graph_file[:-4] + ".index", "rb") as f:
-			self.offsets = pickle.load(f)
+			self.offsets = read_chunk_index(graph_file[:-4] + ".index")
 
-		self.node_chunks = graph_file[:-4] + ".db"
+			if sqlite_index:
+				self.node_chunks = graph_file[:-4] + ".sqlite"
+				self.node_index = SqliteNodeIndex(self.node_chunks)
+			else:
+				self.node_chunks = graph_file[:-4] + ".db"
+				self.node_index = ShelveNodeIndex(self.node_chunks)
 
 		self.nodes = dict()
 		self.graph_name = graph_file
 
 		self.loaded_c = deque() # newly loaded chunk IDs
 		self.loaded_c_limit = 10
+		# lower residency tiers, see chunk_tiers.py, disabled with a topology_c_limit of 0
+		self.topology_c = deque()  # chunks with only their topology loaded
+		self.topology_c_limit = 0
+		self.summary_c = dict()  # chunk_id: summary of the chunks demoted from topology
+		self.summary_c_limit = 10_000
+		self.focus = set()  # chunk ids of the working set the tiers are driven by, the full chunks when empty
+		self.full_radius = None  # traversals load chunks farther than this from the focus as topology
+		self.focus_range = dict()  # chunk_id: hops from the focus of the chunks kept loaded by set_focus
+		self.prefetcher = None  # thread reading the chunks of the focus range
+		self.prefetching = dict()  # chunk_id: future of the chunk read
+		self.chunk_adjacency = None  # chunk_id: adjacent chunk ids from the distance index, False without the index
+		self.regions = None  # region index, loaded the first time a region is queried
+		self.path_store = None  # P and W paths, loaded the first time a path is needed
+		self.summaries = None  # per-chunk aggregates, read the first time graph-wide statistics are needed
+		self.node_table = None  # node lengths and degrees, opened the first time they are needed
+		self.distances = None  # chunk boundary distance index, opened the first time a distance is queried
+		self.bubble_store = None  # bubble index, opened the first time a bubble is queried
+		self.bloom = None  # Bloom filter of the node ids, opened at the first lookup, False for graphs without it
+		self.chunk_bytes = dict()  # chunk_id: size in bytes of the loaded chunks
+		self.stats = ChunkStats()
+		self.trace = None  # TraceWriter while recording a trace
 
 	def __len__(self):
 		"""
@@ -89,8 +144,12 @@ class ChGraph:
 		"""
 		overloading the string function for printing
 		"""
-		total_len = sum([len(x) for x in self.nodes.values()])
-		return f"The graph has {len(self.nodes)} nodes, and total seq length of {total_len}"
+		stats = self.graph_stats()
+		if stats is None:
+			total_len = sum([len(x) for x in self.nodes.values()])
+			return f"The graph has {len(self.nodes)} loaded nodes, and total seq length of {total_len}"
+		return (f"The graph has {stats['nodes']} nodes ({len(self.nodes)} loaded), {stats['edges']} edges, "
+				f"and total seq length of {stats['bases']}")
 
 
 	def __contains__(self, key):
@@ -103,24 +162,71 @@ class ChGraph:
 		"""
         overloading the bracket operator
         """
+		if self.prefetching and key not in self.nodes:
+			self.install_prefetched()
 		try:
-			return self.nodes[key]
+			node = self.nodes[key]
+			self.stats.access("getitem", True)
+			if self.topology_c and node.chunk_id in self.topology_c:
+				# the sequence and tags are only in the full tier
+				self.load_chunk(node.chunk_id)
+				node = self.nodes[key]
 		except KeyError:
+			self.stats.access("getitem", False)
 			chunk_id = self.get_node_chunk(key)
 			if chunk_id is None:
 				return None
 			self.load_chunk(chunk_id)
-			return self.nodes[key]
+			node = self.nodes[key]
+		if self.trace is not None:
+			self.trace.access(key, node.chunk_id)
+		return node
 
 	def total_seq_length(self):
 		"""
-		returns total sequence length
+		returns total sequence length of the graph, or of the loaded nodes for indices without chunk summaries
 		"""
+		stats = self.graph_stats()
+		if stats is not None:
+			return stats["bases"]
 		total = 0
 		for n in self.nodes.values():
 			total += n.seq_len
 		return total
 
+	def chunk_summaries(self):
+		"""
+		returns the per-chunk aggregates written by the indexer, read the first time they are needed,
+		None for graphs indexed without them
+		"""
+		if self.summaries is None:
+			if self.container is not None:
+				self.summaries = self.container.chunk_summaries()
+			else:
+				self.summaries = read_chunk_summaries(self.graph_name[:-4] + ".index")
+		return self.summaries
+
+	def chunk_summary(self, chunk_id):
+		"""
+		returns the node, edge, base, N base, tip and self-loop counts and the degree histogram of a chunk
+		"""
+		summaries = self.chunk_summaries()
+		if summaries is None:
+			return None
+		return summaries[chunk_id]
+
+	def graph_stats(self):
+		"""
+		returns the graph-wide node, edge, base, N base, tip and self-loop counts and degree histogram
+		(the last bin counting all the higher degrees) from the chunk summaries, without reading any chunk
+		"""
+		summaries = self.chunk_summaries()
+		if summaries is None:
+			return None
+		stats = summaries.total()
+		stats["chunks"] = len(summaries)
+		return stats
+
 	def reset_visited(self):
 		"""
 		resets all nodes.visited to false
@@ -130,88 +236,240 @@ class ChGraph:
 
 	def clear(self):
 		"""
-		removes all nodes from the graph
+		removes all nodes from the graph, with the chunks of every tier, the focus and the pending chunk reads
 		"""
+		self.clear_focus()
+		for future in self.prefetching.values():
+			# already running, the chunk it reads is dropped
+			future.cancel()
+		self.prefetching = dict()
 		del self.nodes
 		self.nodes = dict()
 		self.loaded_c = deque()
+		self.chunk_bytes = dict()
+		self.topology_c = deque()
+		self.summary_c = dict()
+
+	def get_stats(self):
+		"""
+		returns the statistics of the chunk cache since the graph was opened or the last reset_stats()
+		with the current number of resident chunks, nodes and bytes
+		"""
+		stats = self.stats.to_dict()
+		stats["resident_chunks"] = len(self.loaded_c)
+		stats["tiers"] = {FULL: len(self.loaded_c), TOPOLOGY: len(self.topology_c), SUMMARY: len(self.summary_c)}
+		stats["resident_nodes"] = len(self.nodes)
+		stats["resident_bytes"] = sum(self.chunk_bytes.values())
+		return stats
+
+	def start_trace(self, trace_file):
+		"""
+		starts recording the node and chunk accesses into trace_file, to replay them with extgfa cache-sim
+		"""
+		if self.trace is not None:
+			self.stop_trace()
+		self.trace = TraceWriter(trace_file, self.graph_name)
+		for chunk_id, n_bytes in self.chunk_bytes.items():
+			self.trace.size(chunk_id, n_bytes)
+
+	def stop_trace(self):
+		"""
+		stops recording and closes the trace file
+		"""
+		if self.trace is not None:
+			self.trace.close()
+			self.trace = None
+
+	def reset_stats(self):
+		"""
+		resets all the counters and histograms of the chunk cache
+		"""
+		self.stats = ChunkStats(self.stats.recent_window)
 
 	def get_node_chunk(self, node_id):
 		"""
 		returns the chunk id of the node using the database available
 		"""
 		if node_id in self.nodes:
-			return self.nodes[node_id].tags['cid']
+			self.stats.access("node_chunk", True)
+			return self.nodes[node_id].chunk_id
 		else:
-			with shelve.open(self.node_chunks) as node_chunk:
-			# node_chunk = shelve.open(self.node_chunks)
-				try:
-					chunk_id = node_chunk[node_id]
-				except KeyError:
-					return None
-				# node_chunk.close()
-				return chunk_id
+			self.stats.access("node_chunk", False)
+			node_filter = self.node_filter()
+			if node_filter and node_id not in node_filter:
+				self.stats.access("node_filter", True)
+				return None
+			start = time.perf_counter()
+			chunk_id = self.node_index.get(node_id)
+			self.stats.lookup(time.perf_counter() - start)
+			return chunk_id
+
+	def node_filter(self):
+		"""
+		returns the Bloom filter of the node ids of the graph, opening it the first time it is needed,
+		None for graphs indexed without it
+		"""
+		if self.bloom is None:
+			if self.container is not None and "BLOOM" in self.container:
+				self.bloom = NodeFilter(self.graph_name, *self.container.section_range("BLOOM"))
+			elif self.container is None and os.path.exists(self.graph_name[:-4] + ".bloom"):
+				self.bloom = NodeFilter(self.graph_name[:-4] + ".bloom")
+			else:
+				logger.debug("No node filter for this graph, every unknown node is looked up in the index")
+				self.bloom = False
+		return self.bloom or None
+
+	def has_node(self, node_id):
+		"""
+		returns True if the node is in the graph, loaded or not, unlike the in operator that only checks the
+		loaded nodes; node ids not in the graph are mostly answered by the Bloom filter without an index lookup
+		"""
+		if node_id in self.nodes:
+			return True
+		return self.get_node_chunk(node_id) is not None
+
+	def node_info(self, node_id):
+		"""
+		returns the (sequence length, start degree, end degree) of a node from the node table of the index,
+		without loading its chunk, None if the node is not in the graph
+		for graphs indexed without the node table, the chunk of the node is loaded instead
+		"""
+		if node_id in self.nodes:
+			node = self.nodes[node_id]
+			return node_length(node), len(node.start), len(node.end)
+		if self.node_table is None:
+			if self.container is not None:
+				if "NODEINFO" in self.container:
+					self.node_table = self.node_index
+			elif isinstance(self.node_index, SqliteNodeIndex):
+				self.node_table = self.node_index
+			elif os.path.exists(self.graph_name[:-4] + ".nodes"):
+				self.node_table = read_node_table(self.graph_name[:-4] + ".nodes")
+			if self.node_table is None:
+				logger.warning(f"No node table for {self.graph_name}, loading chunks to get node lengths and degrees")
+				self.node_table = False
+		if self.node_table is False:
+			node = self[node_id]
+			if node is None:
+				return None
+			return node_length(node), len(node.start), len(node.end)
+		return self.node_table.node_info(node_id)
+
+	def node_length(self, node_id):
+		"""
+		returns the sequence length of a node without loading its chunk, None if the node is not in the graph
+		"""
+		info = self.node_info(node_id)
+		if info is None:
+			return None
+		return info[0]
+
+	def degree(self, node_id, side=None):
+		"""
+		returns the number of edges of a node without loading its chunk, None if the node is not in the graph
+		:param side: 0 for the start side, 1 for the end side, None for both
+		"""
+		info = self.node_info(node_id)
+		if info is None:
+			return None
+		if side is None:
+			return info[1] + info[2]
+		return info[1 + side]
+
+	def get_node_chunks(self, node_ids):
+		"""
+		returns a dictionary of node_id: chunk_id for many nodes at once, None for the nodes not in the graph
+		the database is only opened once for the whole batch
+		"""
+		chunks = dict()
+		missing = []
+		for node_id in node_ids:
+			if node_id in self.nodes:
+				chunks[node_id] = self.nodes[node_id].chunk_id
+			else:
+				missing.append(node_id)
+		self.stats.access("node_chunk", True, len(chunks))
+		node_filter = self.node_filter()
+		if missing and node_filter:
+			absent = [n for n in missing if n not in node_filter]
+			if absent:
+				self.stats.access("node_filter", True, len(absent))
+				chunks.update(dict.fromkeys(absent))
+				absent = set(absent)
+				missing = [n for n in missing if n not in absent]
+		if missing:
+			self.stats.access("node_chunk", False, len(missing))
+			start = time.perf_counter()
+			chunks.update(self.node_index.get_many(missing))
+			self.stats.lookup(time.perf_counter() - start, len(missing))
+		return chunks
 
 	def neighbors(self, node_id):
 		"""
 		returns all connected nodes to node_id, loads chunks if required
 		"""
 		neighbors = []
-		# node_chunk = shelve.open(self.node_chunks)
+		if self.prefetching and node_id not in self.nodes:
+			self.install_prefetched()
 		try:  # if not loaded, it will through KeyError
 			# self.nodes[node_id]
-			return [x[0] for x in self.nodes[node_id].start] + [x[0] for x in self.nodes[node_id].end]
+			neighbors = [x[0] for x in self.nodes[node_id].start] + [x[0] for x in self.nodes[node_id].end]
+			self.stats.access("neighbors", True)
+			if self.trace is not None:
+				self.trace.access(node_id, self.nodes[node_id].chunk_id)
+			return neighbors
 		except KeyError:
-			with shelve.open(self.node_chunks) as node_chunk:
-				try:
-					new_chunk = node_chunk[node_id]
-				except KeyError:  # node somehow not in database (means bug)
-					logger.error(f"Something went wrong as node {node_id} does not exist in the DB")
-					logger.error(f"Please make sure you are using the correct graph and nothing has been edited")
-					sys.exit()
-				logger.info(f"node {node_id} is not in the graph, loading chunk {new_chunk}")
-				self.load_chunk(new_chunk)
-				return [x[0] for x in self.nodes[node_id].start] + [x[0] for x in self.nodes[node_id].end]
-		
+			self.stats.access("neighbors", False)
+			new_chunk = self.get_node_chunk(node_id)
+			if new_chunk is None:  # node somehow not in database (means bug)
+				logger.error(f"Something went wrong as node {node_id} does not exist in the DB")
+				logger.error(f"Please make sure you are using the correct graph and nothing has been edited")
+				sys.exit()
+			logger.debug(f"node {node_id} is not in the graph, loading chunk {new_chunk}")
+			self.load_chunk(new_chunk, self.traversal_tier(new_chunk))
+			if self.trace is not None:
+				self.trace.access(node_id, new_chunk)
+			return [x[0] for x in self.nodes[node_id].start] + [x[0] for x in self.nodes[node_id].end]
+
 	def children(self, node_id, direction):
 		"""
 		returns the children of a node in given direction
 		"""
-		# node_chunk = shelve.open(self.node_chunks)
-		with shelve.open(self.node_chunks) as node_chunk:
-			if node_id not in self.nodes:  # need to load a chunk
-				# this should never happen
-				new_chunk = node_chunk[node_id]
-				# new_chunk = int(node_id.split("_")[-1])
-				self.load_chunk(new_chunk)
-				# self.loaded_c.append(new_chunk)
-
-			if direction == 0:
-				for nn in self.nodes[node_id].start:
-					if nn[0] not in self.nodes:  # need to load a chunk
-						# I need to load a new chunk
-						# pdb.set_trace()
-						new_chunk = node_chunk[nn[0]]
-						# new_chunk = int(nn[0].split("_")[-1])
-						self.load_chunk(new_chunk)
-						# self.loaded_c.append(new_chunk)
-				# node_chunk.close()
-				return [(x[0], x[1]) for x in self.nodes[node_id].start]
-				# return [x[0] for x in self.nodes[node_id].start]
-			elif direction == 1:
-				for nn in self.nodes[node_id].end:
-					if nn[0] not in self.nodes:
-						# pdb.set_trace()digitalizing
-						new_chunk = node_chunk[nn[0]]
-						# new_chunk = int(nn[0].split("_")[-1])
-						self.load_chunk(new_chunk)
-						# self.loaded_c.append(new_chunk)
-				# node_chunk.close()
-				return [(x[0], x[1]) for x in self.nodes[node_id].end]
-				# return [x[0] for x in self.nodes[node_id].end]
-			else:
-				# node_chunk.close()
-				raise Exception("Trying to access a wrong direction in node {}".format(self.id))
+		if self.prefetching and node_id not in self.nodes:
+			self.install_prefetched()
+		if node_id not in self.nodes:  # need to load a chunk
+			# this should never happen
+			self.stats.access("children", False)
+			chunk_id = self.get_node_chunk(node_id)
+			self.load_chunk(chunk_id, self.traversal_tier(chunk_id))
+		else:
+			self.stats.access("children", True)
+
+		if direction == 0:
+			edges = self.nodes[node_id].start
+		elif direction == 1:
+			edges = self.nodes[node_id].end
+		else:
+			raise Exception("Trying to access a wrong direction in node {}".format(node_id))
+		node_chunk = self.nodes[node_id].chunk_id
+
+		# the chunks of the children that are not loaded yet are looked up all at once
+		missing = [nn[0] for nn in edges if nn[0] not in self.nodes]
+		self.stats.access("child", True, len(edges) - len(missing))
+		new_chunks = dict()
+		if missing:
+			self.stats.access("child", False, len(missing))
+			new_chunks = self.get_node_chunks(missing)
+			for new_chunk in set(new_chunks.values()):
+				self.load_chunk(new_chunk, self.traversal_tier(new_chunk))
+		if self.trace is not None:
+			self.trace.access(node_id, node_chunk)
+			for x in edges:
+				if x[0] in self.nodes:
+					self.trace.access(x[0], self.nodes[x[0]].chunk_id)
+				else:  # evicted while loading the chunks of the other children
+					self.trace.access(x[0], new_chunks.get(x[0]) or self.node_index.get(x[0]))
+		return [(x[0], x[1]) for x in edges]
 
 	def remove_node(self, n_id):
 		"""
@@ -259,16 +517,332 @@ class ChGraph:
 		:param start: starting node for the BFS search
 		:param size: size of the neighborhood to return
 		"""
+		self.stats.access("bfs", start in self.nodes)
 		if start not in self.nodes:
-			with shelve.open(self.node_chunks) as node_chunk:
-				chunk_id = node_chunk[start]
-				logger.warning(f"The start node given to bfs {start} not in the graph, loading its chunk")
-				self.load_chunk(chunk_id)
-				# self.loaded_c.append(chunk_id)
+			chunk_id = self.get_node_chunk(start)
+			logger.warning(f"The start node given to bfs {start} not in the graph, loading its chunk")
+			self.load_chunk(chunk_id, self.traversal_tier(chunk_id))
+			# self.loaded_c.append(chunk_id)
+		if self.trace is not None:
+			self.trace.access(start, self.nodes[start].chunk_id)
 		return bfs(self, start, size)
 		# neighborhood = bfs(self, start, size)
 		# return neighborhood
 
+	def iter_bfs_many(self, seeds, size):
+		"""
+		yields (seed, neighborhood) for many seeds, with the same neighborhoods as bfs
+		the seeds are grouped by chunk and the groups processed in chunk order, not in the order given,
+		so neighborhoods that overlap reuse the same loaded chunks. The chunks a neighborhood reaches are all kept
+		loaded while it is traversed, then the graph is trimmed back to loaded_c_limit before it is yielded,
+		evicting the chunks the neighborhoods of the current seeds did not reach first
+		:param seeds: node ids, the ones not in the graph are skipped with a warning
+		:param size: size of each neighborhood
+		"""
+		seeds = list(dict.fromkeys(seeds))
+		seed_chunks = self.get_node_chunks(seeds)
+		groups = defaultdict(list)
+		for seed in seeds:
+			if seed_chunks[seed] is None:
+				logger.warning(f"The seed {seed} is not in the graph, skipping it")
+				continue
+			groups[seed_chunks[seed]].append(seed)
+		order = sorted(groups, key=lambda chunk_id: self.offsets[chunk_id][0])
+		logger.info(f"Running bfs from {sum(len(g) for g in groups.values())} seeds in {len(order)} chunks")
+
+		limit = self.loaded_c_limit
+		try:
+			for i, chunk_id in enumerate(order):
+				# the next seeds are in the following chunks, and their neighborhoods most likely
+				# overlap with the ones just done, so their chunks are the last to be unloaded
+				touched = {chunk_id}
+				if i + 1 < len(order):
+					touched.add(order[i + 1])
+				for seed in groups[chunk_id]:
+					# a single neighborhood is never evicted while it is traversed
+					self.loaded_c_limit = float("inf")
+					try:
+						neighborhood = self.bfs(seed, size)
+					finally:
+						self.loaded_c_limit = limit
+					touched.update(self.nodes[n].chunk_id for n in neighborhood)
+					self.trim_chunks(keep=touched)
+					yield seed, neighborhood
+		finally:
+			self.loaded_c_limit = limit
+
+	def bfs_many(self, seeds, size, output_file=None, separate=False):
+		"""
+		returns a dictionary of seed: neighborhood for many seeds, see iter_bfs_many
+		:param output_file: if given, the union of the neighborhoods is written to this GFA file
+		:param separate: write each neighborhood to its own file instead, output_file being the prefix
+		of the <prefix>_<seed>.gfa files, the neighborhoods are then not kept and an empty dictionary is returned
+		"""
+		if separate and output_file is None:
+			raise ValueError("An output_file prefix is needed to write the neighborhoods separately")
+		if output_file is not None and output_file.endswith(".gfa"):
+			prefix = output_file[:-4]
+		else:
+			prefix = output_file
+		neighborhoods = dict()
+		for seed, neighborhood in self.iter_bfs_many(seeds, size):
+			if separate:
+				self.write_subgraph(neighborhood, output_file=f"{prefix}_{seed}.gfa")
+			else:
+				neighborhoods[seed] = neighborhood
+		if output_file is not None and not separate:
+			self.write_subgraph(set().union(*neighborhoods.values()), output_file=output_file)
+		return neighborhoods
+
+	def trim_chunks(self, keep=()):
+		"""
+		evicts chunks until there are no more than loaded_c_limit loaded, the oldest ones first
+		and the chunks in keep only once all the others are evicted
+		"""
+		excess = len(self.loaded_c) - self.loaded_c_limit
+		if excess <= 0:
+			return
+		to_unload = [c for c in self.loaded_c if c not in keep] + [c for c in self.loaded_c if c in keep]
+		for chunk_id in to_unload[:excess]:
+			self.evict_chunk(chunk_id)
+
+	def region_index(self):
+		"""
+		returns the region index of the graph, loading it the first time it is needed
+		"""
+		if self.regions is None:
+			if self.container is not None and "REGIONS" in self.container:
+				self.regions = RegionIndex(self.graph_name, *self.container.section_range("REGIONS"))
+				return self.regions
+			index_file = self.graph_name[:-4] + ".regions"
+			if not os.path.exists(index_file):
+				logger.error(f"Could not find the region index {index_file}, the graph needs SN/SO tags to be queried by region")
+				return None
+			self.regions = RegionIndex(index_file)
+		return self.regions
+
+	def extract_region(self, contig, start, end, flank=0, output_file=None, include_alt=True):
+		"""
+		returns the set of node ids in the region contig:start-end (0-based, end excluded) of the stable coordinates
+		only the chunks of the nodes overlapping the region are loaded, and all of them are kept loaded while the
+		subgraph is extracted even if there are more than loaded_c_limit, the graph is trimmed back afterwards
+		:param flank: number of bases added to both sides of the region
+		:param output_file: if given, the subgraph is also written to this GFA file
+		:param include_alt: also add the nodes that do not have coordinates inside the region on this contig,
+		e.g. the alternative alleles of bubbles, by traversing from the region nodes without leaving the region
+		nor entering the rank 0 nodes of another contig
+		"""
+		regions = self.region_index()
+		if regions is None:
+			return set()
+		start = max(0, start - flank)
+		end = end + flank
+		hits = regions.query(contig, start, end)
+		if not hits:
+			logger.warning(f"No nodes found in region {contig}:{start}-{end}")
+			return set()
+
+		limit = self.loaded_c_limit
+		self.loaded_c_limit = float("inf")
+		try:
+			for chunk_id in sorted({x[1] for x in hits}):
+				if chunk_id not in self.loaded_c:
+					self.load_chunk(chunk_id)
+			subgraph = {x[0] for x in hits}
+
+			if include_alt:
+				queue = deque(subgraph)
+				while queue:
+					n = queue.popleft()
+					for nn in self.neighbors(n):
+						if nn in subgraph:
+							continue
+						interval = node_interval(self[nn])
+						if interval is not None and interval[0] == contig:
+							# on the same contig, only the nodes overlapping the region are part of it
+							if interval[2] <= start or interval[1] >= end:
+								continue
+						elif interval is not None and int(self[nn].tags["SR"][1] if "SR" in self[nn].tags else 0) == 0:
+							# the reference backbone of another contig, e.g. through an inter-chromosomal edge
+							continue
+						subgraph.add(nn)
+						queue.append(nn)
+
+			if output_file is not None:
+				self.write_subgraph(subgraph, output_file=output_file)
+		finally:
+			self.loaded_c_limit = limit
+			self.trim_chunks()
+		return subgraph
+
+	def distance_index(self):
+		"""
+		returns the chunk boundary distance index of the graph, opening it the first time it is needed
+		"""
+		if self.distances is None:
+			if self.container is not None and "DISTANCE" in self.container:
+				self.distances = DistanceIndex(self.graph_name, *self.container.section_range("DISTANCE"))
+				return self.distances
+			index_file = self.graph_name[:-4] + ".dist"
+			if not os.path.exists(index_file):
+				logger.error(f"Could not find the distance index {index_file}, re-index the graph to query distances")
+				return None
+			self.distances = DistanceIndex(index_file)
+		return self.distances
+
+	def chunk_walks(self, chunk_id, sources, target=None):
+		"""
+		runs chunk_dijkstra in a chunk, loading it if needed
+		"""
+		if chunk_id not in self.loaded_c:
+			self.load_chunk(chunk_id)
+		return chunk_dijkstra(self.nodes, chunk_id, sources, target)
+
+	def search_walk(self, a, b):
+		"""
+		returns the distance between a and b with the overlay hops of the walk (None for a walk inside the chunk of a),
+		None if there is no walk between them
+		"""
+		index = self.distance_index()
+		if index is None:
+			return None
+		chunks = self.get_node_chunks([a, b])
+		if chunks[a] is None or chunks[b] is None:
+			logger.warning(f"{a} or {b} is not in the graph")
+			return None
+		if a == b:
+			return 0, None
+
+		dist, _, arrival = self.chunk_walks(chunks[a], {(a, 0): 0, (a, 1): 0}, b if chunks[a] == chunks[b] else None)
+		sides_a = index.chunk(chunks[a]).sides
+		seeds = {(chunks[a], i): dist[s] for i, s in enumerate(sides_a) if s in dist}
+		# a walk entering the chunk of b through a side and reaching b is a walk from b leaving through that side
+		dist, _, _ = self.chunk_walks(chunks[b], {(b, 0): 0, (b, 1): 0})
+		sides_b = index.chunk(chunks[b]).sides
+		target_costs = {i: dist[s] for i, s in enumerate(sides_b) if s in dist}
+
+		best, hops = index.search(seeds, chunks[b], target_costs, arrival[0] if arrival is not None else None)
+		if best is None:
+			return None
+		return best, hops
+
+	def distance(self, a, b):
+		"""
+		returns the sequence length between the nodes a and b, the sum of the lengths of the nodes strictly between
+		them on the shortest walk leaving a from either side, 0 for neighbors, None if there is no walk
+		only the chunks of a and b are loaded, the rest of the walk is searched in the distance index
+		"""
+		result = self.search_walk(a, b)
+		if result is None:
+			return None
+		return result[0]
+
+	def shortest_path(self, a, b):
+		"""
+		returns the distance between a and b (see distance) and the shortest walk from a to b like >s1<s2>s3,
+		None if there is no walk
+		the chunks the walk goes through are loaded one after the other to find the nodes of the walk
+		"""
+		result = self.search_walk(a, b)
+		if result is None:
+			return None
+		best, hops = result
+		if a == b:
+			return 0, ">" + a
+
+		def trace(parent, state):
+			states = [state]
+			while state in parent:
+				state = parent[state]
+				states.append(state)
+			return [(">" if side == 1 else "<") + n_id for n_id, side in reversed(states)]
+
+		def arrive(arrival, parent):
+			_, state, side = arrival
+			return trace(parent, state) + [(">" if side == 0 else "<") + b]
+
+		a_chunk = self.get_node_chunk(a)
+		if hops is None:
+			_, parent, arrival = self.chunk_walks(a_chunk, {(a, 0): 0, (a, 1): 0}, b)
+			return best, "".join(arrive(arrival, parent))
+
+		index = self.distance_index()
+		walk = []
+		for chunk_id, entered, left in hops:
+			sides = index.chunk(chunk_id).sides
+			if entered is None:
+				sources = {(a, 0): 0, (a, 1): 0}
+			else:
+				n_id, side = sides[entered]
+				if left is None and n_id == b:
+					walk.append((">" if side == 0 else "<") + b)
+					continue
+				sources = {(n_id, 1 - side): 0}
+			if left is None:
+				_, parent, arrival = self.chunk_walks(chunk_id, sources, b)
+				walk += arrive(arrival, parent)
+			else:
+				_, parent, _ = self.chunk_walks(chunk_id, sources)
+				walk += trace(parent, sides[left])
+		return best, "".join(walk)
+
+	def bubble_index(self):
+		"""
+		returns the bubble index of the graph, opening it the first time it is needed
+		"""
+		if self.bubble_store is None:
+			if self.container is not None and "BUBBLES" in self.container:
+				self.bubble_store = BubbleIndex(self.graph_name, *self.container.section_range("BUBBLES"))
+				return self.bubble_store
+			index_file = self.graph_name[:-4] + ".bubbles"
+			if not os.path.exists(index_file):
+				logger.error(f"Could not find the bubble index {index_file}, the graph needs to be indexed with --bubbles")
+				return None
+			self.bubble_store = BubbleIndex(index_file)
+		return self.bubble_store
+
+	def bubbles_in_chunk(self, chunk_id):
+		"""
+		returns the bubbles with a node in the chunk, from the bubble index without loading the chunk
+		each bubble is a dictionary with its id, source, sink, inside nodes, parent, children, chain and chunks it spans
+		"""
+		index = self.bubble_index()
+		if index is None:
+			return []
+		return index.in_chunk(chunk_id)
+
+	def bubble_of(self, node_id):
+		"""
+		returns the innermost bubble with the node inside, None if the node is not inside a bubble
+		"""
+		index = self.bubble_index()
+		if index is None:
+			return None
+		chunk_id = self.get_node_chunk(node_id)
+		if chunk_id is None:
+			return None
+		bubble_id = index.innermost(chunk_id, node_id)
+		if bubble_id is None:
+			return None
+		return index.bubble(bubble_id)
+
+	def bubble(self, bubble_id):
+		"""
+		returns a bubble of the bubble index by id, e.g. the parent or children of another bubble
+		"""
+		index = self.bubble_index()
+		if index is None:
+			return None
+		return index.bubble(bubble_id)
+
+	def iter_bubbles(self):
+		"""
+		yields all the bubbles of the bubble index, chunk by chunk
+		"""
+		index = self.bubble_index()
+		if index is not None:
+			yield from index
+
 	# def output_chunk(self, chunk_id):
 	# 	"""
 	# 	This function outputs a pickled dict with the chunk's information
@@ -289,6 +863,13 @@ class ChGraph:
 		# in unload, I need to output the chunk again
 		# in case some updates been added to the chunk
 		# self.output_chunk(chunk_id)
+		self.drop_chunk(chunk_id)
+		self.stats.evict(chunk_id)
+
+	def drop_chunk(self, chunk_id):
+		"""
+		removes the nodes of a chunk from the graph, whatever their tier
+		"""
 		to_remove = []
 		for n in self.nodes.values():
 			if n.chunk_id == chunk_id:
@@ -299,26 +880,235 @@ class ChGraph:
 			del self.nodes[n]
 		if chunk_id in self.loaded_c:
 			self.loaded_c.remove(chunk_id)
+		if chunk_id in self.topology_c:
+			self.topology_c.remove(chunk_id)
+		self.chunk_bytes.pop(chunk_id, None)
 
-	def load_chunk(self, chunk_id):
+	def load_chunk(self, chunk_id, tier=FULL):
 		"""
 		this function will read a chunk and update the nodes in the graph
+		:param tier: FULL, or TOPOLOGY to only keep the edges and lengths of the nodes (see chunk_tiers.py),
+		a topology chunk loaded as FULL is promoted
 		"""
 		# print(f"loading chunk {chunk_id}")
 		# with open(self.graph_name + "chunk" + str(chunk_id), "rb") as infile:
 		# 	chunk = pickle.load(infile)
-		if len(self.loaded_c) >= self.loaded_c_limit:
-			logger.info(f"There has been 10 chunks loaded, will be unloading old chunks!")
+		if tier == TOPOLOGY and (chunk_id in self.loaded_c or chunk_id in self.topology_c):
+			return
+		chunk = None
+		future = self.prefetching.pop(chunk_id, None)
+		if future is not None:
+			# read in the background by set_focus, only waiting if it is not finished yet
+			waited = not future.done()
+			chunk = future.result()
+			self.stats.prefetch(waited)
+			tier = FULL
+		if tier == FULL and len(self.loaded_c) >= self.loaded_c_limit:
+			logger.debug(f"There has been {self.loaded_c_limit} chunks loaded, will be unloading old chunks!")
 			while len(self.loaded_c) >= self.loaded_c_limit:
-				c_id = self.loaded_c.popleft()
-				logger.info(f"Unloading chunk {c_id} and current loaded c are {self.loaded_c}")
-				self.unload_chunk(c_id)
-		logger.info(f"Loading chunk {chunk_id}")
+				# the chunks out of the focus range first, then the oldest ones
+				c_id = next((c for c in self.loaded_c if c not in self.focus_range), self.loaded_c[0])
+				self.loaded_c.remove(c_id)
+				logger.debug(f"Unloading chunk {c_id} and current loaded c are {self.loaded_c}")
+				self.evict_chunk(c_id)
+		logger.debug(f"Loading chunk {chunk_id} ({tier})")
+		if chunk_id in self.topology_c:
+			self.topology_c.remove(chunk_id)
+			self.stats.promote(TOPOLOGY, FULL)
+		elif chunk_id in self.summary_c:
+			del self.summary_c[chunk_id]
+			self.stats.promote(SUMMARY, tier)
+		if chunk is None:
+			chunk = self.read_chunk(chunk_id, topology=tier == TOPOLOGY)
+		nodes, n_bytes, n_nodes, seconds = chunk
+		self.nodes.update(nodes)
+		self.stats.load(chunk_id, n_bytes, n_nodes, seconds)
+		if self.trace is not None:
+			self.trace.access(LOAD, chunk_id)
+			self.trace.size(chunk_id, n_bytes)
+		if tier == TOPOLOGY:
+			self.topology_c.append(chunk_id)
+			# the chunk is loaded for the caller, it is not demoted again right away
+			self.trim_topology(keep={chunk_id})
+		else:
+			self.chunk_bytes[chunk_id] = n_bytes
+			if chunk_id not in self.loaded_c:
+				self.loaded_c.append(chunk_id)
+		logger.debug(f"Loaded chunks so far {self.loaded_c}")
+
+	def read_chunk(self, chunk_id, topology=False):
+		"""
+		reads a chunk without adding it to the graph, safe to run in another thread
+		:return: the dictionary of its nodes, the number of bytes read and of nodes, and the seconds it took
+		"""
+		nodes = dict()
 		offset, n_lines = self.offsets[chunk_id]
-		self.read_gfa(self.graph_name, offset, n_lines)
-		if chunk_id not in self.loaded_c:
-			self.loaded_c.append(chunk_id)
-		logger.info(f"Loaded chunks so far {self.loaded_c}")
+		start = time.perf_counter()
+		n_bytes, n_nodes = self.read_gfa(self.graph_name, offset, n_lines, topology=topology, nodes=nodes)
+		return nodes, n_bytes, n_nodes, time.perf_counter() - start
+
+	def set_focus(self, node_id, radius=1):
+		"""
+		moves the focus to the chunk of node_id, e.g. the position of a viewer: the chunks within radius hops
+		of it in the chunk adjacency graph are read in a background thread and added to the graph when they are
+		first needed or at the next set_focus, so moving along the graph does not wait for the disk
+		the chunks out of range are evicted first, and the focus also drives the tiers (see chunk_tiers.py)
+		:return: the set of the chunks in range, at most loaded_c_limit of them, the closest ones
+		"""
+		chunk_id = self.nodes[node_id].chunk_id if node_id in self.nodes else self.get_node_chunk(node_id)
+		if chunk_id is None:
+			logger.error(f"The node {node_id} given as focus is not in the graph")
+			return set()
+		in_range = hop_distances(self.chunk_neighbors, [chunk_id], radius)
+		if len(in_range) > self.loaded_c_limit:
+			logger.warning(f"{len(in_range)} chunks are within {radius} hops of chunk {chunk_id}, more than "
+						   f"loaded_c_limit, only the {self.loaded_c_limit} closest ones are kept loaded")
+			closest = sorted(in_range, key=lambda c: (in_range[c], c))[:self.loaded_c_limit]
+			in_range = {c: in_range[c] for c in closest}
+		self.focus = {chunk_id}
+		self.focus_range = in_range
+		self.install_prefetched()
+
+		for c in list(self.prefetching):
+			if c not in in_range and self.prefetching[c].cancel():
+				del self.prefetching[c]
+		if self.prefetcher is None:
+			# one reader, the chunks are read in the order of their distance to the focus
+			self.prefetcher = ThreadPoolExecutor(max_workers=1)
+		for c in sorted(in_range, key=lambda c: (in_range[c], c)):
+			if c not in self.loaded_c and c not in self.prefetching:
+				self.prefetching[c] = self.prefetcher.submit(self.read_chunk, c)
+		return set(in_range)
+
+	def clear_focus(self):
+		"""
+		removes the focus and cancels the chunk reads that have not started
+		"""
+		for c in list(self.prefetching):
+			if self.prefetching[c].cancel():
+				del self.prefetching[c]
+		self.focus = set()
+		self.focus_range = dict()
+
+	def install_prefetched(self):
+		"""
+		adds the chunks read in the background to the graph, the ones that went out of the focus range are dropped
+		"""
+		for c in [c for c, future in self.prefetching.items() if future.done()]:
+			if c in self.focus_range and c not in self.loaded_c:
+				self.load_chunk(c)
+			else:
+				del self.prefetching[c]
+
+	def evict_chunk(self, chunk_id):
+		"""
+		takes a chunk out of the full tier, demoting it to topology when the tiers are enabled, unloading it otherwise
+		"""
+		if self.topology_c_limit > 0:
+			self.demote_chunk(chunk_id, TOPOLOGY)
+		else:
+			self.unload_chunk(chunk_id)
+
+	def demote_chunk(self, chunk_id, tier):
+		"""
+		moves a resident chunk down to the TOPOLOGY or SUMMARY tier without reading it again
+		"""
+		if tier == TOPOLOGY:
+			if chunk_id not in self.loaded_c and chunk_id in self.topology_c:
+				return
+			for n in self.nodes.values():
+				if n.chunk_id == chunk_id:
+					strip_node(n)
+			if chunk_id in self.loaded_c:
+				self.loaded_c.remove(chunk_id)
+			self.chunk_bytes.pop(chunk_id, None)
+			self.topology_c.append(chunk_id)
+			self.stats.evict(chunk_id)
+			self.stats.demote(FULL, TOPOLOGY)
+			self.trim_topology(keep={chunk_id})
+		elif tier == SUMMARY:
+			from_tier = TOPOLOGY if chunk_id in self.topology_c else FULL
+			if from_tier == FULL:
+				self.unload_chunk(chunk_id)
+			else:  # already counted as evicted when it left the full tier
+				self.drop_chunk(chunk_id)
+			self.summary_c[chunk_id] = {"summary": self.chunk_summary(chunk_id), "boundary": self.chunk_boundary(chunk_id)}
+			self.stats.demote(from_tier, SUMMARY)
+			while len(self.summary_c) > self.summary_c_limit:
+				del self.summary_c[next(iter(self.summary_c))]
+		else:
+			raise ValueError(f"Cannot demote a chunk to the {tier} tier")
+
+	def trim_topology(self, keep=()):
+		"""
+		demotes topology chunks to summary until there are no more than topology_c_limit,
+		the farthest ones from the focus first, then the oldest ones
+		:param keep: chunk ids that are not demoted
+		"""
+		excess = len(self.topology_c) - self.topology_c_limit
+		if excess <= 0:
+			return
+		dist = self.focus_distances(targets=self.topology_c)
+		far = float("inf")
+		order = sorted((i for i in range(len(self.topology_c)) if self.topology_c[i] not in keep),
+					   key=lambda i: (-dist.get(self.topology_c[i], far), i))
+		for chunk_id in [self.topology_c[i] for i in order[:excess]]:
+			self.demote_chunk(chunk_id, SUMMARY)
+
+	def chunk_tier(self, chunk_id):
+		"""
+		returns the residency tier of a chunk, FULL, TOPOLOGY or SUMMARY, None if it is not resident
+		"""
+		if chunk_id in self.loaded_c:
+			return FULL
+		if chunk_id in self.topology_c:
+			return TOPOLOGY
+		if chunk_id in self.summary_c:
+			return SUMMARY
+		return None
+
+	def chunk_neighbors(self, chunk_id):
+		"""
+		returns the set of the chunks with an edge to chunk_id, from the distance index,
+		an empty set for graphs indexed without it
+		"""
+		if self.chunk_adjacency is None:
+			# only tried once, the index logs an error when it is missing
+			self.chunk_adjacency = dict() if self.distance_index() is not None else False
+		if self.chunk_adjacency is False:
+			return set()
+		if chunk_id not in self.chunk_adjacency:
+			self.chunk_adjacency[chunk_id] = {other for cross in self.distances.chunk(chunk_id).cross for other, _ in cross}
+		return self.chunk_adjacency[chunk_id]
+
+	def chunk_boundary(self, chunk_id):
+		"""
+		returns the boundary sides (node_id, side) of a chunk, the sides with an edge to another chunk,
+		None for graphs indexed without the distance index
+		"""
+		self.chunk_neighbors(chunk_id)
+		if self.chunk_adjacency is False:
+			return None
+		return self.distances.chunk(chunk_id).sides
+
+	def focus_distances(self, max_hops=None, targets=None):
+		"""
+		returns the dictionary of chunk_id: hops from the focus, or from the full chunks when no focus is set
+		:param max_hops: the chunks farther away are left out
+		:param targets: stop once the distances of these chunks are known
+		"""
+		return hop_distances(self.chunk_neighbors, self.focus or self.loaded_c, max_hops, targets)
+
+	def traversal_tier(self, chunk_id):
+		"""
+		returns the tier the traversals load a chunk at, TOPOLOGY if the tiers are enabled and the chunk is
+		farther than full_radius hops from the focus, FULL otherwise
+		"""
+		if self.topology_c_limit <= 0 or self.full_radius is None or not self.focus:
+			return FULL
+		if chunk_id in self.focus_distances(self.full_radius):
+			return FULL
+		return TOPOLOGY
 
 		# for n_id, n in chunk.items():
 		# 	# to remove
@@ -333,38 +1123,49 @@ class ChGraph:
 			# else:
 			# 	print(f"node {n_id} already in graph, skipping...")
 
-	def read_gfa(self, gfa_file_path, offset, n_lines):
+	def read_gfa(self, gfa_file_path, offset, n_lines, topology=False, nodes=None):
 		"""
         Read a gfa file
         :param gfa_file_path: gfa graph file.
-        :param low_memory: don't read the sequences to save memory
-        :return: Dictionary of node ids and Node objects.
+        :param topology: only keep the edges, lengths and chunk ids of the nodes, not their sequences and other tags
+        :param nodes: dictionary the nodes are added to, by default the nodes of the graph
+        :return: the number of bytes read and of nodes loaded
         """
+		if nodes is None:
+			nodes = self.nodes
 
 		# todo I need to edit this to also take into accounts the tags at the L lines (Maybe)
-		gfa_file = open(gfa_file_path, "r")
+		# binary mode, the text decoder would read ahead past the chunks into the binary sections of a container
+		gfa_file = open(gfa_file_path, "rb")
 		gfa_file.seek(offset)
 		edges = []
+		n_bytes = 0
+		n_nodes = 0
 		# min_node_length = k
 		for _ in range(n_lines):
 			line = gfa_file.readline()
+			n_bytes += len(line)
+			line = line.decode()
 			if line.startswith("S"):
+				n_nodes += 1
 				line = line.strip().split("\t")
 				n_id = str(line[1])
 				n_len = len(line[2])
-				self.nodes[n_id] = Node(n_id)
-				self.nodes[n_id].seq = line[2]
-				self.nodes[n_id].seq_len = n_len
+				nodes[n_id] = Node(n_id)
+				nodes[n_id].seq = line[2]
+				nodes[n_id].seq_len = n_len
 
 				tags = line[3:]
 				# adding the extra tags if any to the node object
 				if tags:
 					for tag in tags:
-						tag = tag.split(":")
+						tag = tag.split(":", 2)
 						# I am adding the tags as key:value, key is tag_name:type and value is the value at the end
 						# e.g. SN:i:10 will be {"SN": ('i', '10')}
-						self.nodes[n_id].tags[tag[0]] = (tag[1], tag[2])  # (type, value)
-					self.nodes[n_id].chunk_id = int(self.nodes[n_id].tags['cid'][1])
+						nodes[n_id].tags[tag[0]] = (tag[1], tag[2])  # (type, value)
+					nodes[n_id].chunk_id = int(nodes[n_id].tags['cid'][1])
+				if topology:
+					strip_node(nodes[n_id])
 
 			elif line.startswith("L"):
 				edges.append(line)
@@ -375,11 +1176,11 @@ class ChGraph:
 			first_node = str(line[1])
 			second_node = str(line[3])
 			# todo need to deal with edges that are part of another chunk
-			# if first_node not in self.nodes:
+			# if first_node not in nodes:
 			# 	logging.warning(f"an edge between {first_node} and {second_node} exists but a "
 			# 					f"node record for {first_node} does not exist in the file. Skipping")
 			# 	continue
-			# if second_node not in self.nodes:
+			# if second_node not in nodes:
 			# 	logging.warning(f"an edge between {first_node} and {second_node} exists but a "
 			# 					f"node record for {second_node} does not exist in the file. Skipping")
 			# 	continue
@@ -397,27 +1198,28 @@ class ChGraph:
 				to_end = False
 
 			if from_start and to_end:
-				if first_node in self.nodes:
-					self.nodes[first_node].start.add((second_node, 1, overlap))
-				if second_node in self.nodes:
-					self.nodes[second_node].end.add((first_node, 0, overlap))
+				if first_node in nodes:
+					nodes[first_node].start.add((second_node, 1, overlap))
+				if second_node in nodes:
+					nodes[second_node].end.add((first_node, 0, overlap))
 			elif from_start and not to_end:
-				if first_node in self.nodes:
-					self.nodes[first_node].start.add((second_node, 0, overlap))
-				if second_node in self.nodes:
-					self.nodes[second_node].start.add((first_node, 0, overlap))
+				if first_node in nodes:
+					nodes[first_node].start.add((second_node, 0, overlap))
+				if second_node in nodes:
+					nodes[second_node].start.add((first_node, 0, overlap))
 			elif not from_start and not to_end:
-				if first_node in self.nodes:
-					self.nodes[first_node].end.add((second_node, 0, overlap))
-				if second_node in self.nodes:
-					self.nodes[second_node].start.add((first_node, 1, overlap))
+				if first_node in nodes:
+					nodes[first_node].end.add((second_node, 0, overlap))
+				if second_node in nodes:
+					nodes[second_node].start.add((first_node, 1, overlap))
 			elif not from_start and to_end:
-				if first_node in self.nodes:
-					self.nodes[first_node].end.add((second_node, 1, overlap))
-				if second_node in self.nodes:
-					self.nodes[second_node].end.add((first_node, 1, overlap))
+				if first_node in nodes:
+					nodes[first_node].end.add((second_node, 1, overlap))
+				if second_node in nodes:
+					nodes[second_node].end.add((first_node, 1, overlap))
 
 		gfa_file.close()
+		return n_bytes, n_nodes
 
 	def write_gfa(self, set_of_nodes=None,
 				  output_file="output_file.gfa", append=True):
@@ -432,6 +1234,16 @@ class ChGraph:
 
 		if set_of_nodes is None:
 			set_of_nodes = self.nodes.keys()
+		# the topology chunks do not have the sequences and tags, they are all promoted before writing
+		# without evicting, which would strip the sequences of the full chunks, and trimmed afterwards
+		promote = {self.nodes[n].chunk_id for n in set_of_nodes if n in self.nodes} & set(self.topology_c)
+		limit = self.loaded_c_limit
+		self.loaded_c_limit = max(limit, len(self.loaded_c) + len(promote))
+		try:
+			for chunk_id in promote:
+				self.load_chunk(chunk_id)
+		finally:
+			self.loaded_c_limit = limit
 
 		if append is False:
 			f = open(output_file, "w+")
@@ -494,6 +1306,66 @@ class ChGraph:
 			# 	f.write(e)
 
 		f.close()
+		self.trim_chunks()
+
+	def read_chunk_bytes(self, f, chunk_id):
+		"""
+		returns the raw lines of a chunk as bytes, without parsing them
+		:param f: the graph file opened in binary mode
+		"""
+		if hasattr(self.offsets, "byte_range"):
+			offset, length = self.offsets.byte_range(chunk_id)
+			f.seek(offset)
+			return f.read(length)
+		# pickled index without the chunk sizes
+		offset, n_lines = self.offsets[chunk_id]
+		f.seek(offset)
+		return b"".join(f.readline() for _ in range(n_lines))
+
+	def write_subgraph(self, set_of_nodes, output_file="output_file.gfa", append=False, buffer_size=1 << 20):
+		"""
+		writes the subgraph of set_of_nodes by copying its S lines and the L lines between its nodes
+		as raw bytes from the reordered GFA, chunk by chunk in file order, without loading the chunks into the graph
+		the output has the same lines as write_gfa, the L lines are also written from both of their ends
+		:param set_of_nodes: node ids, e.g. from bfs or extract_region
+		:param append: if I want to append to a file instead of rewriting it
+		:param buffer_size: number of bytes gathered before each write
+		:return: the number of S and L lines written
+		"""
+		node_chunks = self.get_node_chunks(set_of_nodes)
+		missing = [n for n, chunk_id in node_chunks.items() if chunk_id is None]
+		if missing:
+			logging.warning(f"{len(missing)} nodes do not exist in the graph and are skipped in the output, e.g. {missing[0]}")
+		wanted = {n.encode() for n, chunk_id in node_chunks.items() if chunk_id is not None}
+		chunk_ids = sorted({chunk_id for chunk_id in node_chunks.values() if chunk_id is not None},
+						   key=lambda chunk_id: self.offsets[chunk_id][0])
+
+		n_nodes = 0
+		n_edges = 0
+		buffer = []
+		buffered = 0
+		with open(self.graph_name, "rb") as f, open(output_file, "ab" if append else "wb") as out:
+			for chunk_id in chunk_ids:
+				for line in self.read_chunk_bytes(f, chunk_id).splitlines(keepends=True):
+					if line.startswith(b"S"):
+						if line.split(b"\t", 2)[1] not in wanted:
+							continue
+						n_nodes += 1
+					elif line.startswith(b"L"):
+						fields = line.split(b"\t", 4)
+						if fields[1] not in wanted or fields[3] not in wanted:
+							continue
+						n_edges += 1
+					else:
+						continue
+					buffer.append(line)
+					buffered += len(line)
+				if buffered >= buffer_size:
+					out.write(b"".join(buffer))
+					buffer = []
+					buffered = 0
+			out.write(b"".join(buffer))
+		return n_nodes, n_edges
 
 	def path_exists(self, path):
 		"""
@@ -521,20 +1393,78 @@ class ChGraph:
 					">node<node>node<nod"
 				)
 				return False
-			ok = False
-			for edge in getattr(self[n1[1:]], case[0]):
-				if (n2[1:], case[1]) == (edge[0], edge[1]):
-					ok = True
-			if not ok:
+			if not any((n2[1:], case[1]) == (edge[0], edge[1]) for edge in getattr(self[n1[1:]], case[0])):
 				return False
 
 		return True
 
+	def path_index(self):
+		"""
+		returns the path store of the graph, loading it the first time it is needed
+		"""
+		if self.path_store is None:
+			if self.container is not None and "PATHS" in self.container:
+				self.path_store = PathIndex(self.graph_name, *self.container.section_range("PATHS"))
+				return self.path_store
+			index_file = self.graph_name[:-4] + ".paths"
+			if not os.path.exists(index_file):
+				logger.error(f"Could not find the path store {index_file}, the original graph had no P or W lines")
+				return None
+			self.path_store = PathIndex(index_file)
+		return self.path_store
+
+	def path_names(self):
+		"""
+		returns the names of the P and W paths of the graph
+		"""
+		paths = self.path_index()
+		if paths is None:
+			return []
+		return paths.names()
+
+	def iter_path_seq(self, name):
+		"""
+		yields the sequence of a P or W path of the graph node by node
+		the path is followed chunk by chunk and each chunk is loaded once per run of consecutive steps in it,
+		so only loaded_c_limit chunks are in memory however long the path is
+		"""
+		paths = self.path_index()
+		if paths is None or name not in paths:
+			logger.error(f"The path {name} does not exist in this graph")
+			return
+		for chunk_id, steps in paths.chunk_steps(name):
+			if chunk_id not in self.loaded_c:
+				self.load_chunk(chunk_id)
+			for orientation, n_id in steps:
+				if orientation == ">":
+					yield self.nodes[n_id].seq
+				else:
+					yield extgfa.sequence_utils.rev_comp(self.nodes[n_id].seq)
+
+	def write_path_seq(self, name, output_file, line_width=60):
+		"""
+		streams the sequence of a P or W path of the graph into a FASTA file
+		"""
+		with open(output_file, "w") as f:
+			f.write(f">{name}\n")
+			buffer = ""
+			for seq in self.iter_path_seq(name):
+				buffer += seq
+				n_full = len(buffer) - len(buffer) % line_width
+				for i in range(0, n_full, line_width):
+					f.write(buffer[i:i + line_width] + "\n")
+				buffer = buffer[n_full:]
+			if buffer:
+				f.write(buffer + "\n")
+
 	def extract_path_seq(self, path):
 		"""
         returns the sequences representing that path
+        path can be a walk like >s1<s2>s3 or the name of a P or W path of the graph
         """
 		seq = []
+		if path[0] not in {"<", ">"} and path in self.path_names():
+			return "".join(self.iter_path_seq(path))
 		# path has to start with > or <, otherwise it's invalid
 		if path[0] not in {"<", ">"}:
 			logging.error(f"The path {path} does not start with < or > ")
@@ -553,7 +1483,7 @@ class ChGraph:
 			if n.startswith(">"):
 				seq.append(self[n[1:]].seq)
 			elif n.startswith("<"):
-				seq.append(extgfa.utilities.rev_comp(self[n[1:]].seq))
+				seq.append(extgfa.sequence_utils.rev_comp(self[n[1:]].seq))
 			# seq.append("".join([reverse_complement[x] for x in self.nodes[n[1:]].seq[::-1]]))
 			else:
 				logging.error(f"Some error happened where a node {n} doesn't start with > or <")
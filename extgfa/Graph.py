@@ -3,8 +3,9 @@ import sys
 import pdb
 import re
 import logging
-import extgfa.utilities
+import extgfa.sequence_utils
 from extgfa.bfs import bfs
+from extgfa.gfa_paths import path_name, path_walk
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
@@ -121,11 +122,12 @@ class Graph:
     Graph object containing the important information about the graph
     """
 
-    __slots__ = ['nodes', 'chunk_offsets']
+    __slots__ = ['nodes', 'chunk_offsets', 'paths']
 
     def __init__(self, graph_file=None):
         self.nodes = dict()
         self.chunk_offsets = dict()
+        self.paths = dict()  # path name: P or W line
         if graph_file is not None:
             if not os.path.exists(graph_file):
                 print("Error! Check log file.")
@@ -242,75 +244,37 @@ class Graph:
 
     def write_chunked_gfa(self, chunks, output_file="output_file.gfa"):
         """
-        Write a gfa out
-        n_chunks: the number of chunks that are now ordered from 1 to n_chunks + 1
+        Write a gfa out, the S and L lines of each chunk one after the other
+        chunks: the chunk index, a list of lists of node ids, chunk i + 1 being chunks[i]
         output_file: path to output file
+        returns the offset where the chunks end, i.e. the size of the chunks part of the file
         """
-
-        # if os.path.exists(output_file):
-        #     logger.error(f"File {output_file} already exists")
-        #     sys.exit()
-        # else:
-        #     f = open(output_file, "w")
-
-        f = open(output_file, "w")
+        # the file is written in binary, so the offsets count bytes even with non-ASCII tags,
+        # and every chunk is encoded and written at once
         chunk_pos_counter = 0
-        for idx, chunk in enumerate(chunks):
-        # for cid in range(1, n_chunks + 1):
-        #     if cid == 1:  # first chunk has offset 0
-        #         self.chunk_offsets[cid] = [0, 0]
-        #     else:
-        #         self.chunk_offsets[cid] = [chunk_pos_counter, 0]
-        #     set_of_nodes = [n for n in self.nodes.keys() if self.nodes[n].chunk_id == cid]
-            if idx == 0:
-                self.chunk_offsets[1] = [0, 0]
-            else:
-                self.chunk_offsets[idx + 1] = [chunk_pos_counter, 0]
-            set_of_nodes = chunk
-            idx += 1
-            for n1 in set_of_nodes:
-                if n1 not in self:
-                    logging.warning("Node {} does not exist in the graph, skipped in output".format(n1))
-                    continue
-
-                line = self.nodes[n1].to_gfa_line()
-                line += "\n"
-
-                f.write(line)
-                chunk_pos_counter += len(line)
-                self.chunk_offsets[idx][1] += 1
-
-                for n in self.nodes[n1].start:
-                    overlap = str(n[2]) + "M"
-                    if n[1] == 0:
-                        edge = str("\t".join(("L", str(n1), "-", str(n[0]), "+", overlap)))
-                        edge += "\n"
-
-                    else:
-                        edge = str("\t".join(("L", str(n1), "-", str(n[0]), "-", overlap)))
-                        edge += "\n"
-
-                    f.write(edge)
-                    chunk_pos_counter += len(edge)
-                    self.chunk_offsets[idx][1] += 1
-
-                for n in self.nodes[n1].end:
-                    overlap = str(n[2]) + "M"
-
-                    if n[1] == 0:
-                        edge = str("\t".join(("L", str(n1), "+", str(n[0]), "+", overlap)))
-                        edge += "\n"
-
-                    else:
-                        edge = str("\t".join(("L", str(n1), "+", str(n[0]), "-", overlap)))
-                        edge += "\n"
-
-                    f.write(edge)
-                    chunk_pos_counter += len(edge)
-                    self.chunk_offsets[idx][1] += 1
-
-            # self.chunk_offsets[cid][1] -= 1  # not sure why, but I need an offset by 1 at the end
-        f.close()
+        with open(output_file, "wb", buffering=1 << 20) as f:
+            for idx, chunk in enumerate(chunks, start=1):
+                lines = []
+                for n1 in chunk:
+                    node = self.nodes.get(n1)
+                    if node is None:
+                        logging.warning("Node {} does not exist in the graph, skipped in output".format(n1))
+                        continue
+                    lines.append(node.to_gfa_line())
+                    for n, side, overlap in node.start:
+                        lines.append(f"L\t{n1}\t-\t{n}\t{'+' if side == 0 else '-'}\t{overlap}M")
+                    for n, side, overlap in node.end:
+                        lines.append(f"L\t{n1}\t+\t{n}\t{'+' if side == 0 else '-'}\t{overlap}M")
+                self.chunk_offsets[idx] = [chunk_pos_counter, len(lines)]
+                if lines:
+                    data = ("\n".join(lines) + "\n").encode()
+                    f.write(data)
+                    chunk_pos_counter += len(data)
+
+            # the paths are written after all the chunks so they do not change the chunk offsets
+            for line in self.paths.values():
+                f.write((line + "\n").encode())
+        return chunk_pos_counter
 
     def read_gfa(self, gfa_file_path):
         """
@@ -323,40 +287,50 @@ class Graph:
             logging.error("the gfa file path you gave does not exists, please try again!")
             sys.exit()
 
-        edges = []
-        # min_node_length = k
         with open(gfa_file_path, "r") as lines:
-            for line in lines:
-                if line.startswith("S"):
-                    line = line.strip().split("\t")
-                    n_id = str(line[1])
-                    n_len = len(line[2])
-                    self.nodes[n_id] = Node(n_id)
-                    self.nodes[n_id].seq = line[2]
-                    self.nodes[n_id].seq_len = n_len
-
-                    tags = line[3:]
-                    # adding the extra tags if any to the node object
-                    if tags:
-                        for tag in tags:
-                            tag = tag.split(":")
-                            # I am adding the tags as key:value, key is tag_name:type and value is the value at the end
-                            # e.g. SN:i:10 will be {"SN": ('i', '10')}
-                            self.nodes[n_id].tags[tag[0]] = (tag[1], tag[2])  # (type, value)
-
-                elif line.startswith("L"):
-                    edges.append(line)
+            self.read_gfa_lines(lines)
 
+    def read_gfa_lines(self, lines):
+        """
+        Read the lines of a gfa, e.g. of the chunk data of a container
+        :param lines: iterable of the lines of the gfa
+        """
+        edges = []
+        # min_node_length = k
+        for line in lines:
+            if line.startswith("S"):
+                line = line.strip().split("\t")
+                n_id = line[1]
+                node = Node(n_id)
+                node.seq = line[2]
+                node.seq_len = len(line[2])
+                self.nodes[n_id] = node
+
+                # adding the extra tags if any to the node object
+                for tag in line[3:]:
+                    tag = tag.split(":", 2)
+                    # I am adding the tags as key:value, key is tag_name:type and value is the value at the end
+                    # e.g. SN:i:10 will be {"SN": ('i', '10')}
+                    node.tags[tag[0]] = (tag[1], tag[2])  # (type, value)
+
+            elif line.startswith("L"):
+                edges.append(line)
+
+            elif line.startswith(("P", "W")):
+                line = line.rstrip("\n")
+                self.paths[path_name(line.split("\t"))] = line
+
+        nodes = self.nodes
         for e in edges:
             line = e.split()
 
-            first_node = str(line[1])
-            second_node = str(line[3])
-            if first_node not in self:
+            first_node = line[1]
+            second_node = line[3]
+            if first_node not in nodes:
                 logging.warning(f"an edge between {first_node} and {second_node} exists but a "
                                 f"node record for {first_node} does not exist in the file. Skipping")
                 continue
-            if second_node not in self:
+            if second_node not in nodes:
                 logging.warning(f"an edge between {first_node} and {second_node} exists but a "
                                 f"node record for {second_node} does not exist in the file. Skipping")
                 continue
@@ -373,33 +347,22 @@ class Graph:
             else:
                 to_end = False
 
+            # the sides are sets, adding an edge twice keeps one copy
             if from_start and to_end:  # from start to end L x - y -
-                if (second_node, 1, overlap) not in self.nodes[first_node].start:
-                    self.nodes[first_node].start.add((second_node, 1, overlap))
-                if (first_node, 0, overlap) not in self.nodes[second_node].end:
-                    self.nodes[second_node].end.add((first_node, 0, overlap))
+                nodes[first_node].start.add((second_node, 1, overlap))
+                nodes[second_node].end.add((first_node, 0, overlap))
 
             elif from_start and not to_end:  # from start to start L x - y +
-
-                if (second_node, 0, overlap) not in self.nodes[first_node].start:
-                    self.nodes[first_node].start.add((second_node, 0, overlap))
-
-                if (first_node, 0, overlap) not in self.nodes[second_node].start:
-                    self.nodes[second_node].start.add((first_node, 0, overlap))
+                nodes[first_node].start.add((second_node, 0, overlap))
+                nodes[second_node].start.add((first_node, 0, overlap))
 
             elif not from_start and not to_end:  # from end to start L x + y +
-                if (second_node, 0, overlap) not in self.nodes[first_node].end:
-                    self.nodes[first_node].end.add((second_node, 0, overlap))
-
-                if (first_node, 1, overlap) not in self.nodes[second_node].start:
-                    self.nodes[second_node].start.add((first_node, 1, overlap))
+                nodes[first_node].end.add((second_node, 0, overlap))
+                nodes[second_node].start.add((first_node, 1, overlap))
 
             elif not from_start and to_end:  # from end to end L x + y -
-                if (second_node, 1, overlap) not in self.nodes[first_node].end:
-                    self.nodes[first_node].end.add((second_node, 1, overlap))
-
-                if (first_node, 1, overlap) not in self.nodes[second_node].end:
-                    self.nodes[second_node].end.add((first_node, 1, overlap))
+                nodes[first_node].end.add((second_node, 1, overlap))
+                nodes[second_node].end.add((first_node, 1, overlap))
 
     def path_exists(self, ordered_path):
         """
@@ -439,16 +402,20 @@ class Graph:
     def extract_path_seq(self, path):
         """
         returns the sequences representing that path
+        path can be a walk like >s1<s2>s3 or the name of a P or W path of the graph
         """
         seq = []
 
-        path = re.findall("[><][^><]+", path)
+        if path in self.paths:
+            path = path_walk(self.paths[path].split("\t"))
 
         # path has to start with > or <, otherwise it's invalid
         if path[0] not in {"<", ">"}:
             logging.error(f"The path {path} does not start with < or > ")
             return ""
 
+        path = re.findall("[><][^><]+", path)
+
         if not self.path_exists(path):
             logging.error(f"The path given {path} does not exist")
             return ""
@@ -461,7 +428,7 @@ class Graph:
             if n.startswith(">"):
                 seq.append(self[n[1:]].seq)
             elif n.startswith("<"):
-                seq.append(extgfa.utilities.rev_comp(self[n[1:]].seq))
+                seq.append(extgfa.sequence_utils.rev_comp(self[n[1:]].seq))
             # seq.append("".join([reverse_complement[x] for x in self.nodes[n[1:]].seq[::-1]]))
             else:
                 logging.error(f"Some error happened where a node {n} doesn't start with > or <")
@@ -0,0 +1,3 @@
+"""
+Self-contained benchmarks of extgfa on synthetic graphs, run with python -m extgfa.benchmark
+"""
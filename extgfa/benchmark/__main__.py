@@ -0,0 +1,69 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import logging
+from extgfa.benchmark.generator import LENGTH_DISTRIBUTIONS
+from extgfa.benchmark.suite import ALGORITHMS, run_suite
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m extgfa.benchmark",
+                                     description="Generates a synthetic pangenome graph and benchmarks the indexing "
+                                                 "and the queries of extgfa on it, the results are written as JSON")
+    parser.add_argument("output", help="output JSON file, - for stdout")
+    parser.add_argument("--nodes", type=int, default=20_000, help="number of nodes of the graph (default: 20000)")
+    parser.add_argument("--mean-length", type=int, default=20, help="mean node length (default: 20)")
+    parser.add_argument("--length-distribution", default="lognormal", choices=LENGTH_DISTRIBUTIONS,
+                        help="distribution of the node lengths (default: lognormal)")
+    parser.add_argument("--bubble-density", type=float, default=0.5,
+                        help="probability of a bubble at each step of the backbone (default: 0.5)")
+    parser.add_argument("--nesting-density", type=float, default=0.1,
+                        help="probability of an alternative allele being a nested bubble (default: 0.1)")
+    parser.add_argument("--algorithms", nargs="+", default=["bfs", "lv"], choices=ALGORITHMS,
+                        help="partitioning algorithms to benchmark (default: bfs lv)")
+    parser.add_argument("--upper", type=int, default=500, help="upper chunk threshold (default: 500)")
+    parser.add_argument("--lower", type=int, default=50, help="lower chunk threshold (default: 50)")
+    parser.add_argument("--limits", type=int, nargs="+", default=[2, 10, 50],
+                        help="loaded_c_limit values of ChGraph (default: 2 10 50)")
+    parser.add_argument("--bfs-sizes", type=int, nargs="+", default=[100, 1000, 10_000],
+                        help="BFS neighborhood sizes (default: 100 1000 10000)")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="number of repetitions, and of start nodes for BFS (default: 3)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed (default: 1)")
+    parser.add_argument("--workdir", default=None,
+                        help="directory for the generated and chunked graphs, kept after the run "
+                             "(default: a temporary directory that is removed)")
+    args = parser.parse_args()
+
+    if args.workdir is None:
+        workdir = tempfile.mkdtemp(prefix="extgfa_benchmark_")
+    else:
+        workdir = args.workdir
+        os.makedirs(workdir, exist_ok=True)
+
+    try:
+        results = run_suite(workdir, n_nodes=args.nodes, mean_length=args.mean_length,
+                            length_distribution=args.length_distribution, bubble_density=args.bubble_density,
+                            nesting_density=args.nesting_density, algorithms=args.algorithms,
+                            top_threshold=args.upper, btm_threshold=args.lower, limits=args.limits,
+                            bfs_sizes=args.bfs_sizes, repeats=args.repeats, seed=args.seed)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir)
+
+    if args.output == "-":
+        json.dump(results, sys.stdout, indent=1)
+    else:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=1)
+        logger.info(f"Wrote {len(results['records'])} benchmark records to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
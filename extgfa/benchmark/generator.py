@@ -0,0 +1,134 @@
+"""
+Generator of synthetic bubble-rich pangenome graphs in rGFA format.
+The graph is a reference backbone where, at each step, a bubble is opened with probability bubble_density:
+the reference allele and an alternative allele between the previous backbone node and the next one.
+With probability nesting_density, an alternative allele is itself a bubble, recursively up to MAX_NESTING levels.
+The nodes have SN/SO/SR tags like minigraph output, with rank 0 for the backbone, and two paths are written:
+a P line "ref" along the backbone and a W line for a sample going through the alternative alleles.
+"""
+import math
+import random
+import logging
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+LENGTH_DISTRIBUTIONS = ("fixed", "uniform", "lognormal")
+MAX_NESTING = 4
+CONTIG = "chr1"
+
+
+class GraphGenerator:
+    """
+    Writes the S lines as they are generated, the edges and the walks are kept until the end
+    """
+
+    def __init__(self, gfa_file, mean_length=20, length_distribution="lognormal",
+                 bubble_density=0.5, nesting_density=0.1, seed=1):
+        if length_distribution not in LENGTH_DISTRIBUTIONS:
+            raise ValueError(f"unknown length distribution {length_distribution}, use one of {LENGTH_DISTRIBUTIONS}")
+        self.f = gfa_file
+        self.rng = random.Random(seed)
+        self.mean_length = mean_length
+        self.length_distribution = length_distribution
+        self.bubble_density = bubble_density
+        self.nesting_density = nesting_density
+        self.n_nodes = 0
+        self.n_bases = 0
+        self.n_bubbles = 0
+        self.edges = []
+
+    def node_length(self):
+        if self.length_distribution == "fixed":
+            return self.mean_length
+        if self.length_distribution == "uniform":
+            return self.rng.randint(1, 2 * self.mean_length - 1)
+        # heavy tailed like real graphs, with the same mean
+        sigma = 1.0
+        return max(1, int(self.rng.lognormvariate(math.log(self.mean_length) - sigma ** 2 / 2, sigma)))
+
+    def node(self, offset, rank):
+        """
+        writes a new node and returns its (id, length)
+        """
+        self.n_nodes += 1
+        n_id = f"s{self.n_nodes}"
+        length = self.node_length()
+        seq = "".join(self.rng.choices("ACGT", k=length))
+        self.f.write(f"S\t{n_id}\t{seq}\tLN:i:{length}\tSN:Z:{CONTIG}\tSO:i:{offset}\tSR:i:{rank}\n")
+        self.n_bases += length
+        return n_id, length
+
+    def edge(self, n1, n2):
+        self.edges.append(f"L\t{n1}\t+\t{n2}\t+\t0M\n")
+
+    def alt_branch(self, offset, depth):
+        """
+        writes an alternative allele, a single node or a nested bubble
+        returns its first and last node, and the walk and sequence length of the first path through it
+        """
+        first, first_length = self.node(offset, 1)
+        if depth >= MAX_NESTING or self.rng.random() >= self.nesting_density:
+            return first, first, [first], first_length
+        self.n_bubbles += 1
+        inner_1 = self.alt_branch(offset, depth + 1)
+        inner_2 = self.alt_branch(offset, depth + 1)
+        last, last_length = self.node(offset, 1)
+        for inner_first, inner_last, _, _ in (inner_1, inner_2):
+            self.edge(first, inner_first)
+            self.edge(inner_last, last)
+        return first, last, [first] + inner_1[2] + [last], first_length + inner_1[3] + last_length
+
+    def generate(self, n_nodes):
+        """
+        generates nodes until at least n_nodes are written, then writes the edges and the paths
+        """
+        offset = 0
+        prev, length = self.node(offset, 0)
+        offset += length
+        ref_walk = [prev]
+        alt_walk = [prev]
+        alt_length = length
+        while self.n_nodes < n_nodes:
+            if self.rng.random() < self.bubble_density:
+                self.n_bubbles += 1
+                ref_allele, length = self.node(offset, 0)
+                alt_first, alt_last, walk, walk_length = self.alt_branch(offset, 1)
+                offset += length
+                sink, length = self.node(offset, 0)
+                alt_length += walk_length
+                self.edge(prev, ref_allele)
+                self.edge(ref_allele, sink)
+                self.edge(prev, alt_first)
+                self.edge(alt_last, sink)
+                ref_walk += [ref_allele, sink]
+                alt_walk += walk + [sink]
+            else:
+                sink, length = self.node(offset, 0)
+                self.edge(prev, sink)
+                ref_walk.append(sink)
+                alt_walk.append(sink)
+            offset += length
+            alt_length += length
+            prev = sink
+
+        for edge in self.edges:
+            self.f.write(edge)
+        self.f.write("P\tref\t" + ",".join(n + "+" for n in ref_walk) + "\t*\n")
+        self.f.write(f"W\tsample\t1\t{CONTIG}\t0\t{alt_length}\t" + "".join(">" + n for n in alt_walk) + "\n")
+
+
+def generate_gfa(output_file, n_nodes, mean_length=20, length_distribution="lognormal",
+                 bubble_density=0.5, nesting_density=0.1, seed=1):
+    """
+    writes a synthetic graph of about n_nodes nodes into output_file
+    returns a dictionary with the number of nodes, edges, bases and bubbles
+    """
+    with open(output_file, "w") as f:
+        f.write("H\tVN:Z:1.0\n")
+        generator = GraphGenerator(f, mean_length, length_distribution, bubble_density, nesting_density, seed)
+        generator.generate(n_nodes)
+    logger.info(f"Generated {output_file} with {generator.n_nodes} nodes and {generator.n_bubbles} bubbles")
+    return {"n_nodes": generator.n_nodes, "n_edges": len(generator.edges),
+            "n_bases": generator.n_bases, "n_bubbles": generator.n_bubbles}
@@ -0,0 +1,288 @@
+"""
+Benchmarks of the indexing and of the queries on a synthetic graph, for both Graph and ChGraph.
+Each measurement is a record with the name of the benchmark, the parameters it was run with
+and the summary of the timings in seconds, so results of different releases can be compared record by record.
+"""
+import os
+import sys
+import time
+import random
+import logging
+import platform
+import statistics
+from contextlib import contextmanager
+from extgfa.__version__ import version
+from extgfa.Graph import Graph
+from extgfa.ChGraph import ChGraph
+from extgfa.find_bubbles import find_sb_alg
+from extgfa.bubble_decomposition import bubble_decomposition
+from extgfa.benchmark.generator import generate_gfa
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+ALGORITHMS = ("bfs", "lv", "gm", "kl")
+
+
+@contextmanager
+def quiet():
+    """
+    silences the logs of extgfa while timing, they are written on every chunk load
+    """
+    logging.disable(logging.WARNING)
+    try:
+        yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+def summary(seconds):
+    """
+    returns the summary of a list of timings
+    """
+    return {"runs": len(seconds), "total": sum(seconds), "min": min(seconds), "median": statistics.median(seconds),
+            "mean": statistics.mean(seconds), "max": max(seconds)}
+
+
+def timed(func, *args, **kwargs):
+    """
+    returns (seconds, result) of calling func
+    """
+    start = time.perf_counter()
+    with quiet():
+        result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def partitioner(algorithm):
+    if algorithm == "bfs":
+        from extgfa.bfs_partitioning import bfs_main
+        return bfs_main
+    if algorithm == "gm":
+        from extgfa.greedy_modularity_communities_partitioning import gm_main
+        return gm_main
+    if algorithm == "lv":
+        from extgfa.louvian_partitioning import lv_main
+        return lv_main
+    if algorithm == "kl":
+        from extgfa.kl_algorithm_partitioning import kl_main
+        return kl_main
+    raise ValueError(f"unknown algorithm {algorithm}, use one of {ALGORITHMS}")
+
+
+def bfs_chunk_index(gfa_file, top_threshold, btm_threshold):
+    """
+    returns the chunk index of the BFS partitioner, to time final_output on its own
+    """
+    from extgfa.bfs_partitioning import read_adjacency, grow_chunks, merge_small_chunks
+    node_ids, _, adjacency = read_adjacency(gfa_file)
+    weights = [1] * len(node_ids)
+    chunk_of, n_chunks = grow_chunks(adjacency, weights, top_threshold)
+    chunks = merge_small_chunks(adjacency, weights, chunk_of, n_chunks, top_threshold, btm_threshold)
+    return [[node_ids[n] for n in chunk] for chunk in chunks]
+
+
+def add_bubble(bubbles, bubble):
+    if bubble['source'] > bubble['sink']:
+        bubbles.add((bubble['source'], bubble['sink']))
+    else:
+        bubbles.add((bubble['sink'], bubble['source']))
+
+
+def count_bubbles(graph):
+    """
+    counts the bubbles of a Graph, same as count_bubbles.py
+    """
+    bubbles = set()
+    for n in graph.nodes.values():
+        for d in [0, 1]:
+            bubble = find_sb_alg(graph, n, d)
+            if bubble:
+                add_bubble(bubbles, bubble)
+    return len(bubbles)
+
+
+def count_bubbles_chunked(graph):
+    """
+    counts the bubbles of a ChGraph going through the chunks in order
+    """
+    bubbles = set()
+    for chunk_id in range(1, len(graph.offsets) + 1):
+        if chunk_id not in graph.loaded_c:
+            graph.load_chunk(chunk_id)
+        chunk_nodes = [n for n, node in graph.nodes.items() if node.chunk_id == chunk_id]
+        for n in chunk_nodes:
+            for d in [0, 1]:
+                if n not in graph.nodes:
+                    graph.load_chunk(graph.get_node_chunk(n))
+                bubble = find_sb_alg(graph, graph.nodes[n], d)
+                if bubble:
+                    add_bubble(bubbles, bubble)
+    return len(bubbles)
+
+
+def open_chunked(graph_file, loaded_c_limit):
+    graph = ChGraph(graph_file)
+    graph.loaded_c_limit = loaded_c_limit
+    return graph
+
+
+def chunked_path_seq(graph, name):
+    return "".join(graph.iter_path_seq(name))
+
+
+class Suite:
+    """
+    Runs the benchmarks and collects the records
+    """
+
+    def __init__(self, workdir, seed=1):
+        self.workdir = workdir
+        self.rng = random.Random(seed)
+        self.records = []
+
+    def record(self, benchmark, seconds, **params):
+        if not isinstance(seconds, list):
+            seconds = [seconds]
+        self.records.append({"benchmark": benchmark, **params, **summary(seconds)})
+        logger.info(f"{benchmark} {params}: median {statistics.median(seconds):.4f} seconds")
+
+    def error(self, benchmark, exception, **params):
+        self.records.append({"benchmark": benchmark, **params, "error": repr(exception)})
+        logger.warning(f"{benchmark} {params} failed with {exception!r}")
+
+    def run_partitioning(self, gfa_file, algorithms, top_threshold, btm_threshold):
+        """
+        partitions the graph with each algorithm, returns a dictionary of algorithm: chunked graph
+        """
+        graphs = dict()
+        for algorithm in algorithms:
+            output = os.path.join(self.workdir, f"chunked_{algorithm}")
+            try:
+                seconds, _ = timed(partitioner(algorithm), gfa_file, output, top_threshold, btm_threshold)
+            except (Exception, SystemExit) as e:  # the partitioners exit on some inputs
+                self.error("partition", e, algorithm=algorithm)
+                continue
+            graphs[algorithm] = output + ".gfa"
+            self.record("partition", seconds, algorithm=algorithm, n_chunks=len(ChGraph(graphs[algorithm]).offsets))
+
+        from extgfa.utilities import final_output
+        with quiet():
+            chunk_index = bfs_chunk_index(gfa_file, top_threshold, btm_threshold)
+        seconds, _ = timed(final_output, chunk_index, gfa_file, os.path.join(self.workdir, "final_output"))
+        self.record("final_output", seconds, n_chunks=len(chunk_index))
+        return graphs
+
+    def run_graph(self, graph, start_nodes, bfs_sizes):
+        """
+        query benchmarks on the completely loaded Graph
+        """
+        for size in bfs_sizes:
+            seconds = [timed(graph.bfs, start, size)[0] for start in start_nodes]
+            self.record("bfs", seconds, graph_class="Graph", size=size)
+        seconds, n_bubbles = timed(count_bubbles, graph)
+        self.record("bubbles", seconds, graph_class="Graph", n_bubbles=n_bubbles)
+        seconds, (bubbles, chains) = timed(bubble_decomposition, graph)
+        self.record("bubble_decomposition", seconds, graph_class="Graph", n_bubbles=len(bubbles), n_chains=len(chains))
+        for name in graph.paths:
+            seconds, seq = timed(graph.extract_path_seq, name)
+            self.record("path_seq", seconds, graph_class="Graph", path=name, length=len(seq))
+
+    def run_chunked(self, algorithm, graph_file, start_nodes, bfs_sizes, limits, max_chunks=200):
+        """
+        query benchmarks on a chunked graph, each run starting from an empty ChGraph
+        """
+        graph = ChGraph(graph_file)
+        chunk_ids = list(range(1, len(graph.offsets) + 1))
+        if len(chunk_ids) > max_chunks:
+            chunk_ids = sorted(self.rng.sample(chunk_ids, max_chunks))
+        seconds = []
+        for chunk_id in chunk_ids:
+            graph.clear()
+            seconds.append(timed(graph.load_chunk, chunk_id)[0])
+        self.record("load_chunk", seconds, graph_class="ChGraph", partition=algorithm)
+
+        for limit in limits:
+            params = {"graph_class": "ChGraph", "partition": algorithm, "loaded_c_limit": limit}
+            for size in bfs_sizes:
+                runs = [timed(open_chunked(graph_file, limit).bfs, start, size) for start in start_nodes]
+                self.record("bfs", [seconds for seconds, _ in runs], size=size, **params)
+                self.run_tiered(graph_file, start_nodes, size, [result for _, result in runs], params)
+            try:
+                seconds, n_bubbles = timed(count_bubbles_chunked, open_chunked(graph_file, limit))
+            except KeyError as e:  # find_sb_alg fails when the chunk of the source is evicted during the search
+                self.error("bubbles", e, **params)
+            else:
+                self.record("bubbles", seconds, n_bubbles=n_bubbles, **params)
+            seconds, (bubbles, chains) = timed(bubble_decomposition, open_chunked(graph_file, limit))
+            self.record("bubble_decomposition", seconds, n_bubbles=len(bubbles), n_chains=len(chains), **params)
+            graph = open_chunked(graph_file, limit)
+            if graph.path_index() is not None:
+                for name in graph.path_names():
+                    seconds, seq = timed(chunked_path_seq, open_chunked(graph_file, limit), name)
+                    self.record("path_seq", seconds, path=name, length=len(seq), **params)
+
+
+    def run_tiered(self, graph_file, start_nodes, size, neighborhoods, params):
+        """
+        the same BFS with only the chunk of the start node in the full tier and the other chunks at the topology
+        and summary tiers, the neighborhoods must be the ones found with the full tier only
+        """
+        limit = params["loaded_c_limit"]
+        seconds = []
+        for start, neighborhood in zip(start_nodes, neighborhoods):
+            graph = open_chunked(graph_file, limit)
+            graph.topology_c_limit = 2 * limit
+            graph.full_radius = 0
+            try:
+                with quiet():
+                    graph.set_focus(start, 0)
+                run_time, result = timed(graph.bfs, start, size)
+                graph.clear()
+            except Exception as e:
+                self.error("bfs_tiered", e, size=size, **params)
+                return
+            if result != neighborhood:
+                self.error("bfs_tiered", ValueError(f"the neighborhood of {start} differs without the tiers"),
+                           size=size, **params)
+                return
+            seconds.append(run_time)
+        self.record("bfs_tiered", seconds, size=size, topology_c_limit=2 * limit, **params)
+
+
+def run_suite(workdir, n_nodes=20_000, mean_length=20, length_distribution="lognormal", bubble_density=0.5,
+              nesting_density=0.1, algorithms=("bfs", "lv"), top_threshold=500, btm_threshold=50,
+              limits=(2, 10, 50), bfs_sizes=(100, 1000, 10_000), repeats=3, seed=1):
+    """
+    generates a graph in workdir and runs all the benchmarks on it
+    returns a dictionary with the environment, the parameters and the list of records, ready to be dumped as JSON
+    """
+    config = {"n_nodes": n_nodes, "mean_length": mean_length, "length_distribution": length_distribution,
+              "bubble_density": bubble_density, "nesting_density": nesting_density, "algorithms": list(algorithms),
+              "top_threshold": top_threshold, "btm_threshold": btm_threshold, "limits": list(limits),
+              "bfs_sizes": list(bfs_sizes), "repeats": repeats, "seed": seed}
+    suite = Suite(workdir, seed)
+
+    gfa_file = os.path.join(workdir, "synthetic.gfa")
+    seconds, graph_info = timed(generate_gfa, gfa_file, n_nodes, mean_length, length_distribution,
+                                bubble_density, nesting_density, seed)
+    suite.record("generate", seconds, **graph_info)
+
+    seconds = []
+    for _ in range(repeats):
+        parse_time, graph = timed(Graph, gfa_file)
+        seconds.append(parse_time)
+    suite.record("parse", seconds, graph_class="Graph")
+
+    start_nodes = suite.rng.sample(sorted(graph.nodes), repeats)
+    suite.run_graph(graph, start_nodes, bfs_sizes)
+    del graph
+
+    graphs = suite.run_partitioning(gfa_file, algorithms, top_threshold, btm_threshold)
+    for algorithm, graph_file in graphs.items():
+        suite.run_chunked(algorithm, graph_file, start_nodes, bfs_sizes, limits)
+
+    return {"extgfa_version": version, "python": sys.version.split()[0], "platform": platform.platform(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": config, "graph": graph_info,
+            "records": suite.records}
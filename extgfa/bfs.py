@@ -7,12 +7,15 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
 
 def main_while_loop(graph, start_node, queue, visited, n_size):
     neighborhood = {start_node}
+    # same content as the queue, for constant time membership checks
+    queued = set(queue)
     counter = 0
     while len(queue) > 0 and len(neighborhood) <= n_size:
         counter += 1
         if counter % 100 == 0:
-            logging.info(f"BFS neighborhood is of length {len(neighborhood)}")
+            logger.debug(f"BFS neighborhood is of length {len(neighborhood)}")
         start = queue.popleft()
+        queued.discard(start)
 
         if start not in neighborhood:
             neighborhood.add(start)
@@ -22,8 +25,9 @@ def main_while_loop(graph, start_node, queue, visited, n_size):
         neighbors = graph.neighbors(start)
 
         for n in neighbors:
-            if n not in visited and n not in queue:
+            if n not in visited and n not in queued:
                 queue.append(n)
+                queued.add(n)
 
     return neighborhood
 
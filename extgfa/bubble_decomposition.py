@@ -0,0 +1,194 @@
+"""
+Whole-graph superbubble decomposition with the nesting of the bubbles and the bubble chains,
+for both Graph and ChGraph.
+
+The bubbles are the ones find_sb_alg finds, but the graph is processed in a single pass instead of searching
+from both sides of every node:
+- a search only starts from a node side with at least two children, a side with one child is never the source
+  of a superbubble in a compacted graph
+- a bubble found from its source is not searched again from its sink
+so the work is the sum of the sizes of the bubbles, plus the failed searches from the branching node sides.
+This is linear in the graph size times the nesting depth for graphs made of bubbles, but not linear in general:
+a failed search can walk far before it stops, like with find_sb_alg, so a graph with many branching node sides
+that are not the source of a bubble can take up to quadratic time.
+
+On a ChGraph, the chunks are processed in order and during a search only the chunks it has reached are kept loaded.
+A search that reaches more than loaded_c_limit chunks is given up, so no more than loaded_c_limit chunks are held
+at the same time, besides the ones the children of a single node are loaded from, and the bubbles spanning more
+chunks than that are not found; the number of searches given up is logged.
+
+Every bubble is a dictionary with its id, source, sink, the sides of the source and sink facing the inside
+(source_side, sink_side), the inside nodes, the id of its parent bubble (None at the top level), the ids of its
+children and the id of its chain. A chain is a list of bubble ids with the same parent, each bubble sharing its
+sink or source with the next one.
+"""
+import logging
+from collections import defaultdict
+from extgfa.find_bubbles import find_sb_alg
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+
+def search_side(graph, node, side, bubbles, done):
+    """
+    searches for a bubble with node as the source on side, unless the side cannot be a source or was already
+    found as the sink of a bubble
+    """
+    if (node.id, side) in done or len(node.start if side == 0 else node.end) < 2:
+        return
+    bubble = find_sb_alg(graph, node, side)
+    if bubble is None:
+        return
+    done.add((bubble["sink"], bubble["sink_side"]))
+    bubble["id"] = len(bubbles)
+    bubbles.append(bubble)
+
+
+def find_all_bubbles(graph):
+    """
+    returns the list of the bubbles of a Graph
+    """
+    bubbles = []
+    done = set()
+    for counter, node in enumerate(graph.nodes.values(), 1):
+        if counter % 100_000 == 0:
+            logger.info(f"Processed {counter} nodes and have found {len(bubbles)} bubbles")
+        for side in (0, 1):
+            search_side(graph, node, side, bubbles, done)
+    return bubbles
+
+
+class SearchAborted(Exception):
+    """
+    raised when a search on a ChGraph reaches more chunks than it is allowed to hold
+    """
+
+
+class ChunkedSearch:
+    """
+    view of a ChGraph for one find_sb_alg search, the chunks the search reaches are kept loaded and the other ones
+    are evicted above max_chunks, the search is given up when it reaches more than max_chunks chunks
+    the graph is expected to have no chunk limit while the search runs, so loading the chunks of several children
+    at once does not evict the ones the search is in
+    """
+
+    def __init__(self, graph, max_chunks):
+        self.graph = graph
+        self.max_chunks = max_chunks
+        self.reached = set()
+
+    @property
+    def nodes(self):
+        return self.graph.nodes
+
+    def children(self, node_id, direction):
+        graph = self.graph
+        children = graph.children(node_id, direction)
+        self.reached.add(graph.nodes[node_id].chunk_id)
+        self.reached.update(graph.nodes[child].chunk_id for child, _ in children)
+        if len(self.reached) > self.max_chunks:
+            raise SearchAborted(f"the search from {node_id} reached more than {self.max_chunks} chunks")
+        if len(graph.loaded_c) > self.max_chunks:
+            graph.loaded_c_limit = self.max_chunks
+            graph.trim_chunks(keep=self.reached)
+            graph.loaded_c_limit = float("inf")
+        return children
+
+
+def find_all_bubbles_chunked(graph):
+    """
+    returns the list of the bubbles of a ChGraph, going through the chunks in order
+    """
+    bubbles = []
+    done = set()
+    limit = graph.loaded_c_limit
+    n_aborted = 0
+    try:
+        for chunk_id in range(1, len(graph.offsets) + 1):
+            if chunk_id not in graph.loaded_c:
+                graph.load_chunk(chunk_id)
+            chunk_nodes = [n for n, node in graph.nodes.items() if node.chunk_id == chunk_id]
+            for n in chunk_nodes:
+                for side in (0, 1):
+                    if n not in graph.nodes:
+                        graph.load_chunk(chunk_id)
+                    graph.loaded_c_limit = float("inf")
+                    try:
+                        search_side(ChunkedSearch(graph, limit), graph.nodes[n], side, bubbles, done)
+                    except SearchAborted as e:
+                        logger.debug(f"Gave up a bubble search, {e}")
+                        n_aborted += 1
+                    # back to the limit, keeping the chunk being processed
+                    graph.loaded_c_limit = limit
+                    graph.trim_chunks(keep={chunk_id})
+            logger.debug(f"Finished chunk {chunk_id} and have {len(bubbles)} bubbles")
+    finally:
+        graph.loaded_c_limit = limit
+    if n_aborted:
+        logger.warning(f"{n_aborted} bubble searches reached more than {limit} chunks and were given up, "
+                       f"the bubbles spanning more chunks than loaded_c_limit are missing")
+    return bubbles
+
+
+def nest_bubbles(bubbles):
+    """
+    sets the parent and children of the bubbles, the parent of a bubble being the smallest bubble
+    with its source or sink inside
+    """
+    owner = dict()  # node id: smallest bubble seen so far with the node inside
+    for bubble in sorted(bubbles, key=lambda b: len(b["inside"]), reverse=True):
+        bubble["children"] = []
+        parent = owner.get(bubble["source"], owner.get(bubble["sink"]))
+        bubble["parent"] = None if parent is None else parent["id"]
+        if parent is not None:
+            parent["children"].append(bubble["id"])
+        for n in bubble["inside"]:
+            owner[n] = bubble
+    for bubble in bubbles:
+        bubble["children"].sort()
+
+
+def chain_bubbles(bubbles):
+    """
+    sets the chain of the bubbles and returns the list of chains, each one the list of its bubble ids in order
+    bubbles are chained when they share a source or sink and have the same parent
+    """
+    by_end = defaultdict(list)  # (node id, parent): bubbles with the node as source or sink
+    for bubble in bubbles:
+        by_end[(bubble["source"], bubble["parent"])].append(bubble["id"])
+        by_end[(bubble["sink"], bubble["parent"])].append(bubble["id"])
+
+    def next_bubbles(bubble):
+        return [b for end in ("source", "sink") for b in by_end[(bubble[end], bubble["parent"])] if b != bubble["id"]]
+
+    chains = []
+    # the chains are walked from one of their ends, the ones left are circular and walked from any bubble
+    ends = [b for b in bubbles if len(next_bubbles(b)) <= 1]
+    for bubble in ends + bubbles:
+        if "chain" in bubble:
+            continue
+        chain = []
+        current = bubble
+        while current is not None:
+            current["chain"] = len(chains)
+            chain.append(current["id"])
+            current = next((bubbles[b] for b in next_bubbles(current) if "chain" not in bubbles[b]), None)
+        chains.append(chain)
+    return chains
+
+
+def bubble_decomposition(graph):
+    """
+    returns the list of the bubbles of a Graph or ChGraph with their nesting and chains, and the list of chains
+    """
+    if hasattr(graph, "loaded_c"):
+        bubbles = find_all_bubbles_chunked(graph)
+    else:
+        bubbles = find_all_bubbles(graph)
+    nest_bubbles(bubbles)
+    chains = chain_bubbles(bubbles)
+    logger.info(f"Found {len(bubbles)} bubbles in {len(chains)} chains, "
+                f"{sum(1 for b in bubbles if b['parent'] is None)} of them at the top level")
+    return bubbles, chains
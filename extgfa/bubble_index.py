@@ -0,0 +1,150 @@
+"""
+Bubble index written at indexing time with --bubbles, so bubble queries on a chunked graph need no traversal.
+
+Each bubble (see bubble_decomposition.py) is stored once, in the table of the chunk of its source (its home chunk),
+with its chunk span, the sorted ids of the chunks its source, sink and inside nodes are in.
+The table of a chunk also lists the ids of the bubbles from other chunks that span it, and for each node of the chunk
+that is inside a bubble, the id of the innermost one.
+
+The index is written next to the chunked graph (.bubbles) and as the BUBBLES section of the container.
+Layout, all integers little-endian:
+header:             magic b"XGBI", format version (u16), reserved (u16), number of chunks (u64), number of bubbles (u64)
+chunk directory:    one record per chunk, offset of its table from the start of the index (u64), length (u64)
+bubble directory:   home chunk of each bubble id (u32)
+tables:             one JSON object per chunk with the "bubbles" homed in the chunk, the ids of the "spanning" bubbles
+                    homed in other chunks, and the "nodes" dictionary of node id: innermost bubble id
+"""
+import mmap
+import json
+import struct
+import logging
+from collections import defaultdict
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+BUBBLE_MAGIC = b"XGBI"
+BUBBLE_VERSION = 1
+BUBBLE_HEADER = struct.Struct("<4sHHQQ")
+BUBBLE_RECORD = struct.Struct("<QQ")
+HOME_RECORD = struct.Struct("<I")
+
+
+def write_bubble_index(graph, n_chunks, bubbles, output_file):
+    """
+    writes the bubble index of a Graph with the chunk ids assigned
+    bubbles: the bubbles of bubble_decomposition, with their ids from 0
+    """
+    homed = defaultdict(list)
+    spanning = defaultdict(list)
+    innermost = defaultdict(dict)
+    for bubble in sorted(bubbles, key=lambda b: len(b["inside"]), reverse=True):
+        span = {graph.nodes[n].chunk_id for n in bubble["inside"]}
+        span.add(graph.nodes[bubble["source"]].chunk_id)
+        span.add(graph.nodes[bubble["sink"]].chunk_id)
+        home = graph.nodes[bubble["source"]].chunk_id
+        homed[home].append(dict(bubble, chunks=sorted(span)))
+        for chunk_id in span:
+            if chunk_id != home:
+                spanning[chunk_id].append(bubble["id"])
+        # the bigger bubbles come first, so the inner ones overwrite them
+        for n in bubble["inside"]:
+            innermost[graph.nodes[n].chunk_id][n] = bubble["id"]
+
+    homes = [0] * len(bubbles)
+    tables = []
+    for chunk_id in range(1, n_chunks + 1):
+        for bubble in homed[chunk_id]:
+            homes[bubble["id"]] = chunk_id
+        table = {"bubbles": sorted(homed[chunk_id], key=lambda b: b["id"]), "spanning": sorted(spanning[chunk_id]),
+                 "nodes": innermost[chunk_id]}
+        tables.append(json.dumps(table, separators=(",", ":")).encode())
+
+    with open(output_file, "wb") as f:
+        f.write(BUBBLE_HEADER.pack(BUBBLE_MAGIC, BUBBLE_VERSION, 0, n_chunks, len(bubbles)))
+        position = BUBBLE_HEADER.size + n_chunks * BUBBLE_RECORD.size + len(bubbles) * HOME_RECORD.size
+        for table in tables:
+            f.write(BUBBLE_RECORD.pack(position, len(table)))
+            position += len(table)
+        for home in homes:
+            f.write(HOME_RECORD.pack(home))
+        for table in tables:
+            f.write(table)
+    return len(bubbles)
+
+
+class BubbleIndex:
+    """
+    Memory-mapped bubble index, the table of a chunk is parsed the first time it is needed
+    """
+
+    def __init__(self, index_file, offset=0, length=None):
+        """
+        offset and length give the byte range of the index in the file, by default the whole file
+        """
+        with open(index_file, "rb") as f:
+            # the map stays valid after the file is closed
+            index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if length is None:
+            length = len(index_map) - offset
+        self.buffer = memoryview(index_map)[offset:offset + length]
+        magic, version, _, self.n_chunks, self.n_bubbles = BUBBLE_HEADER.unpack_from(self.buffer, 0)
+        if magic != BUBBLE_MAGIC:
+            raise ValueError(f"{index_file} does not have a bubble index")
+        if version > BUBBLE_VERSION:
+            raise ValueError(f"{index_file} has bubble index version {version}, "
+                             f"but this version of extgfa only reads up to version {BUBBLE_VERSION}")
+        self.homes_start = BUBBLE_HEADER.size + self.n_chunks * BUBBLE_RECORD.size
+        self.tables = dict()
+
+    def __len__(self):
+        return self.n_bubbles
+
+    def read_table(self, chunk_id):
+        if not isinstance(chunk_id, int) or not 1 <= chunk_id <= self.n_chunks:
+            raise KeyError(chunk_id)
+        offset, length = BUBBLE_RECORD.unpack_from(self.buffer, BUBBLE_HEADER.size + (chunk_id - 1) * BUBBLE_RECORD.size)
+        table = json.loads(bytes(self.buffer[offset:offset + length]))
+        table["by_id"] = {b["id"]: b for b in table["bubbles"]}
+        return table
+
+    def chunk(self, chunk_id):
+        """
+        returns the table of a chunk, kept after the first time
+        """
+        table = self.tables.get(chunk_id)
+        if table is None:
+            table = self.read_table(chunk_id)
+            self.tables[chunk_id] = table
+        return table
+
+    def bubble(self, bubble_id):
+        """
+        returns a bubble by id
+        """
+        if not 0 <= bubble_id < self.n_bubbles:
+            raise KeyError(bubble_id)
+        home = HOME_RECORD.unpack_from(self.buffer, self.homes_start + bubble_id * HOME_RECORD.size)[0]
+        return self.chunk(home)["by_id"][bubble_id]
+
+    def in_chunk(self, chunk_id):
+        """
+        returns the bubbles with a node in the chunk, the ones homed in it first
+        """
+        table = self.chunk(chunk_id)
+        return table["bubbles"] + [self.bubble(b) for b in table["spanning"]]
+
+    def innermost(self, chunk_id, node_id):
+        """
+        returns the id of the innermost bubble with the node inside, None if there is none
+        """
+        return self.chunk(chunk_id)["nodes"].get(node_id)
+
+    def __iter__(self):
+        """
+        yields all the bubbles, chunk by chunk, without keeping the tables
+        """
+        for chunk_id in range(1, self.n_chunks + 1):
+            table = self.tables.get(chunk_id) or self.read_table(chunk_id)
+            yield from table["bubbles"]
@@ -0,0 +1,300 @@
+"""
+Offline replay of a chunk access trace (see chunk_trace.py) against simulated chunk caches,
+to compare eviction policies, cache sizes and partitions without rerunning the workload.
+
+The capacity of a cache is either a number of chunks, like loaded_c_limit, or a budget in bytes of chunk data.
+Policies:
+fifo    evicts the chunk loaded first, what ChGraph does
+lru     evicts the least recently used chunk
+lfu     evicts the least frequently used chunk since it was loaded, the least recently used one on ties
+arc     adaptive replacement cache (Megiddo and Modha), balancing recency and frequency, only with chunk counts
+belady  evicts the chunk whose next use is the farthest in the future, the optimal policy for chunk counts
+        (with byte budgets it is the usual farthest-next-use heuristic, not strictly optimal)
+"""
+import heapq
+import logging
+from collections import OrderedDict
+from extgfa.chunk_trace import LOAD
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+POLICIES = ("fifo", "lru", "lfu", "arc", "belady")
+NEVER = float("inf")
+
+
+class Cache:
+    """
+    Base class of the simulated caches, the subclasses implement the policy with
+    hit(chunk_id, next_use), insert(chunk_id, next_use) and evict() returning the evicted chunk
+    size: function returning the size of a chunk in the unit of the capacity
+    """
+
+    def __init__(self, capacity, size):
+        self.capacity = capacity
+        self.size = size
+        self.used = 0
+        self.evictions = 0
+
+    def access(self, chunk_id, next_use):
+        """
+        returns True if the chunk is in the cache, otherwise loads it, evicting chunks until it fits, and returns False
+        next_use: position of the next access to the same chunk in the trace, only used by belady
+        """
+        if chunk_id in self:
+            self.hit(chunk_id, next_use)
+            return True
+        n = self.size(chunk_id)
+        if n > self.capacity:  # read without being cached
+            return False
+        while self.used + n > self.capacity:
+            self.used -= self.size(self.evict())
+            self.evictions += 1
+        self.insert(chunk_id, next_use)
+        self.used += n
+        return False
+
+
+class FIFOCache(Cache):
+    def __init__(self, capacity, size):
+        super().__init__(capacity, size)
+        self.queue = OrderedDict()
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self.queue
+
+    def hit(self, chunk_id, next_use):
+        pass
+
+    def insert(self, chunk_id, next_use):
+        self.queue[chunk_id] = None
+
+    def evict(self):
+        return self.queue.popitem(last=False)[0]
+
+
+class LRUCache(FIFOCache):
+    def hit(self, chunk_id, next_use):
+        self.queue.move_to_end(chunk_id)
+
+
+class LFUCache(Cache):
+    def __init__(self, capacity, size):
+        super().__init__(capacity, size)
+        self.entries = dict()  # chunk_id: (frequency, time of last use)
+        self.heap = []  # entries that are not current any more are skipped when popping
+        self.time = 0
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self.entries
+
+    def push(self, chunk_id, frequency):
+        self.time += 1
+        self.entries[chunk_id] = (frequency, self.time)
+        heapq.heappush(self.heap, (frequency, self.time, chunk_id))
+
+    def hit(self, chunk_id, next_use):
+        self.push(chunk_id, self.entries[chunk_id][0] + 1)
+
+    def insert(self, chunk_id, next_use):
+        self.push(chunk_id, 1)
+
+    def evict(self):
+        while True:
+            frequency, time, chunk_id = heapq.heappop(self.heap)
+            if self.entries.get(chunk_id) == (frequency, time):
+                del self.entries[chunk_id]
+                return chunk_id
+
+
+class BeladyCache(Cache):
+    def __init__(self, capacity, size):
+        super().__init__(capacity, size)
+        self.next_use = dict()
+        self.heap = []  # (-next_use, chunk_id), entries that are not current any more are skipped when popping
+
+    def __contains__(self, chunk_id):
+        return chunk_id in self.next_use
+
+    def hit(self, chunk_id, next_use):
+        self.insert(chunk_id, next_use)
+
+    def insert(self, chunk_id, next_use):
+        self.next_use[chunk_id] = next_use
+        heapq.heappush(self.heap, (-next_use, chunk_id))
+
+    def evict(self):
+        while True:
+            next_use, chunk_id = heapq.heappop(self.heap)
+            if self.next_use.get(chunk_id) == -next_use:
+                del self.next_use[chunk_id]
+                return chunk_id
+
+
+class ARCCache:
+    """
+    Adaptive replacement cache with a capacity in chunks
+    t1 and t2 hold the cached chunks seen once and at least twice, b1 and b2 the ghosts of the chunks evicted from them
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.p = 0
+        self.t1, self.t2, self.b1, self.b2 = OrderedDict(), OrderedDict(), OrderedDict(), OrderedDict()
+        self.evictions = 0
+
+    def replace(self, chunk_id):
+        if self.t1 and (len(self.t1) > self.p or (chunk_id in self.b2 and len(self.t1) == self.p)):
+            self.b1[self.t1.popitem(last=False)[0]] = None
+        else:
+            self.b2[self.t2.popitem(last=False)[0]] = None
+        self.evictions += 1
+
+    def access(self, chunk_id, next_use):
+        if chunk_id in self.t1:
+            del self.t1[chunk_id]
+            self.t2[chunk_id] = None
+            return True
+        if chunk_id in self.t2:
+            self.t2.move_to_end(chunk_id)
+            return True
+        if chunk_id in self.b1:
+            self.p = min(self.capacity, self.p + max(len(self.b2) / len(self.b1), 1))
+            self.replace(chunk_id)
+            del self.b1[chunk_id]
+            self.t2[chunk_id] = None
+            return False
+        if chunk_id in self.b2:
+            self.p = max(0, self.p - max(len(self.b1) / len(self.b2), 1))
+            self.replace(chunk_id)
+            del self.b2[chunk_id]
+            self.t2[chunk_id] = None
+            return False
+        l1 = len(self.t1) + len(self.b1)
+        total = l1 + len(self.t2) + len(self.b2)
+        if l1 == self.capacity:
+            if len(self.t1) < self.capacity:
+                self.b1.popitem(last=False)
+                self.replace(chunk_id)
+            else:
+                self.t1.popitem(last=False)
+                self.evictions += 1
+        elif total >= self.capacity:
+            if total == 2 * self.capacity:
+                self.b2.popitem(last=False)
+            self.replace(chunk_id)
+        self.t1[chunk_id] = None
+        return False
+
+
+def make_cache(policy, capacity, sizes=None):
+    """
+    returns a simulated cache, the capacity is in chunks when sizes is None, otherwise in bytes
+    sizes: dictionary of chunk_id: size in bytes
+    """
+    if sizes is None:
+        size = lambda chunk_id: 1
+    else:
+        size = sizes.__getitem__
+    if policy == "fifo":
+        return FIFOCache(capacity, size)
+    if policy == "lru":
+        return LRUCache(capacity, size)
+    if policy == "lfu":
+        return LFUCache(capacity, size)
+    if policy == "belady":
+        return BeladyCache(capacity, size)
+    if policy == "arc":
+        if sizes is not None:
+            raise ValueError("arc can only be simulated with a capacity in chunks")
+        return ARCCache(capacity)
+    raise ValueError(f"unknown policy {policy}, use one of {POLICIES}")
+
+
+def chunk_runs(runs, node_chunks=None):
+    """
+    returns the list of [chunk_id, count] runs of consecutive accesses to the same chunk
+    node_chunks: dictionary of node_id: chunk_id of another partition to replay the trace on,
+    in which case the direct chunk loads of the trace are left out since they belong to the recorded partition
+    """
+    chunks = []
+    for node_id, chunk_id, count in runs:
+        if node_chunks is not None:
+            if node_id == LOAD:
+                continue
+            chunk_id = node_chunks.get(node_id)
+            if chunk_id is None:
+                continue
+        if chunks and chunks[-1][0] == chunk_id:
+            chunks[-1][1] += count
+        else:
+            chunks.append([chunk_id, count])
+    return chunks
+
+
+def next_uses(chunks):
+    """
+    returns for each run the index of the next run of the same chunk, NEVER if there is none
+    """
+    result = [NEVER] * len(chunks)
+    seen = dict()
+    for i in range(len(chunks) - 1, -1, -1):
+        result[i] = seen.get(chunks[i][0], NEVER)
+        seen[chunks[i][0]] = i
+    return result
+
+
+def simulate(chunks, policy, capacity, sizes=None, byte_budget=False, next_use=None):
+    """
+    replays the chunk runs against a cache
+    sizes: dictionary of chunk_id: size in bytes, to count the bytes read
+    byte_budget: the capacity is in bytes instead of chunks
+    returns a dictionary with the number of accesses, hits, misses (chunk loads), evictions and bytes read
+    """
+    cache = make_cache(policy, capacity, sizes if byte_budget else None)
+    if next_use is None:
+        next_use = next_uses(chunks) if policy == "belady" else [NEVER] * len(chunks)
+    accesses = 0
+    misses = 0
+    bytes_read = 0
+    for (chunk_id, count), nxt in zip(chunks, next_use):
+        accesses += count
+        if not cache.access(chunk_id, nxt):
+            misses += 1
+            if sizes is not None:
+                bytes_read += sizes[chunk_id]
+    result = {"policy": policy, "budget": "bytes" if byte_budget else "chunks", "capacity": capacity,
+              "accesses": accesses, "hits": accesses - misses, "misses": misses,
+              "miss_rate": misses / accesses if accesses else 0, "evictions": cache.evictions}
+    if sizes is not None:
+        result["bytes_read"] = bytes_read
+    return result
+
+
+def replay(runs, sizes, policies=POLICIES, limits=(10,), byte_budgets=(), node_chunks=None):
+    """
+    replays a trace against every policy and capacity
+    sizes: dictionary of chunk_id: size in bytes, used to estimate the bytes read and for the byte budgets
+    node_chunks: dictionary of node_id: chunk_id to replay the trace on another partition, see chunk_runs
+    returns the list of results of simulate
+    """
+    chunks = chunk_runs(runs, node_chunks)
+    belady_next = next_uses(chunks)
+    missing = {c for c, _ in chunks if c not in sizes}
+    if missing:
+        logger.warning(f"The sizes of {len(missing)} chunks are unknown, the bytes read and byte budgets are skipped")
+        sizes = None
+    results = []
+    for policy in policies:
+        next_use = belady_next if policy == "belady" else None
+        for limit in limits:
+            results.append(simulate(chunks, policy, limit, sizes, next_use=next_use))
+        if sizes is None or not byte_budgets:
+            continue
+        if policy == "arc":
+            logger.warning("arc is only simulated with chunk counts, skipping the byte budgets")
+            continue
+        for budget in byte_budgets:
+            results.append(simulate(chunks, policy, budget, sizes, byte_budget=True, next_use=next_use))
+    return results
@@ -0,0 +1,235 @@
+"""
+Fixed-width chunk directory, the index from the chunk ids to their location in the reordered GFA.
+It is written as the .index file next to the chunked graph and as the CHUNKDIR section of the container.
+
+The .index file is a small header, magic b"XGCI", format version (u16), flags (u16), number of chunks (u64),
+followed by one record per chunk, record i being chunk i + 1, all integers little-endian:
+offset (u64), length in bytes (u64), number of lines (u32), padding (u32)
+so a chunk is found by reading a single record, and nothing is parsed when the graph is opened.
+Older graphs with a pickled dictionary of chunk_id: [offset, n_lines] as .index are still read.
+
+When the flag SUMMARY_FLAG is set, the directory is followed by one summary record per chunk, in the same order,
+with the aggregates of SUMMARY_FIELDS (u64 each) then the histogram of the node degrees (u64 per bin,
+the last bin counting all the degrees from DEGREE_BINS - 1 up), so graph-wide statistics only need these records.
+The same records are the CHUNKSUM section of the container. Readers that ignore the flag still read the directory.
+The flag SQLITE_FLAG records that the node_id:chunk_id index of the graph is the .sqlite file written with
+--node-index sqlite, and not the dbm database, so ChGraph opens the one that was written with this index.
+"""
+import mmap
+import pickle
+import struct
+import logging
+from extgfa.sequence_utils import node_length
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+INDEX_MAGIC = b"XGCI"
+INDEX_VERSION = 1
+INDEX_HEADER = struct.Struct("<4sHHQ")
+CHUNK_RECORD = struct.Struct("<QQII")
+SUMMARY_FLAG = 1
+SQLITE_FLAG = 2
+# nodes, edges (each edge belongs to the chunk of its smaller end), bases, N bases,
+# tips (nodes with no edges on one side or both) and self-loops
+SUMMARY_FIELDS = ("nodes", "edges", "bases", "n_bases", "tips", "self_loops")
+DEGREE_BINS = 16
+CHUNK_SUMMARY = struct.Struct("<" + "Q" * (len(SUMMARY_FIELDS) + DEGREE_BINS))
+
+
+def chunk_lengths(chunk_offsets, data_end):
+    """
+    returns the length in bytes of each chunk, the chunks being written one after the other
+    chunk_offsets: dictionary of chunk_id: [offset, n_lines] with chunk ids from 1 to N
+    data_end: the offset where the last chunk ends
+    """
+    lengths = dict()
+    for chunk_id in range(1, len(chunk_offsets) + 1):
+        if chunk_id + 1 in chunk_offsets:
+            lengths[chunk_id] = chunk_offsets[chunk_id + 1][0] - chunk_offsets[chunk_id][0]
+        else:
+            lengths[chunk_id] = data_end - chunk_offsets[chunk_id][0]
+    return lengths
+
+
+def chunk_directory_bytes(chunk_offsets, lengths):
+    """
+    returns the records of the chunk directory
+    chunk_offsets: dictionary of chunk_id: [offset, n_lines] with chunk ids from 1 to N
+    lengths: dictionary of chunk_id: length of the chunk in bytes
+    """
+    records = bytearray()
+    for chunk_id in range(1, len(chunk_offsets) + 1):
+        offset, n_lines = chunk_offsets[chunk_id]
+        records += CHUNK_RECORD.pack(offset, lengths[chunk_id], n_lines, 0)
+    return bytes(records)
+
+
+def summarize_chunks(graph, n_chunks):
+    """
+    returns the list of the summary records of chunks 1 to n_chunks, see SUMMARY_FIELDS
+    graph: Graph with the chunk ids assigned
+    """
+    summaries = [[0] * (len(SUMMARY_FIELDS) + DEGREE_BINS) for _ in range(n_chunks)]
+    degrees = len(SUMMARY_FIELDS)
+    for n in graph.nodes.values():
+        summary = summaries[n.chunk_id - 1]
+        summary[0] += 1
+        summary[2] += node_length(n)
+        summary[3] += n.seq.count("N") + n.seq.count("n")
+        if not n.start or not n.end:
+            summary[4] += 1
+        for side, edges in ((0, n.start), (1, n.end)):
+            for other, other_side, _ in edges:
+                # every edge is stored on both of its ends, it is counted from the smaller end
+                if (n.id, side) <= (other, other_side):
+                    summary[1] += 1
+                    if other == n.id:
+                        summary[5] += 1
+        summary[degrees + min(len(n.start) + len(n.end), DEGREE_BINS - 1)] += 1
+    return summaries
+
+
+def chunk_summaries_bytes(summaries):
+    """
+    returns the summary records of summarize_chunks
+    """
+    return b"".join(CHUNK_SUMMARY.pack(*summary) for summary in summaries)
+
+
+def write_chunk_index(output_file, chunk_offsets, lengths, summaries=None, sqlite=False):
+    """
+    writes the .index file of a chunked graph
+    summaries: the records of summarize_chunks, appended after the directory if given
+    sqlite: the node index of the graph is the .sqlite file instead of the dbm database
+    """
+    with open(output_file, "wb") as f:
+        flags = 0 if summaries is None else SUMMARY_FLAG
+        if sqlite:
+            flags |= SQLITE_FLAG
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, flags, len(chunk_offsets)))
+        f.write(chunk_directory_bytes(chunk_offsets, lengths))
+        if summaries is not None:
+            f.write(chunk_summaries_bytes(summaries))
+
+
+def read_chunk_index(index_file):
+    """
+    returns the chunk directory of an .index file, memory-mapped so records are only read when a chunk is looked up,
+    or the dictionary of chunk_id: [offset, n_lines] for the older pickled indices
+    """
+    with open(index_file, "rb") as f:
+        magic = f.read(len(INDEX_MAGIC))
+        if magic != INDEX_MAGIC:
+            f.seek(0)
+            logger.info(f"{index_file} is a pickled index, consider re-indexing the graph for a faster startup")
+            return pickle.load(f)
+        # the map stays valid after the file is closed
+        index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    _, version, _, n_chunks = INDEX_HEADER.unpack_from(index_map, 0)
+    if version > INDEX_VERSION:
+        raise ValueError(f"{index_file} has index version {version}, "
+                         f"but this version of extgfa only reads up to version {INDEX_VERSION}")
+    start = INDEX_HEADER.size
+    return ChunkDirectory(memoryview(index_map)[start:start + n_chunks * CHUNK_RECORD.size])
+
+
+def read_index_flags(index_file):
+    """
+    returns the flags of an .index file, 0 for the older pickled indices
+    """
+    with open(index_file, "rb") as f:
+        header = f.read(INDEX_HEADER.size)
+    if len(header) < INDEX_HEADER.size or header[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+        return 0
+    return INDEX_HEADER.unpack(header)[2]
+
+
+def read_chunk_summaries(index_file):
+    """
+    returns the chunk summaries of an .index file, None if the index does not have them
+    """
+    with open(index_file, "rb") as f:
+        header = f.read(INDEX_HEADER.size)
+        if len(header) < INDEX_HEADER.size or header[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+            return None
+        _, _, flags, n_chunks = INDEX_HEADER.unpack(header)
+        if not flags & SUMMARY_FLAG:
+            return None
+        f.seek(INDEX_HEADER.size + n_chunks * CHUNK_RECORD.size)
+        return ChunkSummaries(f.read(n_chunks * CHUNK_SUMMARY.size))
+
+
+class ChunkDirectory:
+    """
+    Read-only view of the chunk directory records, returns (offset, n_lines) for a chunk id like the pickled dictionary
+    data_offset: added to all the offsets, the position of the chunks in the file
+    """
+
+    def __init__(self, buffer, data_offset=0):
+        self.buffer = buffer
+        self.data_offset = data_offset
+        self.n_chunks = len(buffer) // CHUNK_RECORD.size
+
+    def __len__(self):
+        return self.n_chunks
+
+    def __contains__(self, chunk_id):
+        return isinstance(chunk_id, int) and 1 <= chunk_id <= self.n_chunks
+
+    def __iter__(self):
+        return iter(range(1, self.n_chunks + 1))
+
+    def __getitem__(self, chunk_id):
+        if chunk_id not in self:
+            raise KeyError(chunk_id)
+        offset, _, n_lines, _ = CHUNK_RECORD.unpack_from(self.buffer, (chunk_id - 1) * CHUNK_RECORD.size)
+        return self.data_offset + offset, n_lines
+
+    def byte_range(self, chunk_id):
+        """
+        returns the (offset, length in bytes) of a chunk
+        """
+        if chunk_id not in self:
+            raise KeyError(chunk_id)
+        offset, length, _, _ = CHUNK_RECORD.unpack_from(self.buffer, (chunk_id - 1) * CHUNK_RECORD.size)
+        return self.data_offset + offset, length
+
+
+class ChunkSummaries:
+    """
+    Read-only view of the chunk summary records
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.n_chunks = len(buffer) // CHUNK_SUMMARY.size
+
+    def __len__(self):
+        return self.n_chunks
+
+    def __getitem__(self, chunk_id):
+        """
+        returns the summary of a chunk as a dictionary, the degree histogram as degree: number of nodes
+        """
+        if not isinstance(chunk_id, int) or not 1 <= chunk_id <= self.n_chunks:
+            raise KeyError(chunk_id)
+        return self.to_dict(CHUNK_SUMMARY.unpack_from(self.buffer, (chunk_id - 1) * CHUNK_SUMMARY.size))
+
+    @staticmethod
+    def to_dict(record):
+        summary = dict(zip(SUMMARY_FIELDS, record))
+        histogram = record[len(SUMMARY_FIELDS):]
+        summary["degrees"] = {degree: count for degree, count in enumerate(histogram) if count}
+        return summary
+
+    def total(self):
+        """
+        returns the sums over all the chunks, reading only the summary records
+        """
+        totals = [0] * (len(SUMMARY_FIELDS) + DEGREE_BINS)
+        for record in CHUNK_SUMMARY.iter_unpack(self.buffer):
+            for i, value in enumerate(record):
+                totals[i] += value
+        return self.to_dict(totals)
@@ -0,0 +1,130 @@
+"""
+Ordering of the chunks and of the nodes inside each chunk before the reordered GFA is written.
+The partitioning algorithms return the chunks in whatever order their communities come out,
+so two chunks that are neighbors in the graph can end up far apart in the output file.
+Here the chunks are laid out along the chunk adjacency graph (Cuthill-McKee) or along the
+reference coordinates (rGFA SN/SO tags), and the nodes inside a chunk are ordered the same way,
+so that traversals read mostly consecutive byte ranges of the reordered GFA.
+"""
+import logging
+from collections import deque, defaultdict
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+ORDERING_METHODS = ("bfs", "ref", "none")
+
+
+def cuthill_mckee(vertices, adjacency):
+    """
+    returns the vertices ordered with the Cuthill-McKee heuristic, i.e. a BFS started from a vertex of minimum
+    degree, where the neighbors of each vertex are visited in increasing order of degree
+    vertices: list of vertices, their position is used to break ties so the result is deterministic
+    adjacency: dictionary of vertex: set of neighboring vertices
+    """
+    rank = {v: idx for idx, v in enumerate(vertices)}
+    visited = set()
+    order = []
+    # each new connected component starts from its unvisited vertex with the smallest degree
+    for v in sorted(vertices, key=lambda x: (len(adjacency[x]), rank[x])):
+        if v in visited:
+            continue
+        visited.add(v)
+        queue = deque([v])
+        while queue:
+            current = queue.popleft()
+            order.append(current)
+            for nn in sorted(adjacency[current], key=lambda x: (len(adjacency[x]), rank[x])):
+                if nn not in visited:
+                    visited.add(nn)
+                    queue.append(nn)
+    return order
+
+
+def ref_key(node):
+    """
+    returns the reference coordinate sorting key (SR, SN, SO) of a node or None if the node has no rGFA tags
+    """
+    if "SN" not in node.tags or "SO" not in node.tags:
+        return None
+    rank = int(node.tags["SR"][1]) if "SR" in node.tags else 0
+    return rank, node.tags["SN"][1], int(node.tags["SO"][1])
+
+
+def node_neighbors_in_chunk(graph, chunk):
+    """
+    returns the adjacency dictionary of the subgraph induced by the nodes of a chunk
+    """
+    chunk_nodes = set(chunk)
+    adjacency = dict()
+    for n in chunk:
+        adjacency[n] = {x[0] for x in graph.nodes[n].start if x[0] in chunk_nodes and x[0] != n}
+        adjacency[n] |= {x[0] for x in graph.nodes[n].end if x[0] in chunk_nodes and x[0] != n}
+    return adjacency
+
+
+def chunk_adjacency(graph, chunk_index):
+    """
+    returns the chunk adjacency graph as a dictionary of chunk index: set of neighboring chunk indices
+    chunk_index: list of chunks, each chunk a list of node ids
+    """
+    chunk_of = dict()
+    for idx, chunk in enumerate(chunk_index):
+        for n in chunk:
+            chunk_of[n] = idx
+
+    adjacency = defaultdict(set)
+    for idx, chunk in enumerate(chunk_index):
+        adjacency[idx]  # chunks without neighbors still need an entry
+        for n in chunk:
+            for nn in graph.neighbors(n):
+                if nn in chunk_of and chunk_of[nn] != idx:
+                    adjacency[idx].add(chunk_of[nn])
+    return adjacency
+
+
+def order_by_reference(order, keys):
+    """
+    sorts the items that have a reference key by that key,
+    items without a key are placed after them keeping their order
+    """
+    with_key = sorted([x for x in order if keys[x] is not None], key=lambda x: keys[x])
+    return with_key + [x for x in order if keys[x] is None]
+
+
+def order_chunks(graph, chunk_index, method="bfs"):
+    """
+    returns a new chunk index where the chunks and the nodes inside each chunk are ordered for locality
+    graph: the Graph object with all the nodes loaded
+    chunk_index: list of chunks, each chunk a list of node ids
+    method: bfs for Cuthill-McKee order along the chunk adjacency graph,
+            ref for reference coordinate order using the rGFA tags, none to keep the partitioning order
+    """
+    if method not in ORDERING_METHODS:
+        raise ValueError(f"Ordering method {method} not supported, use one of {', '.join(ORDERING_METHODS)}")
+
+    if method == "none":
+        return chunk_index
+
+    adjacency = chunk_adjacency(graph, chunk_index)
+    chunk_order = cuthill_mckee(list(range(len(chunk_index))), adjacency)
+
+    if method == "ref":
+        chunk_keys = dict()
+        for idx, chunk in enumerate(chunk_index):
+            node_keys = [k for k in (ref_key(graph.nodes[n]) for n in chunk) if k is not None]
+            chunk_keys[idx] = min(node_keys) if node_keys else None
+        chunk_order = order_by_reference(chunk_order, chunk_keys)
+
+    ordered_index = []
+    for idx in chunk_order:
+        chunk = chunk_index[idx]
+        node_order = cuthill_mckee(chunk, node_neighbors_in_chunk(graph, chunk))
+        if method == "ref":
+            node_keys = {n: ref_key(graph.nodes[n]) for n in chunk}
+            node_order = order_by_reference(node_order, node_keys)
+        ordered_index.append(node_order)
+
+    logger.info(f"Ordered {len(ordered_index)} chunks using the {method} ordering")
+    return ordered_index
@@ -0,0 +1,118 @@
+"""
+Counters and histograms of the chunk cache of ChGraph.
+Everything is updated with a few integer operations per event so the statistics can stay on all the time,
+and ChGraph.get_stats() returns them as a dictionary, e.g. to size loaded_c_limit or to compare partitions.
+"""
+from collections import OrderedDict, defaultdict
+
+
+class Histogram:
+    """
+    Histogram with power of two buckets, bucket k counts the values v with 2^(k-1) <= v < 2^k (bucket 0 is v < 1)
+    """
+    __slots__ = ("buckets", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.buckets = defaultdict(int)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.buckets[int(value).bit_length()] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def to_dict(self):
+        """
+        returns the summary and the buckets as upper bound: count
+        """
+        return {"count": self.count, "total": self.total, "mean": self.total / self.count if self.count else 0,
+                "min": self.min, "max": self.max,
+                "buckets": {2 ** k: self.buckets[k] for k in sorted(self.buckets)}}
+
+
+class ChunkStats:
+    """
+    Statistics of the chunk cache
+    recent_window: number of evicted chunks remembered to count the reloads of recently evicted chunks
+    """
+
+    def __init__(self, recent_window=64):
+        self.recent_window = recent_window
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.loads = 0
+        self.evictions = 0
+        self.reloads = 0
+        self.bytes_read = 0
+        self.nodes_loaded = 0
+        self.recently_evicted = OrderedDict()
+        self.demotions = defaultdict(int)  # "from>to" tiers: count
+        self.promotions = defaultdict(int)
+        self.prefetched = 0  # chunks read in the background by set_focus
+        self.prefetch_waits = 0  # of which were still being read when they were needed
+        self.load_time = Histogram()  # microseconds to read and parse a chunk
+        self.load_bytes = Histogram()  # size of the loaded chunks
+        self.lookup_time = Histogram()  # microseconds per node_id:chunk_id lookup in the index
+
+    def access(self, kind, hit, n=1):
+        """
+        counts n node accesses of a kind (neighbors, children...) that were hits or misses of the loaded chunks
+        """
+        if hit:
+            self.hits[kind] += n
+        else:
+            self.misses[kind] += n
+
+    def load(self, chunk_id, n_bytes, n_nodes, seconds):
+        self.loads += 1
+        self.bytes_read += n_bytes
+        self.nodes_loaded += n_nodes
+        self.load_time.add(seconds * 1_000_000)
+        self.load_bytes.add(n_bytes)
+        if chunk_id in self.recently_evicted:
+            self.reloads += 1
+            del self.recently_evicted[chunk_id]
+
+    def evict(self, chunk_id):
+        self.evictions += 1
+        self.recently_evicted[chunk_id] = None
+        self.recently_evicted.move_to_end(chunk_id)
+        if len(self.recently_evicted) > self.recent_window:
+            self.recently_evicted.popitem(last=False)
+
+    def demote(self, from_tier, to_tier):
+        self.demotions[f"{from_tier}>{to_tier}"] += 1
+
+    def promote(self, from_tier, to_tier):
+        self.promotions[f"{from_tier}>{to_tier}"] += 1
+
+    def prefetch(self, waited):
+        self.prefetched += 1
+        if waited:
+            self.prefetch_waits += 1
+
+    def lookup(self, seconds, n=1):
+        """
+        records n node_id:chunk_id lookups that took seconds in total
+        """
+        self.lookup_time.add(seconds * 1_000_000 / n)
+
+    def to_dict(self):
+        accesses = dict()
+        for kind in sorted(set(self.hits) | set(self.misses)):
+            total = self.hits[kind] + self.misses[kind]
+            accesses[kind] = {"hits": self.hits[kind], "misses": self.misses[kind],
+                              "hit_rate": self.hits[kind] / total if total else 0}
+        return {"accesses": accesses, "loads": self.loads, "evictions": self.evictions, "reloads": self.reloads,
+                "demotions": dict(self.demotions), "promotions": dict(self.promotions),
+                "prefetched": self.prefetched, "prefetch_waits": self.prefetch_waits,
+                "bytes_read": self.bytes_read, "nodes_loaded": self.nodes_loaded,
+                "load_time_us": self.load_time.to_dict(), "load_bytes": self.load_bytes.to_dict(),
+                "lookup_time_us": self.lookup_time.to_dict()}
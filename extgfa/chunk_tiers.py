@@ -0,0 +1,55 @@
+"""
+Residency tiers of the chunks of ChGraph, from the most to the least memory per chunk:
+- full: the nodes with their sequences, tags and edges, as read from the reordered GFA
+- topology: the nodes with their edges and sequence lengths only (LN and cid tags), enough for the traversals
+- summary: no nodes, only the aggregates of the chunk summaries and the boundary sides of the distance index
+
+With a topology_c_limit above 0, the chunks evicted from the full tier are demoted to topology instead of being
+unloaded, and the topology chunks farthest from the focus (in hops in the chunk adjacency graph) are demoted
+to summary first. A topology chunk is promoted back to full when the sequence or tags of one of its nodes are
+needed (graph[node_id], the path sequences, write_gfa). When the focus is set and full_radius is not None,
+the chunks the traversals reach farther than full_radius hops from the focus are loaded as topology directly.
+"""
+from collections import deque
+from extgfa.sequence_utils import node_length
+
+
+FULL = "full"
+TOPOLOGY = "topology"
+SUMMARY = "summary"
+
+
+def hop_distances(neighbors, sources, max_hops=None, targets=None):
+    """
+    returns the dictionary of chunk_id: number of hops from the closest source chunk in the chunk adjacency graph
+    neighbors: function returning the chunks adjacent to a chunk
+    max_hops: the chunks farther away are left out
+    targets: the search stops once all these chunks are reached
+    """
+    dist = {chunk_id: 0 for chunk_id in sources}
+    queue = deque(dist)
+    left = None if targets is None else set(targets) - set(dist)
+    while queue:
+        if left is not None and not left:
+            break
+        chunk_id = queue.popleft()
+        if max_hops is not None and dist[chunk_id] >= max_hops:
+            continue
+        for other in neighbors(chunk_id):
+            if other not in dist:
+                dist[other] = dist[chunk_id] + 1
+                queue.append(other)
+                if left is not None:
+                    left.discard(other)
+    return dist
+
+
+def strip_node(node):
+    """
+    keeps only what the topology tier needs of a node: the edges, the length and the chunk id
+    """
+    length = node_length(node)
+    node.seq = ""
+    node.seq_len = length
+    node.tags = {"LN": ("i", str(length)), "cid": ("i", str(node.chunk_id))}
+    node.optional_info = []
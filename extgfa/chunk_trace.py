@@ -0,0 +1,81 @@
+"""
+Trace of the node and chunk accesses of a ChGraph, to replay the workload offline with cache_sim.py.
+The trace is a run-length encoded TSV, consecutive accesses to the same node are written once with their count:
+
+#extgfa-trace	<version>	<graph file>
+node_id	chunk_id	count
+...
+#size	chunk_id	bytes
+
+a node id of * is a direct load_chunk call, and the #size lines at the end give the size of the chunks
+that were accessed, for replaying with byte budgets.
+"""
+import logging
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+TRACE_VERSION = 1
+LOAD = "*"
+
+
+class TraceWriter:
+    """
+    Streams the accesses to the trace file, keeping only the current run in memory
+    """
+
+    def __init__(self, trace_file, graph_file):
+        self.trace_file = trace_file
+        self.f = open(trace_file, "w")
+        self.f.write(f"#extgfa-trace\t{TRACE_VERSION}\t{graph_file}\n")
+        self.node_id = None
+        self.chunk_id = None
+        self.count = 0
+        self.n_accesses = 0
+        self.sizes = dict()
+
+    def access(self, node_id, chunk_id):
+        self.n_accesses += 1
+        if node_id == self.node_id and chunk_id == self.chunk_id:
+            self.count += 1
+            return
+        if self.count:
+            self.f.write(f"{self.node_id}\t{self.chunk_id}\t{self.count}\n")
+        self.node_id = node_id
+        self.chunk_id = chunk_id
+        self.count = 1
+
+    def size(self, chunk_id, n_bytes):
+        self.sizes[chunk_id] = n_bytes
+
+    def close(self):
+        if self.count:
+            self.f.write(f"{self.node_id}\t{self.chunk_id}\t{self.count}\n")
+        for chunk_id in sorted(self.sizes):
+            self.f.write(f"#size\t{chunk_id}\t{self.sizes[chunk_id]}\n")
+        self.f.close()
+        logger.info(f"Wrote a trace of {self.n_accesses} accesses to {self.trace_file}")
+
+
+def read_trace(trace_file):
+    """
+    returns the graph file the trace was recorded on, the list of (node_id, chunk_id, count) runs
+    and the dictionary of chunk_id: size in bytes
+    """
+    runs = []
+    sizes = dict()
+    with open(trace_file, "r") as f:
+        header = f.readline().rstrip("\n").split("\t")
+        if header[0] != "#extgfa-trace":
+            raise ValueError(f"{trace_file} is not an extgfa trace")
+        if int(header[1]) > TRACE_VERSION:
+            raise ValueError(f"{trace_file} has trace version {header[1]}, "
+                             f"but this version of extgfa only reads up to version {TRACE_VERSION}")
+        for line in f:
+            first, second, third = line.rstrip("\n").split("\t")
+            if first == "#size":
+                sizes[int(second)] = int(third)
+            else:
+                runs.append((first, int(second), int(third)))
+    return header[2], runs, sizes
@@ -0,0 +1,261 @@
+"""
+Single-file container for the chunked graph (.xgfa), an alternative to the reordered GFA with its sidecar files.
+It is designed to be memory-mapped, so opening it only reads the header and the section table.
+
+Layout, all integers little-endian:
+header:         magic b"XGFA", format version (u16), number of sections (u16), reserved (u64)
+section table:  one entry per section, name (8 bytes, null padded), offset (u64), length (u64)
+sections:       each one starting at a multiple of 8 bytes
+footer:         CRC32 of everything before the footer (u32), magic b"XGFE"
+
+Sections:
+CHUNKDIR  the records of the fixed-width chunk directory (see chunk_index.py), offsets relative to CHUNKDAT
+NODEIDX   node_id:chunk_id index sorted by node id: number of nodes (u64), then one record per node with
+          the offset of its id in the ids blob (u64), the id length (u32) and the chunk id (u32), then the ids blob
+CHUNKDAT  the reordered GFA, chunks one after the other, followed by the P and W lines
+STATS     JSON with general statistics about the graph
+CHUNKSUM  (optional) the per-chunk summary records (see chunk_index.py)
+NODEINFO  (optional) one record per node in the order of NODEIDX, sequence length (u32), number of edges
+          on the start side (u32) and on the end side (u32)
+REGIONS   (optional) the region index, same content as the .regions file
+PATHS     (optional) the path store, same content as the .paths file
+DISTANCE  (optional) the chunk boundary distance index, same content as the .dist file
+BUBBLES   (optional) the bubble index, same content as the .bubbles file
+BLOOM     (optional) the Bloom filter of the node ids, same content as the .bloom file
+"""
+import os
+import mmap
+import json
+import zlib
+import struct
+import logging
+from extgfa.chunk_index import ChunkDirectory, ChunkSummaries, chunk_directory_bytes, chunk_summaries_bytes
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+MAGIC = b"XGFA"
+FOOTER_MAGIC = b"XGFE"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+SECTION_ENTRY = struct.Struct("<8sQQ")
+FOOTER = struct.Struct("<I4s")
+NODE_RECORD = struct.Struct("<QII")
+NODE_INFO = struct.Struct("<III")
+COUNT = struct.Struct("<Q")
+ALIGNMENT = 8
+
+
+def node_index_bytes(node_chunks):
+    """
+    returns the NODEIDX section
+    node_chunks: iterable of (node_id, chunk_id)
+    """
+    node_chunks = sorted((n.encode(), chunk_id) for n, chunk_id in node_chunks)
+    records = bytearray(COUNT.pack(len(node_chunks)))
+    names = bytearray()
+    for name, chunk_id in node_chunks:
+        records += NODE_RECORD.pack(len(names), len(name), chunk_id)
+        names += name
+    return bytes(records + names)
+
+
+def node_info_bytes(node_info):
+    """
+    returns the NODEINFO section
+    node_info: iterable of (node_id, sequence length, start degree, end degree)
+    """
+    node_info = sorted((n.encode(), length, start, end) for n, length, start, end in node_info)
+    return b"".join(NODE_INFO.pack(length, start, end) for _, length, start, end in node_info)
+
+
+def write_container(output_file, gfa_file, chunk_offsets, chunk_lengths, node_chunks, stats, extra_files=None,
+                    summaries=None, node_info=None):
+    """
+    writes the single-file container of a chunked graph
+    gfa_file: the reordered GFA, copied as the CHUNKDAT section
+    chunk_offsets: dictionary of chunk_id: [offset, n_lines] in the reordered GFA
+    chunk_lengths: dictionary of chunk_id: length of the chunk in bytes
+    node_chunks: iterable of (node_id, chunk_id)
+    stats: dictionary written as the STATS section
+    extra_files: dictionary of section name: file whose content becomes that section, e.g. REGIONS and PATHS
+    summaries: the per-chunk summary records of chunk_index.summarize_chunks, written as the CHUNKSUM section
+    node_info: iterable of (node_id, sequence length, start degree, end degree), written as the NODEINFO section
+    """
+    sections = [
+        ("CHUNKDIR", chunk_directory_bytes(chunk_offsets, chunk_lengths)),
+        ("NODEIDX", node_index_bytes(node_chunks)),
+        ("CHUNKDAT", gfa_file),
+        ("STATS", json.dumps(stats).encode()),
+    ]
+    if summaries is not None:
+        sections.append(("CHUNKSUM", chunk_summaries_bytes(summaries)))
+    if node_info is not None:
+        sections.append(("NODEINFO", node_info_bytes(node_info)))
+    for name, path in (extra_files or dict()).items():
+        if os.path.exists(path):
+            sections.append((name, path))
+
+    # the layout is computed first so the section table can be written before the sections
+    position = HEADER.size + SECTION_ENTRY.size * len(sections)
+    table = []
+    for name, content in sections:
+        position += -position % ALIGNMENT
+        length = os.path.getsize(content) if isinstance(content, str) else len(content)
+        table.append((name, position, length))
+        position += length
+
+    crc = 0
+    with open(output_file, "wb") as f:
+        def write(data):
+            nonlocal crc
+            crc = zlib.crc32(data, crc)
+            f.write(data)
+
+        write(HEADER.pack(MAGIC, VERSION, len(sections), 0))
+        for name, offset, length in table:
+            write(SECTION_ENTRY.pack(name.encode(), offset, length))
+        for (name, content), (_, offset, _) in zip(sections, table):
+            write(b"\0" * (offset - f.tell()))
+            if isinstance(content, str):
+                with open(content, "rb") as infile:
+                    while True:
+                        block = infile.read(1 << 20)
+                        if not block:
+                            break
+                        write(block)
+            else:
+                write(content)
+        f.write(FOOTER.pack(crc, FOOTER_MAGIC))
+
+
+class ContainerNodeIndex:
+    """
+    Read-only view of the NODEIDX section, looks node ids up by binary search over the sorted records
+    info: the NODEINFO section if any, for node_info
+    """
+
+    def __init__(self, buffer, info=None):
+        self.buffer = buffer
+        self.info = info
+        self.n_nodes = COUNT.unpack_from(buffer, 0)[0]
+        self.names_start = COUNT.size + self.n_nodes * NODE_RECORD.size
+
+    def __len__(self):
+        return self.n_nodes
+
+    def record(self, idx):
+        """
+        returns the (node id as bytes, chunk id) of the idx-th record
+        """
+        name_offset, name_len, chunk_id = NODE_RECORD.unpack_from(self.buffer, COUNT.size + idx * NODE_RECORD.size)
+        start = self.names_start + name_offset
+        return bytes(self.buffer[start:start + name_len]), chunk_id
+
+    def find(self, node_id):
+        """
+        returns the (record index, chunk id) of a node, None if it is not in the graph
+        """
+        key = node_id.encode()
+        low, high = 0, self.n_nodes
+        while low < high:
+            mid = (low + high) // 2
+            name, chunk_id = self.record(mid)
+            if name < key:
+                low = mid + 1
+            elif name > key:
+                high = mid
+            else:
+                return mid, chunk_id
+        return None
+
+    def get(self, node_id):
+        found = self.find(node_id)
+        if found is None:
+            return None
+        return found[1]
+
+    def node_info(self, node_id):
+        """
+        returns the (sequence length, start degree, end degree) of a node, None if it is not in the graph
+        """
+        found = self.find(node_id)
+        if found is None:
+            return None
+        return NODE_INFO.unpack_from(self.info, found[0] * NODE_INFO.size)
+
+    def get_many(self, node_ids):
+        return {n: self.get(n) for n in node_ids}
+
+
+class Container:
+    """
+    Memory-mapped reader of the single-file container, only the header and the section table are read when opening
+    """
+
+    def __init__(self, container_file):
+        self.container_file = container_file
+        self.file = open(container_file, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size + FOOTER.size:
+            raise ValueError(f"{container_file} is too small to be an extgfa container")
+        magic, version, n_sections, _ = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or FOOTER.unpack_from(self.map, len(self.map) - FOOTER.size)[1] != FOOTER_MAGIC:
+            raise ValueError(f"{container_file} is not an extgfa container")
+        if version > VERSION:
+            raise ValueError(f"{container_file} has container version {version}, "
+                             f"but this version of extgfa only reads up to version {VERSION}")
+        self.version = version
+        self.sections = dict()
+        for i in range(n_sections):
+            name, offset, length = SECTION_ENTRY.unpack_from(self.map, HEADER.size + i * SECTION_ENTRY.size)
+            self.sections[name.rstrip(b"\0").decode()] = (offset, length)
+
+    def __contains__(self, name):
+        return name in self.sections
+
+    def section_range(self, name):
+        """
+        returns the (offset, length) of a section in the file
+        """
+        return self.sections[name]
+
+    def section(self, name):
+        """
+        returns a zero-copy memoryview of a section
+        """
+        offset, length = self.sections[name]
+        return memoryview(self.map)[offset:offset + length]
+
+    def chunk_directory(self):
+        return ChunkDirectory(self.section("CHUNKDIR"), self.sections["CHUNKDAT"][0])
+
+    def node_index(self):
+        info = self.section("NODEINFO") if "NODEINFO" in self else None
+        return ContainerNodeIndex(self.section("NODEIDX"), info)
+
+    def chunk_summaries(self):
+        """
+        returns the per-chunk summaries, None for containers written without them
+        """
+        if "CHUNKSUM" not in self:
+            return None
+        return ChunkSummaries(self.section("CHUNKSUM"))
+
+    def stats(self):
+        return json.loads(bytes(self.section("STATS")))
+
+    def verify(self):
+        """
+        checks the footer checksum, this reads the whole file
+        """
+        crc = zlib.crc32(memoryview(self.map)[:len(self.map) - FOOTER.size])
+        return crc == FOOTER.unpack_from(self.map, len(self.map) - FOOTER.size)[0]
+
+    def extract(self, name, output_file):
+        """
+        writes the content of a section to a file, e.g. CHUNKDAT to get back the reordered GFA
+        """
+        with open(output_file, "wb") as f:
+            f.write(self.section(name))
@@ -0,0 +1,227 @@
+"""
+Chunk boundary distance index, for sequence-length distances and shortest paths between nodes of a chunked graph.
+
+Distances are walks in the bidirected graph: a walk leaves a node through one of its sides, enters the next node
+through the side the edge connects to and leaves it through the other side. The distance between two nodes is
+the smallest sum of the sequence lengths of the nodes strictly between them, on any walk starting from either
+side of the first node, so the distance between neighbors is 0. Overlaps of the edges are not subtracted.
+
+A boundary side (node, side) is a side of a node with at least one edge to another chunk.
+For every chunk, the index holds the distances inside the chunk from entering each boundary side to leaving
+through each boundary side (including the entered node and the exited one), and for every boundary side
+the boundary sides of the other chunks its edges lead to. Together they form an overlay graph of the chunks,
+so a query only searches the overlay and loads the chunks of the two nodes, and the chunks of the path
+when the path itself is asked for.
+
+The index is written next to the chunked graph (.dist) and as the DISTANCE section of the container.
+Layout, all integers little-endian:
+header:     magic b"XGDI", format version (u16), reserved (u16), number of chunks (u64)
+directory:  one record per chunk, offset of its table from the start of the index (u64), length (u64)
+tables:     one JSON object per chunk with the boundary "sides" as [node id, side], the "dist" matrix
+            (row: entered side, column: exited side, -1 when unreachable) and the "cross" lists of
+            [chunk id, index of the side in that chunk] of each side
+"""
+import mmap
+import json
+import heapq
+import struct
+import logging
+from collections import defaultdict
+from extgfa.sequence_utils import node_length
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+DIST_MAGIC = b"XGDI"
+DIST_VERSION = 1
+DIST_HEADER = struct.Struct("<4sHHQ")
+DIST_RECORD = struct.Struct("<QQ")
+UNREACHABLE = -1
+
+
+def chunk_dijkstra(nodes, chunk_id, sources, target=None):
+    """
+    shortest walks inside a chunk
+    nodes: dictionary of node_id: Node, only the nodes of chunk_id are visited
+    sources: dictionary of (node_id, side): distance of the sides the walks leave from
+    target: node id whose arrival is recorded, the target itself is not counted in the distance
+    returns the dictionary of (node_id, side): distance of the sides left through, the dictionary of
+    (node_id, side): previous side for the walks, and the (distance, side left through, side of the target entered)
+    of the shortest arrival at the target, None if it was not reached
+    """
+    dist = dict(sources)
+    parent = dict()
+    arrival = None
+    heap = [(d, state) for state, d in sources.items()]
+    heapq.heapify(heap)
+    while heap:
+        d, state = heapq.heappop(heap)
+        if d > dist[state]:
+            continue
+        n_id, side = state
+        node = nodes[n_id]
+        for other, other_side, _ in (node.start if side == 0 else node.end):
+            other_node = nodes.get(other)
+            if other_node is None or other_node.chunk_id != chunk_id:
+                continue
+            if other == target and (arrival is None or d < arrival[0]):
+                arrival = (d, state, other_side)
+            new_state = (other, 1 - other_side)
+            new_d = d + node_length(other_node)
+            if new_state not in dist or new_d < dist[new_state]:
+                dist[new_state] = new_d
+                parent[new_state] = state
+                heapq.heappush(heap, (new_d, new_state))
+    return dist, parent, arrival
+
+
+def boundary_sides(nodes, chunk_nodes):
+    """
+    returns the sorted list of the (node_id, side) with an edge to another chunk
+    """
+    sides = []
+    for n_id in chunk_nodes:
+        node = nodes[n_id]
+        for side, edges in ((0, node.start), (1, node.end)):
+            if any(nodes[other].chunk_id != node.chunk_id for other, _, _ in edges):
+                sides.append((n_id, side))
+    return sorted(sides)
+
+
+def write_distance_index(graph, n_chunks, output_file):
+    """
+    writes the distance index of a Graph with the chunk ids assigned
+    returns the number of boundary sides
+    """
+    chunk_nodes = defaultdict(list)
+    for n in graph.nodes.values():
+        chunk_nodes[n.chunk_id].append(n.id)
+    sides = {chunk_id: boundary_sides(graph.nodes, chunk_nodes[chunk_id]) for chunk_id in range(1, n_chunks + 1)}
+    side_index = {chunk_id: {s: i for i, s in enumerate(chunk_sides)} for chunk_id, chunk_sides in sides.items()}
+
+    tables = []
+    for chunk_id in range(1, n_chunks + 1):
+        rows = []
+        for n_id, side in sides[chunk_id]:
+            dist, _, _ = chunk_dijkstra(graph.nodes, chunk_id, {(n_id, 1 - side): node_length(graph.nodes[n_id])})
+            rows.append([dist.get(s, UNREACHABLE) for s in sides[chunk_id]])
+        cross = []
+        for n_id, side in sides[chunk_id]:
+            node = graph.nodes[n_id]
+            cross.append([[graph.nodes[other].chunk_id, side_index[graph.nodes[other].chunk_id][(other, other_side)]]
+                          for other, other_side, _ in (node.start if side == 0 else node.end)
+                          if graph.nodes[other].chunk_id != chunk_id])
+        tables.append(json.dumps({"sides": sides[chunk_id], "dist": rows, "cross": cross},
+                                 separators=(",", ":")).encode())
+
+    with open(output_file, "wb") as f:
+        f.write(DIST_HEADER.pack(DIST_MAGIC, DIST_VERSION, 0, n_chunks))
+        position = DIST_HEADER.size + n_chunks * DIST_RECORD.size
+        for table in tables:
+            f.write(DIST_RECORD.pack(position, len(table)))
+            position += len(table)
+        for table in tables:
+            f.write(table)
+    return sum(len(chunk_sides) for chunk_sides in sides.values())
+
+
+class ChunkDistances:
+    """
+    The boundary sides of a chunk with their distance table and edges to the other chunks
+    """
+    __slots__ = ("sides", "dist", "cross", "index")
+
+    def __init__(self, table):
+        self.sides = [tuple(s) for s in table["sides"]]
+        self.dist = table["dist"]
+        self.cross = table["cross"]
+        self.index = {s: i for i, s in enumerate(self.sides)}
+
+
+class DistanceIndex:
+    """
+    Memory-mapped distance index, the table of a chunk is parsed the first time the overlay search reaches it
+    """
+
+    def __init__(self, index_file, offset=0, length=None):
+        """
+        offset and length give the byte range of the index in the file, by default the whole file
+        """
+        with open(index_file, "rb") as f:
+            # the map stays valid after the file is closed
+            index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if length is None:
+            length = len(index_map) - offset
+        self.buffer = memoryview(index_map)[offset:offset + length]
+        magic, version, _, self.n_chunks = DIST_HEADER.unpack_from(self.buffer, 0)
+        if magic != DIST_MAGIC:
+            raise ValueError(f"{index_file} does not have a distance index")
+        if version > DIST_VERSION:
+            raise ValueError(f"{index_file} has distance index version {version}, "
+                             f"but this version of extgfa only reads up to version {DIST_VERSION}")
+        self.tables = dict()
+
+    def chunk(self, chunk_id):
+        table = self.tables.get(chunk_id)
+        if table is None:
+            offset, length = DIST_RECORD.unpack_from(self.buffer, DIST_HEADER.size + (chunk_id - 1) * DIST_RECORD.size)
+            table = ChunkDistances(json.loads(bytes(self.buffer[offset:offset + length])))
+            self.tables[chunk_id] = table
+        return table
+
+    def search(self, seeds, target_chunk, target_costs, best=None):
+        """
+        Dijkstra over the overlay graph
+        seeds: dictionary of (chunk_id, side index): distance of the boundary sides left from the source chunk
+        target_costs: dictionary of side index: distance from entering the target chunk through that side
+        to the target node
+        best: distance of a walk already found inside the source chunk, if any
+        returns the shortest distance and the list of (chunk_id, entered side index, left side index) hops of the
+        walk, the last hop leaving through None, or (best, None) if no walk through the overlay is shorter
+        """
+        dist = {("out",) + s: d for s, d in seeds.items()}
+        parent = dict()
+        heap = [(d, v) for v, d in dist.items()]
+        heapq.heapify(heap)
+        found = None
+        while heap:
+            d, vertex = heapq.heappop(heap)
+            if best is not None and d >= best:
+                break
+            if d > dist[vertex]:
+                continue
+            kind, chunk_id, i = vertex
+            if kind == "out":
+                for other_chunk, j in self.chunk(chunk_id).cross[i]:
+                    new_vertex = ("in", other_chunk, j)
+                    if new_vertex not in dist or d < dist[new_vertex]:
+                        dist[new_vertex] = d
+                        parent[new_vertex] = vertex
+                        heapq.heappush(heap, (d, new_vertex))
+                continue
+            if chunk_id == target_chunk and i in target_costs:
+                if best is None or d + target_costs[i] < best:
+                    best = d + target_costs[i]
+                    found = vertex
+            for k, cost in enumerate(self.chunk(chunk_id).dist[i]):
+                if cost == UNREACHABLE:
+                    continue
+                new_vertex = ("out", chunk_id, k)
+                if new_vertex not in dist or d + cost < dist[new_vertex]:
+                    dist[new_vertex] = d + cost
+                    parent[new_vertex] = vertex
+                    heapq.heappush(heap, (d + cost, new_vertex))
+        if found is None:
+            return best, None
+
+        # walking back from the target, each in vertex is preceded by the out vertex it was reached from
+        hops = [(found[1], found[2], None)]
+        vertex = parent[found]
+        while vertex in parent:
+            entered = parent[vertex]
+            hops.append((vertex[1], entered[2], vertex[2]))
+            vertex = parent[entered]
+        hops.append((vertex[1], None, vertex[2]))
+        hops.reverse()
+        return best, hops
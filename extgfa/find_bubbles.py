@@ -105,6 +105,9 @@ def find_sb_alg(graph, s, direction, only_simple=False, only_super=False):
             # nodes_inside.remove(t[0])
             # bubble = Bubble(source=s, sink=t[0], inside=nodes_inside)
             bubble = {"source":s.id, "sink":t[0].id, "inside":[n.id for n in nodes_inside]}
+            # the sides of the source and the sink facing the inside of the bubble
+            bubble["source_side"] = direction
+            bubble["sink_side"] = 1 - t[1]
 
             if only_simple:
                 if b_is_simple(bubble):
@@ -0,0 +1,165 @@
+"""
+Batch validation of the alignment paths of a GAF file against a chunked graph.
+Instead of checking the alignments one by one, which loads chunks in random order, the GAF is read in batches,
+the alignments of a batch are grouped by the set of chunks their paths touch, and each group is validated
+while its chunks are loaded. The groups are spread over a pool of processes, each with its own ChGraph,
+and the results are streamed as a TSV with one line per alignment:
+line number in the GAF, query name, 1 if the path exists in the graph or 0 otherwise, and the reason
+"""
+import sys
+import logging
+import itertools
+import multiprocessing
+from collections import defaultdict
+from extgfa.ChGraph import ChGraph
+from extgfa.gfa_paths import iter_steps
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+# (orientation of the first step, orientation of the second step): (side of the first node, side of the second node)
+STEP_SIDES = {
+    (">", ">"): (1, 0),
+    ("<", "<"): (0, 1),
+    (">", "<"): (1, 1),
+    ("<", ">"): (0, 0),
+}
+
+GRAPH = None  # the ChGraph of each worker process
+
+
+def read_gaf_batches(gaf_file, batch_size):
+    """
+    yields lists of (line number, query name, list of (orientation, node_id) steps) of batch_size alignments
+    a path that is not a walk, i.e. a single segment name, is a single forward step
+    """
+    f = sys.stdin if gaf_file == "-" else open(gaf_file, "r")
+    batch = []
+    for line_no, line in enumerate(f, start=1):
+        if not line.strip() or line.startswith("#"):
+            continue
+        fields = line.split("\t", 6)
+        if fields[5][0] in {">", "<"}:
+            steps = list(iter_steps(fields[5]))
+        else:
+            steps = [(">", fields[5])]
+        batch.append((line_no, fields[0], steps))
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+    if f is not sys.stdin:
+        f.close()
+
+
+def group_by_chunks(graph, batch):
+    """
+    groups the alignments of a batch by the sorted tuple of chunks their nodes belong to
+    returns the list of (chunks, alignments) groups sorted by chunks, so consecutive groups share chunks,
+    and the results of the alignments going through nodes that do not exist in the graph
+    """
+    node_chunks = graph.get_node_chunks({n_id for _, _, steps in batch for _, n_id in steps})
+    groups = defaultdict(list)
+    missing = []
+    for line_no, name, steps in batch:
+        absent = [n_id for _, n_id in steps if node_chunks.get(n_id) is None]
+        if absent:
+            missing.append((line_no, name, 0, f"missing_node:{absent[0]}"))
+            continue
+        groups[tuple(sorted({node_chunks[n_id] for _, n_id in steps}))].append((line_no, name, steps))
+    return [(key, groups[key]) for key in sorted(groups)], missing
+
+
+def validate_steps(graph, steps, adjacency):
+    """
+    returns (1, "ok") if consecutive steps are connected by an edge with the right orientations,
+    otherwise (0, reason)
+    adjacency: cache of (node_id, side): set of (neighbor, neighbor side) for O(1) edge lookups
+    """
+    for i in range(1, len(steps)):
+        (o1, n1), (o2, n2) = steps[i - 1], steps[i]
+        side1, side2 = STEP_SIDES[(o1, o2)]
+        key = (n1, side1)
+        if key not in adjacency:
+            edges = graph.nodes[n1].end if side1 == 1 else graph.nodes[n1].start
+            adjacency[key] = {(e[0], e[1]) for e in edges}
+        if (n2, side2) not in adjacency[key]:
+            return 0, f"no_edge:{o1}{n1}{o2}{n2}"
+    return 1, "ok"
+
+
+def validate_group(graph, chunks, group):
+    """
+    loads all the chunks of a group of alignments and validates them
+    returns a list of (line number, query name, valid, reason)
+    """
+    # all the chunks of the group need to be loaded at the same time, so loading one of them
+    # must not evict another one that is already loaded
+    limit = graph.loaded_c_limit
+    graph.loaded_c_limit = max(limit, len(graph.loaded_c) + len(chunks))
+    try:
+        for chunk_id in chunks:
+            if chunk_id not in graph.loaded_c:
+                graph.load_chunk(chunk_id)
+        adjacency = dict()
+        results = []
+        for line_no, name, steps in group:
+            try:
+                valid, reason = validate_steps(graph, steps, adjacency)
+            except KeyError as e:
+                valid, reason = 0, f"missing_node:{e.args[0]}"
+            results.append((line_no, name, valid, reason))
+    finally:
+        graph.loaded_c_limit = limit
+        # the next groups share chunks with this one, they are the last to be evicted
+        graph.trim_chunks(keep=set(chunks))
+    return results
+
+
+def init_worker(graph_file, loaded_c_limit):
+    global GRAPH
+    logging.getLogger("extgfa.ChGraph").setLevel(logging.WARNING)
+    GRAPH = ChGraph(graph_file)
+    GRAPH.loaded_c_limit = loaded_c_limit
+
+
+def validate_group_worker(chunks_group):
+    return validate_group(GRAPH, *chunks_group)
+
+
+def validate_gaf(graph_file, gaf_file, output_file, processes=1, batch_size=100_000, loaded_c_limit=10):
+    """
+    validates all the alignments of gaf_file against the chunked graph graph_file
+    and streams the results into output_file, - for stdin or stdout
+    returns the number of valid and invalid alignments
+    """
+    graph = ChGraph(graph_file)
+    out = sys.stdout if output_file == "-" else open(output_file, "w")
+    counts = [0, 0]  # invalid, valid
+    pool = None
+    if processes > 1:
+        pool = multiprocessing.Pool(processes, initializer=init_worker, initargs=(graph_file, loaded_c_limit))
+    else:
+        init_worker(graph_file, loaded_c_limit)
+
+    try:
+        for batch_n, batch in enumerate(read_gaf_batches(gaf_file, batch_size), start=1):
+            groups, results = group_by_chunks(graph, batch)
+            if pool is not None:
+                group_results = pool.imap(validate_group_worker, groups, chunksize=max(1, len(groups) // (4 * processes)))
+            else:
+                group_results = map(validate_group_worker, groups)
+            for result in itertools.chain([results], group_results):
+                for line_no, name, valid, reason in result:
+                    counts[valid] += 1
+                    out.write(f"{line_no}\t{name}\t{valid}\t{reason}\n")
+            logger.info(f"Validated batch {batch_n}, {counts[1]} valid and {counts[0]} invalid alignments so far")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        if out is not sys.stdout:
+            out.close()
+    return counts[1], counts[0]
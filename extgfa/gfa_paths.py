@@ -0,0 +1,138 @@
+"""
+Support for the GFA P (path) and W (walk) lines.
+Both are converted to a walk string of oriented steps, e.g. >s1<s2>s3, and the indexer writes them to a
+separate path store next to the chunked graph, one line per path:
+path name, chunk runs, walk
+where the chunk runs are the ordered chunks the path visits as chunk_id:n_steps pairs, e.g. 1:120,2:87,1:3
+so the sequence of a path can be streamed chunk by chunk, loading each chunk once per run.
+"""
+import os
+import re
+import logging
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+STEP_RE = re.compile("[><][^><]+")
+
+
+def path_name(line):
+    """
+    returns the name of a split P or W line, W lines are named sample#haplotype#sequence (PanSN)
+    with the [start-end] range added when the walk does not start at the beginning of the sequence
+    """
+    if line[0] == "P":
+        return line[1]
+    name = f"{line[1]}#{line[2]}#{line[3]}"
+    if line[4] not in {"*", "0"}:
+        name += f"[{line[4]}-{line[5]}]"
+    return name
+
+
+def path_walk(line):
+    """
+    returns the walk string of a split P or W line
+    """
+    if line[0] == "P":
+        steps = []
+        for segment in line[2].split(","):
+            if segment[-1] == "+":
+                steps.append(">" + segment[:-1])
+            else:
+                steps.append("<" + segment[:-1])
+        return "".join(steps)
+    return line[6]
+
+
+def iter_steps(walk):
+    """
+    yields the (orientation, node_id) steps of a walk string
+    """
+    for step in STEP_RE.finditer(walk):
+        step = step.group()
+        yield step[0], step[1:]
+
+
+def chunk_runs(walk, node_chunk):
+    """
+    returns the list of [chunk_id, n_steps] runs of consecutive steps of the walk in the same chunk
+    node_chunk: function returning the chunk id of a node id
+    """
+    runs = []
+    for _, n_id in iter_steps(walk):
+        chunk_id = node_chunk(n_id)
+        if runs and runs[-1][0] == chunk_id:
+            runs[-1][1] += 1
+        else:
+            runs.append([chunk_id, 1])
+    return runs
+
+
+def write_path_index(graph, output_file):
+    """
+    writes the path store of the paths of the graph
+    returns the number of paths written
+    """
+    counter = 0
+    with open(output_file, "w") as f:
+        for name, line in graph.paths.items():
+            walk = path_walk(line.split("\t"))
+            missing = [n_id for _, n_id in iter_steps(walk) if n_id not in graph]
+            if missing:
+                logger.warning(f"Path {name} goes through node {missing[0]} that does not exist in the graph, skipping it")
+                continue
+            runs = chunk_runs(walk, lambda n_id: graph.nodes[n_id].chunk_id)
+            f.write(f"{name}\t{','.join(f'{c}:{n}' for c, n in runs)}\t{walk}\n")
+            counter += 1
+    return counter
+
+
+class PathIndex:
+    """
+    Reads the path store lazily, only the byte offset of each path is kept in memory
+    """
+
+    def __init__(self, index_file, offset=0, length=None):
+        """
+        offset and length give the byte range of the path store in the file, by default the whole file
+        """
+        self.index_file = index_file
+        self.offsets = dict()
+        if length is None:
+            length = os.path.getsize(index_file) - offset
+        with open(index_file, "rb") as f:
+            f.seek(offset)
+            end = offset + length
+            while offset < end:
+                line = f.readline()
+                self.offsets[line[:line.index(b"\t")].decode()] = offset
+                offset += len(line)
+
+    def __contains__(self, name):
+        return name in self.offsets
+
+    def names(self):
+        """
+        returns the names of the stored paths
+        """
+        return list(self.offsets.keys())
+
+    def record(self, name):
+        """
+        returns the chunk runs and the walk string of a path
+        """
+        with open(self.index_file, "rb") as f:
+            f.seek(self.offsets[name])
+            _, runs, walk = f.readline().decode().rstrip("\n").split("\t")
+        runs = [tuple(int(x) for x in run.split(":")) for run in runs.split(",")]
+        return runs, walk
+
+    def chunk_steps(self, name):
+        """
+        yields (chunk_id, steps) for each chunk run of the path, steps being the list of (orientation, node_id)
+        """
+        runs, walk = self.record(name)
+        steps = iter_steps(walk)
+        for chunk_id, n_steps in runs:
+            yield chunk_id, [next(steps) for _ in range(n_steps)]
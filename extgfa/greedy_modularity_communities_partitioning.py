@@ -3,7 +3,7 @@ import time
 import gc
 import sys
 import logging
-from extgfa.utilities import gfa_to_nx, output_csv_colors, merge_chunk, split_chunk, final_output
+from extgfa.utilities import gfa_to_nx, output_csv_colors, merge_chunk, split_chunk, final_output, chunk_weight
 import networkx as nx
 
 
@@ -25,18 +25,18 @@ def run_gmc(graph, chunk_sizes):
         for n in comp:
             graph.nodes[n]['chunk'] = CHUNK_COUNTER
 
-        chunk_sizes[CHUNK_COUNTER] = len(comp)
+        chunk_sizes[CHUNK_COUNTER] = chunk_weight(graph, comp)
         CHUNK_COUNTER += 1
 
 
-def gm_main(input_gfa, output_gfa, top_threshold, btm_threshold):
+def gm_main(input_gfa, output_gfa, top_threshold, btm_threshold, weight="nodes", **output_args):
     global CHUNK_COUNTER
     # chunk_counter = 1
     chunk_sizes = dict()
     to_skip = dict()
-    graph = gfa_to_nx(input_gfa)
+    graph = gfa_to_nx(input_gfa, weight)
     logger.info(f"Created the graph from {input_gfa} which has {len(graph.nodes)} nodes")
-    if top_threshold > len(graph):
+    if top_threshold > chunk_weight(graph, graph):
         logger.error(f"The upper threshold given {top_threshold} is bigger than the graph given {input_gfa}")
         sys.exit(1)
     # top_threshold = len(graph) / upper
@@ -45,8 +45,9 @@ def gm_main(input_gfa, output_gfa, top_threshold, btm_threshold):
     for comp in nx.components.connected_components(graph):
         logger.info(f"Got component of length {len(comp)}")
         # component is small enough to be its own chunk without further partitioning
-        if len(comp) < top_threshold:
-            to_skip[CHUNK_COUNTER] = len(comp)
+        comp_size = chunk_weight(graph, comp)
+        if comp_size < top_threshold:
+            to_skip[CHUNK_COUNTER] = comp_size
             for n in comp:
                 if graph.nodes[n]['chunk'] != 0:
                     pdb.set_trace()
@@ -89,4 +90,4 @@ def gm_main(input_gfa, output_gfa, top_threshold, btm_threshold):
     del new_graph
     gc.collect()
 
-    final_output(chunk_index, input_gfa, output_gfa)
+    final_output(chunk_index, input_gfa, output_gfa, weight=weight, **output_args)
@@ -15,7 +15,7 @@ import sys
 import pdb
 import gc
 import logging
-from extgfa.utilities import gfa_to_nx, output_csv_colors, merge_chunk, final_output
+from extgfa.utilities import gfa_to_nx, output_csv_colors, merge_chunk, final_output, chunk_weight
 import networkx as nx
 from collections import defaultdict
 
@@ -36,9 +36,14 @@ def split_chunk(original_graph, chunk_sizes, top_threshold):
     # I think to do it faster, I can take the components that come out of kl algorithm
     # and merge those together, but for now, I'll just collect them all and do the merging later
     global CHUNK_COUNTER
-    while max(chunk_sizes.values()) > top_threshold:
-        chunk_id = int(max(chunk_sizes, key=chunk_sizes.get))
+    # a single node heavier than the threshold cannot be split any further
+    unsplittable = set()
+    while max((size for cid, size in chunk_sizes.items() if cid not in unsplittable), default=0) > top_threshold:
+        chunk_id = int(max((cid for cid in chunk_sizes if cid not in unsplittable), key=chunk_sizes.get))
         chunk = [x for x in original_graph if original_graph.nodes[x]['chunk'] == chunk_id]
+        if len(chunk) == 1:
+            unsplittable.add(chunk_id)
+            continue
         del chunk_sizes[chunk_id]
 
         new_graph = original_graph.subgraph(chunk)
@@ -62,7 +67,7 @@ def split_chunk(original_graph, chunk_sizes, top_threshold):
             CHUNK_COUNTER += 1
         # local_chunk_sizes = defaultdict(int)
         for n in new_graph:
-            chunk_sizes[new_graph.nodes[n]['chunk']] += 1
+            chunk_sizes[new_graph.nodes[n]['chunk']] += new_graph.nodes[n]['size']
             # local_chunk_sizes[new_graph.nodes[n]['chunk']] += 1
 
 
@@ -87,7 +92,7 @@ def run_kl(graph, chunk_sizes):
         CHUNK_COUNTER += 1
     # chunk_sizes = defaultdict(int)
     for n in graph:
-        chunk_sizes[graph.nodes[n]['chunk']] += 1
+        chunk_sizes[graph.nodes[n]['chunk']] += graph.nodes[n]['size']
     # emptying some memory
     # del components
     # del bisection
@@ -95,13 +100,13 @@ def run_kl(graph, chunk_sizes):
     # return chunk_sizes
 
 
-def kl_main(input_gfa, output_gfa, top_threshold, btm_threshold):
+def kl_main(input_gfa, output_gfa, top_threshold, btm_threshold, weight="nodes", **output_args):
     # chunk_counter = 1
     global CHUNK_COUNTER
     chunk_sizes = defaultdict(int)
     to_skip = dict()
-    graph = gfa_to_nx(input_gfa)
-    if top_threshold > len(graph):
+    graph = gfa_to_nx(input_gfa, weight)
+    if top_threshold > chunk_weight(graph, graph):
         logger.error(f"The upper threshold given {top_threshold} is bigger than the graph given {input_gfa}")
         sys.exit(1)
     logger.info(f"Created the graph from {input_gfa} which has {len(graph.nodes)} nodes")
@@ -110,8 +115,9 @@ def kl_main(input_gfa, output_gfa, top_threshold, btm_threshold):
     for comp in nx.components.connected_components(graph):
         logger.info(f"Got component of length {len(comp)}")
         # component is small enough to be its own chunk without further partitioning
-        if len(comp) < top_threshold:
-            to_skip[CHUNK_COUNTER] = len(comp)
+        comp_size = chunk_weight(graph, comp)
+        if comp_size < top_threshold:
+            to_skip[CHUNK_COUNTER] = comp_size
             for n in comp:
                 if graph.nodes[n]['chunk'] != 0:
                     pdb.set_trace()
@@ -154,7 +160,7 @@ def kl_main(input_gfa, output_gfa, top_threshold, btm_threshold):
     del new_graph
     gc.collect()
 
-    final_output(chunk_index, input_gfa, output_gfa)
+    final_output(chunk_index, input_gfa, output_gfa, weight=weight, **output_args)
 
 
 if __name__ == "__main__":
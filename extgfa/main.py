@@ -1,58 +1,262 @@
 import sys
 import os
+import json
 import argparse
 import logging
 from extgfa.__version__ import version
-from extgfa.greedy_modularity_communities_partitioning import gm_main
-from extgfa.kl_algorithm_partitioning import kl_main
-from extgfa.louvian_partitioning import lv_main
+from extgfa.chunk_ordering import ORDERING_METHODS
+from extgfa.utilities import WEIGHT_TYPES, NODE_INDEX_TYPES
+from extgfa.cache_sim import POLICIES
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
 
-# todo add argparse and have two subcommands, one is for partitioning and one for bfs
-def main():
-    print(f"Running version {version}")
-    if len(sys.argv) < 6:
-        print("you need to give algorithm type, input GFA, output GFA, upper threshold, lower threshold")
-        print("Algorithms type are gm for greedy modularity, kl for kernighan lin algorithm, or lv for louvian")
+ALGORITHMS = {
+    "gm": "Clauset-Newman-Moore greedy modularity",
+    "kl": "Kernighan-Lin algorithm",
+    "lv": "Louvian communities",
+    "bfs": "BFS region growing (linear time, fastest)",
+}
+
+
+def partition_arguments():
+    """
+    arguments shared by all the partitioning subcommands
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("input_gfa", help="uncompressed input GFA file")
+    parser.add_argument("output_gfa", help="output reordered GFA file, the index files are written next to it")
+    parser.add_argument("upper", type=int, help="upper threshold, bigger chunks are split further")
+    parser.add_argument("lower", type=int, help="lower threshold, smaller chunks are merged with a neighbor")
+    parser.add_argument("--weight", default="nodes", choices=WEIGHT_TYPES,
+                        help="unit of the thresholds: number of nodes, sequence bases, or cost, an estimate of the "
+                             "bytes a chunk takes in memory once loaded (sequence plus node and edge overhead) "
+                             "(default: nodes)")
+    parser.add_argument("--order", default="bfs", choices=ORDERING_METHODS,
+                        help="on-disk order of the chunks and of the nodes inside each chunk: bfs along the chunk "
+                             "adjacency (Cuthill-McKee), ref along the rGFA reference coordinates, or none to keep "
+                             "the partitioning order (default: bfs)")
+    parser.add_argument("--container", action="store_true",
+                        help="also pack the chunked graph and its indices into a single memory-mappable "
+                             "<output>.xgfa file that ChGraph can load directly")
+    parser.add_argument("--bubbles", action="store_true",
+                        help="also find the bubbles of the graph and index them by chunk into <output>.bubbles, "
+                             "for the bubble queries of ChGraph")
+    parser.add_argument("--node-index", default="dbm", choices=NODE_INDEX_TYPES,
+                        help="format of the node_id:chunk_id index next to the output: a dbm shelve (<output>.db) or "
+                             "an SQLite database (<output>.sqlite) that also holds the node tags and chunk summaries "
+                             "and can be queried in batches (default: dbm)")
+    return parser
+
+
+def run_partitioning(args):
+    if not os.path.exists(args.input_gfa):
+        print(f"input file {args.input_gfa} does not exist")
         sys.exit()
 
-    if sys.argv[1] not in {'gm', 'kl', 'lv'}:
-        print(f"input type {sys.argv[1]} not supported")
-        print("gm or kl for greedy modularity or kernighan lin algorithms")
+    if args.input_gfa.endswith(".gz"):
+        print("You need to provide an uncompressed GFA file")
         sys.exit()
 
-    if not os.path.exists(sys.argv[2]):
-        print(f"input file {sys.argv[2]} does not exist")
+    if os.path.exists(args.output_gfa):
+        print(f"The file given for output {args.output_gfa} already exists")
         sys.exit()
 
-    if sys.argv[2].endswith(".gz"):
-        print("You need to provide an uncompressed GFA file")
+    if args.lower > args.upper:
+        print(f"the lower threshold cannot be bigger than the upper threshold")
         sys.exit()
 
-    if os.path.exists(sys.argv[3]):
-        print(f"The file given for output {sys.argv[3]} already exists")
+    output_gfa = args.output_gfa.replace(".gfa", "")
+    partition_args = [args.input_gfa, output_gfa, args.upper, args.lower, args.weight]
+    output_args = {"order": args.order, "container": args.container, "bubbles": args.bubbles,
+                   "node_index": args.node_index}
+    # the partitioners are imported only when used, most of them need networkx
+    if args.command == 'gm':
+        from extgfa.greedy_modularity_communities_partitioning import gm_main
+        gm_main(*partition_args, **output_args)
+
+    if args.command == "kl":
+        from extgfa.kl_algorithm_partitioning import kl_main
+        kl_main(*partition_args, **output_args)
+
+    if args.command == "lv":
+        print("Running Louvian communities algorithm")
+        from extgfa.louvian_partitioning import lv_main
+        lv_main(*partition_args, **output_args)
+
+    if args.command == "bfs":
+        print("Running BFS region growing")
+        from extgfa.bfs_partitioning import bfs_main
+        bfs_main(*partition_args, **output_args)
+
+
+def run_validate_gaf(args):
+    from extgfa.gaf_validation import validate_gaf
+
+    if args.gaf != "-" and not os.path.exists(args.gaf):
+        print(f"input file {args.gaf} does not exist")
         sys.exit()
+    n_valid, n_invalid = validate_gaf(args.graph, args.gaf, args.output, processes=args.processes,
+                                      batch_size=args.batch_size, loaded_c_limit=args.loaded_c_limit)
+    logger.info(f"{n_valid} alignments are valid and {n_invalid} are not")
 
-    try:
-        upper, lower = int(sys.argv[4]), int(sys.argv[5])
-        if lower > upper:
-            print(f"the lower threshold cannot be bigger than the upper threshold")
-            sys.exit()
 
-    except ValueError:
-        print("upper and lower threshold must be integers")
+def byte_size(value):
+    """
+    argparse type for sizes in bytes like 512K, 64M or 2G
+    """
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    if value[-1].upper() in units:
+        return int(float(value[:-1]) * units[value[-1].upper()])
+    return int(value)
+
+
+def run_cache_sim(args):
+    from extgfa.chunk_trace import read_trace, LOAD
+    from extgfa.cache_sim import replay
+
+    if not os.path.exists(args.trace):
+        print(f"input file {args.trace} does not exist")
         sys.exit()
+    graph_file, runs, sizes = read_trace(args.trace)
+    node_chunks = None
+    if args.partition is not None:
+        from extgfa.ChGraph import ChGraph
+        other = ChGraph(args.partition)
+        node_chunks = other.get_node_chunks({n for n, _, _ in runs if n != LOAD})
+        if hasattr(other.offsets, "byte_range"):
+            sizes = {chunk_id: other.offsets.byte_range(chunk_id)[1] for chunk_id in other.offsets}
+        else:  # pickled index without the chunk sizes
+            sizes = dict()
+        logger.info(f"Replaying the trace recorded on {graph_file} on the chunks of {args.partition}")
 
-    output_gfa = sys.argv[3].replace(".gfa", "")
-    args = [sys.argv[2], output_gfa, upper, lower]
-    if sys.argv[1] == 'gm':
-        gm_main(*args)
+    results = replay(runs, sizes, args.policies, args.limits, args.byte_budgets, node_chunks)
+    columns = ["policy", "budget", "capacity", "accesses", "hits", "misses", "miss_rate", "evictions", "bytes_read"]
+    print("\t".join(columns))
+    for result in results:
+        print("\t".join(str(result.get(c, "NA")) for c in columns))
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump({"trace": args.trace, "graph": graph_file, "partition": args.partition, "results": results},
+                      f, indent=1)
 
-    if sys.argv[1] == "kl":
-        kl_main(*args)
 
-    if sys.argv[1] == "lv":
-        print("Running Louvian communities algorithm")
-        lv_main(*args)
\ No newline at end of file
+def run_report(args):
+    from extgfa.partition_report import chunked_graph_report, write_report
+
+    if not os.path.exists(args.graph):
+        print(f"input file {args.graph} does not exist")
+        sys.exit()
+    output = args.output
+    if output is None:
+        output = os.path.splitext(args.graph)[0] + ".report.json" if args.graph.endswith((".gfa", ".xgfa")) \
+            else args.graph + ".report.json"
+    report = chunked_graph_report(args.graph, n_seeds=args.seeds, bfs_size=args.bfs_size,
+                                  loaded_c_limit=args.loaded_c_limit, seed=args.seed)
+    write_report(report, output)
+
+
+def run_serve(args):
+    from extgfa.server import GraphServer, graph_name
+
+    graph_files = dict()
+    for graph in args.graphs:
+        name, _, graph_file = graph.rpartition("=")
+        if not name:
+            name = graph_name(graph_file)
+        if not os.path.exists(graph_file):
+            print(f"input file {graph_file} does not exist")
+            sys.exit()
+        if name in graph_files:
+            print(f"The graph name {name} is given twice, use name=graph to name the graphs")
+            sys.exit()
+        graph_files[name] = graph_file
+    if args.socket is not None and os.path.exists(args.socket):
+        import stat
+        import socket
+        if not stat.S_ISSOCK(os.stat(args.socket).st_mode):
+            print(f"The socket given {args.socket} already exists and is not a socket")
+            sys.exit()
+        # the socket of a server that was killed stays behind, it is replaced if nothing listens on it
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            try:
+                client.connect(args.socket)
+            except ConnectionRefusedError:
+                logger.info(f"Removing the stale socket {args.socket}")
+                os.remove(args.socket)
+            else:
+                print(f"The socket given {args.socket} is already used by a running server")
+                sys.exit()
+
+    server = GraphServer(graph_files, loaded_c_limit=args.loaded_c_limit)
+    if args.socket is None:
+        server.serve_stdio()
+    else:
+        server.serve_socket(args.socket)
+
+
+def main():
+    print(f"Running version {version}", file=sys.stderr)
+    parser = argparse.ArgumentParser(prog="extgfa", description="Generating a disk-chunked GFA graph")
+    subparsers = parser.add_subparsers(dest="command", metavar="command")
+    for algo, name in ALGORITHMS.items():
+        subparsers.add_parser(algo, parents=[partition_arguments()], help=f"partition the graph with {name}")
+
+    gaf_parser = subparsers.add_parser("validate-gaf", help="check that the alignment paths of a GAF exist in a chunked graph")
+    gaf_parser.add_argument("graph", help="chunked GFA graph")
+    gaf_parser.add_argument("gaf", help="GAF file, - for stdin")
+    gaf_parser.add_argument("output", help="output TSV with one line per alignment, - for stdout")
+    gaf_parser.add_argument("--processes", type=int, default=1, help="number of processes (default: 1)")
+    gaf_parser.add_argument("--batch-size", type=int, default=100_000,
+                            help="number of alignments grouped by chunks at a time (default: 100000)")
+    gaf_parser.add_argument("--loaded-c-limit", type=int, default=10,
+                            help="number of chunks each process keeps loaded (default: 10)")
+
+    sim_parser = subparsers.add_parser("cache-sim", help="replay a chunk access trace against simulated chunk caches")
+    sim_parser.add_argument("trace", help="trace recorded with ChGraph.start_trace")
+    sim_parser.add_argument("--policies", nargs="+", default=list(POLICIES), choices=POLICIES,
+                            help="eviction policies to simulate (default: all)")
+    sim_parser.add_argument("--limits", type=int, nargs="+", default=[2, 5, 10, 20, 50],
+                            help="cache sizes in chunks, like loaded_c_limit (default: 2 5 10 20 50)")
+    sim_parser.add_argument("--byte-budgets", type=byte_size, nargs="+", default=[],
+                            help="cache sizes in bytes of chunk data, K, M and G suffixes are accepted")
+    sim_parser.add_argument("--partition", default=None,
+                            help="another chunked graph of the same input graph to replay the trace on its chunks")
+    sim_parser.add_argument("--json", default=None, help="also write the results to this JSON file")
+
+    report_parser = subparsers.add_parser("report", help="partition quality report of an existing chunked graph")
+    report_parser.add_argument("graph", help="chunked GFA graph or .xgfa container")
+    report_parser.add_argument("--output", default=None, help="output JSON (default: <graph>.report.json)")
+    report_parser.add_argument("--seeds", type=int, default=20,
+                               help="number of random start nodes of the simulated BFS (default: 20)")
+    report_parser.add_argument("--bfs-size", type=int, default=1000,
+                               help="number of nodes of each simulated BFS (default: 1000)")
+    report_parser.add_argument("--loaded-c-limit", type=int, default=10,
+                               help="number of chunks kept loaded during the simulated BFS (default: 10)")
+    report_parser.add_argument("--seed", type=int, default=1, help="random seed (default: 1)")
+
+    serve_parser = subparsers.add_parser("serve", help="keep chunked graphs open and answer queries as line-delimited "
+                                                       "JSON on a Unix socket or stdin/stdout")
+    serve_parser.add_argument("graphs", nargs="+",
+                              help="chunked GFA graphs or containers, as name=graph or graph to name them after the "
+                                   "file")
+    serve_parser.add_argument("--socket", default=None,
+                              help="Unix domain socket to listen on for concurrent clients (default: stdin/stdout)")
+    serve_parser.add_argument("--loaded-c-limit", type=int, default=10,
+                              help="number of chunks kept loaded for each graph (default: 10)")
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        sys.exit()
+
+    if args.command in ALGORITHMS:
+        run_partitioning(args)
+    elif args.command == "validate-gaf":
+        run_validate_gaf(args)
+    elif args.command == "cache-sim":
+        run_cache_sim(args)
+    elif args.command == "report":
+        run_report(args)
+    elif args.command == "serve":
+        run_serve(args)
@@ -0,0 +1,97 @@
+"""
+Bloom filter over all the node ids of a chunked graph, so ChGraph can tell that a node is not in the graph
+without a lookup in the node_id:chunk_id index, e.g. for node ids coming from another build of the graph.
+A node id not in the filter is certainly not in the graph, a node id in the filter is in the graph except for
+a false positive rate of about 1% with the default 10 bits per node, the index is then looked up as before.
+
+The positions of a node id are derived from its 128 bit blake2b hash by double hashing, so the filter does
+not depend on the Python hash seed. It is written next to the chunked graph (.bloom) and as the BLOOM section
+of the container. Layout, all integers little-endian:
+header:     magic b"XGBF", format version (u16), number of hash functions (u16), number of node ids (u64),
+            number of bits (u64)
+bits:       the bit array, bit i is bit i % 8 of byte i // 8
+"""
+import mmap
+import math
+import struct
+import hashlib
+
+
+BLOOM_MAGIC = b"XGBF"
+BLOOM_VERSION = 1
+BLOOM_HEADER = struct.Struct("<4sHHQQ")
+
+
+def hash_pair(node_id):
+    """
+    returns the two 64 bit hashes of a node id the positions are derived from
+    """
+    digest = hashlib.blake2b(node_id.encode(), digest_size=16).digest()
+    # an odd step never cycles back to the first position early
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+def node_filter_bytes(node_ids, bits_per_node=10):
+    """
+    returns the Bloom filter of the node ids in the layout above
+    """
+    node_ids = list(node_ids)
+    n_bits = max(64, len(node_ids) * bits_per_node)
+    n_bits += -n_bits % 8
+    n_hashes = max(1, round(bits_per_node * math.log(2)))
+    bits = bytearray(n_bits // 8)
+    for node_id in node_ids:
+        h1, h2 = hash_pair(node_id)
+        for i in range(n_hashes):
+            position = (h1 + i * h2) % n_bits
+            bits[position >> 3] |= 1 << (position & 7)
+    return BLOOM_HEADER.pack(BLOOM_MAGIC, BLOOM_VERSION, n_hashes, len(node_ids), n_bits) + bytes(bits)
+
+
+def write_node_filter(node_ids, output_file, bits_per_node=10):
+    """
+    writes the Bloom filter of the node ids, returns its size in bytes
+    """
+    data = node_filter_bytes(node_ids, bits_per_node)
+    with open(output_file, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+class NodeFilter:
+    """
+    Memory-mapped Bloom filter of the node ids, "node_id in node_filter" is False only for node ids
+    that are not in the graph
+    """
+
+    def __init__(self, filter_file, offset=0, length=None):
+        """
+        offset and length give the byte range of the filter in the file, by default the whole file
+        """
+        with open(filter_file, "rb") as f:
+            # the map stays valid after the file is closed
+            filter_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if length is None:
+            length = len(filter_map) - offset
+        buffer = memoryview(filter_map)[offset:offset + length]
+        magic, version, self.n_hashes, self.n_nodes, self.n_bits = BLOOM_HEADER.unpack_from(buffer, 0)
+        if magic != BLOOM_MAGIC:
+            raise ValueError(f"{filter_file} does not have a node filter")
+        if version > BLOOM_VERSION:
+            raise ValueError(f"{filter_file} has node filter version {version}, "
+                             f"but this version of extgfa only reads up to version {BLOOM_VERSION}")
+        self.bits = buffer[BLOOM_HEADER.size:BLOOM_HEADER.size + self.n_bits // 8]
+
+    def __contains__(self, node_id):
+        h1, h2 = hash_pair(node_id)
+        for i in range(self.n_hashes):
+            position = (h1 + i * h2) % self.n_bits
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def false_positive_rate(self):
+        """
+        returns the expected false positive rate for the number of node ids in the filter
+        """
+        return (1 - math.exp(-self.n_hashes * self.n_nodes / self.n_bits)) ** self.n_hashes
@@ -0,0 +1,230 @@
+"""
+Backends of the node_id:chunk_id index used by ChGraph to find which chunk to load for a node.
+Every backend implements get(node_id) returning the chunk id or None, and get_many(node_ids) returning
+a dictionary of node_id: chunk_id (None for the nodes that are not in the graph).
+
+The .nodes file next to the chunked graph holds the node table of the container in a file of its own,
+for the sequence lengths and degrees of the nodes: magic b"XGNT", format version (u16), reserved (u16),
+length of the NODEIDX part (u64), then the NODEIDX and NODEINFO sections (see container.py), NODEINFO starting
+at a multiple of 8 bytes.
+
+The .sqlite file is the alternative to the dbm database, written with --node-index sqlite. Its tables are
+nodes (id, chunk, length, start_degree, end_degree), node_tags (node, tag, type, value) with the S line tags,
+integers and floats stored as numbers, chunks (id, offset, length, n_lines, the SUMMARY_FIELDS of chunk_index.py
+and the degree histogram as JSON) and meta (key, value). It is opened read-only, so any number of processes
+can query it at the same time, and it can be queried with SQL directly, e.g. for the nodes with a given tag.
+"""
+import os
+import dbm
+import json
+import mmap
+import pickle
+import shelve
+import struct
+import sqlite3
+import pathlib
+from extgfa.container import ContainerNodeIndex, node_index_bytes, node_info_bytes, ALIGNMENT
+from extgfa.chunk_index import SUMMARY_FIELDS
+from extgfa.sequence_utils import node_length
+
+TABLE_MAGIC = b"XGNT"
+TABLE_VERSION = 1
+TABLE_HEADER = struct.Struct("<4sHHQ")
+SQLITE_VERSION = 1
+SQLITE_BATCH = 500  # node ids per IN (...) query, under the 999 parameters of old SQLite versions
+SQLITE_SCHEMA = f"""
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE nodes (id TEXT PRIMARY KEY, chunk INTEGER, length INTEGER, start_degree INTEGER, end_degree INTEGER)
+    WITHOUT ROWID;
+CREATE TABLE node_tags (node TEXT, tag TEXT, type TEXT, value);
+CREATE TABLE chunks (id INTEGER PRIMARY KEY, offset INTEGER, length INTEGER, n_lines INTEGER,
+    {", ".join(f"{field} INTEGER" for field in SUMMARY_FIELDS)}, degrees TEXT);
+"""
+
+
+class ShelveNodeIndex:
+    """
+    The dbm database written with shelve by final_output
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+
+    def get(self, node_id):
+        with shelve.open(self.db_file, flag="r") as node_chunk:
+            return node_chunk.get(node_id)
+
+    def get_many(self, node_ids):
+        with shelve.open(self.db_file, flag="r") as node_chunk:
+            return {n: node_chunk.get(n) for n in node_ids}
+
+
+def write_shelve_index(output_file, node_chunks):
+    """
+    writes the node_id:chunk_id dbm database read by ShelveNodeIndex, in the format of shelve
+    node_chunks: iterable of (node_id, chunk_id)
+    """
+    # there are few chunk ids, each is pickled once instead of once per node
+    values = dict()
+    n_nodes = 0
+    with dbm.open(output_file, "n") as db:
+        for node_id, chunk_id in node_chunks:
+            value = values.get(chunk_id)
+            if value is None:
+                value = values[chunk_id] = pickle.dumps(chunk_id, pickle.DEFAULT_PROTOCOL)
+            db[node_id.encode()] = value
+            n_nodes += 1
+    return n_nodes
+
+
+def remove_node_index(db_file):
+    """
+    removes the node index db_file, a dbm database or an .sqlite file, with the files its backend adds next to it,
+    so a graph written again with the other backend is not opened with the index of the previous run
+    """
+    # dbm adds .db, .dat, .dir, .bak or .pag depending on its backend, SQLite its write-ahead log
+    for suffix in ("", ".db", ".dat", ".dir", ".bak", ".pag", "-wal", "-shm"):
+        if os.path.exists(db_file + suffix):
+            os.remove(db_file + suffix)
+
+
+def tag_value(tag_type, value):
+    """
+    returns the value of a tag as a number for the i and f types, so it can be compared in SQL
+    """
+    if tag_type == "i":
+        return int(value)
+    if tag_type == "f":
+        return float(value)
+    return value
+
+
+def write_sqlite_index(output_file, graph, chunk_offsets, chunk_lengths, summaries=None):
+    """
+    writes the SQLite node index of a Graph with the chunk ids assigned, in a single transaction
+    chunk_offsets: dictionary of chunk_id: [offset, n_lines] in the reordered GFA
+    chunk_lengths: dictionary of chunk_id: length of the chunk in bytes
+    summaries: the per-chunk summary records of chunk_index.summarize_chunks
+    """
+    if os.path.exists(output_file):
+        os.remove(output_file)
+    connection = sqlite3.connect(output_file)
+    # the journal mode is kept in the file, readers then do not block each other or a writer
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=OFF")
+    connection.executescript(SQLITE_SCHEMA)
+    n_fields = len(SUMMARY_FIELDS)
+    with connection:
+        connection.executemany("INSERT INTO meta VALUES (?, ?)",
+                               [("version", str(SQLITE_VERSION)), ("n_nodes", str(len(graph.nodes))),
+                                ("n_chunks", str(len(chunk_offsets)))])
+        # in key order, the table is a B-tree on the node ids
+        connection.executemany("INSERT INTO nodes VALUES (?, ?, ?, ?, ?)",
+                               ((n, node.chunk_id, node_length(node), len(node.start), len(node.end))
+                                for n, node in sorted(graph.nodes.items())))
+        connection.executemany("INSERT INTO node_tags VALUES (?, ?, ?, ?)",
+                               ((n, tag, tag_type, tag_value(tag_type, value)) for n, node in graph.nodes.items()
+                                for tag, (tag_type, value) in node.tags.items()))
+        rows = []
+        for chunk_id in sorted(chunk_offsets):
+            offset, n_lines = chunk_offsets[chunk_id]
+            if summaries is not None:
+                summary = summaries[chunk_id - 1]
+                degrees = {degree: count for degree, count in enumerate(summary[n_fields:]) if count}
+                rows.append((chunk_id, offset, chunk_lengths[chunk_id], n_lines, *summary[:n_fields],
+                             json.dumps(degrees)))
+            else:
+                rows.append((chunk_id, offset, chunk_lengths[chunk_id], n_lines) + (None,) * (n_fields + 1))
+        connection.executemany(f"INSERT INTO chunks VALUES ({', '.join('?' * (n_fields + 5))})", rows)
+        connection.execute("CREATE INDEX nodes_chunk ON nodes (chunk)")
+        connection.execute("CREATE INDEX node_tags_node ON node_tags (node)")
+        connection.execute("CREATE INDEX node_tags_value ON node_tags (tag, value)")
+    connection.close()
+    return len(graph.nodes)
+
+
+class SqliteNodeIndex:
+    """
+    The SQLite node index written with --node-index sqlite, opened read-only
+    the lookups of many nodes are batched into IN (...) queries
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.connection = None
+        self.pid = None
+
+    def connect(self):
+        # a connection cannot be used across a fork, every process opens its own; the ChGraph users
+        # serialize their queries, so the connection can be shared by threads
+        if self.connection is None or self.pid != os.getpid():
+            uri = pathlib.Path(self.db_file).resolve().as_uri() + "?mode=ro"
+            self.connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self.pid = os.getpid()
+        return self.connection
+
+    def __getstate__(self):
+        # a pickled index, e.g. sent to a worker process, opens its own connection
+        return {"db_file": self.db_file, "connection": None, "pid": None}
+
+    def get(self, node_id):
+        row = self.connect().execute("SELECT chunk FROM nodes WHERE id = ?", (node_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def get_many(self, node_ids):
+        node_ids = list(node_ids)
+        chunks = dict.fromkeys(node_ids)
+        connection = self.connect()
+        for i in range(0, len(node_ids), SQLITE_BATCH):
+            batch = node_ids[i:i + SQLITE_BATCH]
+            chunks.update(connection.execute(f"SELECT id, chunk FROM nodes WHERE id IN ({', '.join('?' * len(batch))})",
+                                             batch))
+        return chunks
+
+    def node_info(self, node_id):
+        """
+        returns (sequence length, start degree, end degree) of a node, None if it is not in the graph
+        """
+        return self.connect().execute("SELECT length, start_degree, end_degree FROM nodes WHERE id = ?",
+                                      (node_id,)).fetchone()
+
+    def query(self, sql, parameters=()):
+        """
+        returns the rows of a read-only SQL query on the index, e.g.
+        query("SELECT node FROM node_tags WHERE tag = 'SN' AND value = ?", ("chr22",))
+        """
+        return self.connect().execute(sql, parameters).fetchall()
+
+
+def write_node_table(output_file, node_chunks, node_info):
+    """
+    writes the .nodes file
+    node_chunks: iterable of (node_id, chunk_id)
+    node_info: iterable of (node_id, sequence length, start degree, end degree)
+    """
+    index = node_index_bytes(node_chunks)
+    with open(output_file, "wb") as f:
+        f.write(TABLE_HEADER.pack(TABLE_MAGIC, TABLE_VERSION, 0, len(index)))
+        f.write(index)
+        f.write(b"\0" * (-f.tell() % ALIGNMENT))
+        f.write(node_info_bytes(node_info))
+
+
+def read_node_table(table_file):
+    """
+    returns the memory-mapped node table of a .nodes file, with get, get_many and node_info
+    """
+    with open(table_file, "rb") as f:
+        # the map stays valid after the file is closed
+        table_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, _, index_length = TABLE_HEADER.unpack_from(table_map, 0)
+    if magic != TABLE_MAGIC:
+        raise ValueError(f"{table_file} is not an extgfa node table")
+    if version > TABLE_VERSION:
+        raise ValueError(f"{table_file} has node table version {version}, "
+                         f"but this version of extgfa only reads up to version {TABLE_VERSION}")
+    start = TABLE_HEADER.size
+    info_start = start + index_length
+    info_start += -info_start % ALIGNMENT
+    view = memoryview(table_map)
+    return ContainerNodeIndex(view[start:start + index_length], view[info_start:])
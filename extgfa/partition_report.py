@@ -0,0 +1,168 @@
+"""
+Quality report of a partition, written as JSON next to the chunked graph by the indexer (.report.json)
+or computed for an existing chunked graph with extgfa report.
+It has the chunk size distributions in nodes and bases, the edge cut, the fraction of boundary nodes per chunk
+(nodes with an edge to another chunk), the degree of the chunks in the chunk graph, the number of chunks
+each connected component is split into, and the number of chunk loads of BFS neighborhoods from sampled seeds,
+replayed with the ChGraph FIFO cache.
+"""
+import io
+import json
+import random
+import logging
+from collections import deque, defaultdict
+from extgfa.cache_sim import chunk_runs, simulate
+from extgfa.sequence_utils import node_length
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+
+def distribution(values):
+    """
+    returns the summary of a list of numbers
+    """
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+    n = len(values)
+    return {"count": n, "total": sum(values), "mean": sum(values) / n, "min": values[0],
+            "p25": values[n // 4], "median": values[n // 2], "p75": values[(3 * n) // 4],
+            "p95": values[min(n - 1, (95 * n) // 100)], "max": values[-1]}
+
+
+def components(graph):
+    """
+    returns the list of the connected components of the graph as lists of node ids
+    """
+    seen = set()
+    result = []
+    for n_id in graph.nodes:
+        if n_id in seen:
+            continue
+        seen.add(n_id)
+        component = [n_id]
+        queue = deque([n_id])
+        while queue:
+            for neighbor in graph.nodes[queue.popleft()].neighbors():
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    component.append(neighbor)
+                    queue.append(neighbor)
+        result.append(component)
+    return result
+
+
+def bfs_order(graph, start, size):
+    """
+    returns the node ids in the order a BFS neighborhood of size nodes around start visits them
+    """
+    order = [start]
+    seen = {start}
+    queue = deque([start])
+    while queue and len(order) < size:
+        for neighbor in graph.nodes[queue.popleft()].neighbors():
+            if neighbor not in seen:
+                seen.add(neighbor)
+                order.append(neighbor)
+                queue.append(neighbor)
+    return order
+
+
+def partition_report(graph, n_seeds=20, bfs_size=1000, loaded_c_limit=10, seed=1):
+    """
+    returns the report of a Graph whose nodes have their chunk_id assigned
+    """
+    chunk_nodes = defaultdict(int)
+    chunk_bases = defaultdict(int)
+    boundary = defaultdict(int)
+    internal_edges = defaultdict(int)
+    cut_edges = defaultdict(int)
+    neighbor_chunks = defaultdict(set)
+    n_edges = 0
+    n_cut = 0
+    for n in graph.nodes.values():
+        chunk_id = n.chunk_id
+        chunk_nodes[chunk_id] += 1
+        chunk_bases[chunk_id] += node_length(n)
+        is_boundary = False
+        for side, edges in ((0, n.start), (1, n.end)):
+            for other, other_side, _ in edges:
+                other_chunk = graph.nodes[other].chunk_id
+                if other_chunk != chunk_id:
+                    is_boundary = True
+                    neighbor_chunks[chunk_id].add(other_chunk)
+                # every edge is stored on both of its ends, it is counted from the smaller end
+                if (n.id, side) > (other, other_side):
+                    continue
+                n_edges += 1
+                if other_chunk == chunk_id:
+                    internal_edges[chunk_id] += 1
+                else:
+                    n_cut += 1
+                    cut_edges[chunk_id] += 1
+                    cut_edges[other_chunk] += 1
+        if is_boundary:
+            boundary[chunk_id] += 1
+
+    chunks = []
+    for chunk_id in sorted(chunk_nodes):
+        chunks.append({"chunk_id": chunk_id, "nodes": chunk_nodes[chunk_id], "bases": chunk_bases[chunk_id],
+                       "internal_edges": internal_edges[chunk_id], "cut_edges": cut_edges[chunk_id],
+                       "boundary_nodes": boundary[chunk_id],
+                       "boundary_fraction": boundary[chunk_id] / chunk_nodes[chunk_id],
+                       "neighbor_chunks": len(neighbor_chunks[chunk_id])})
+
+    component_chunks = [len({graph.nodes[n].chunk_id for n in component}) for component in components(graph)]
+
+    rng = random.Random(seed)
+    node_ids = sorted(graph.nodes)
+    seeds = rng.sample(node_ids, min(n_seeds, len(node_ids)))
+    loads = []
+    for start in seeds:
+        order = bfs_order(graph, start, bfs_size)
+        runs = chunk_runs((n, graph.nodes[n].chunk_id, 1) for n in order)
+        loads.append(simulate(runs, "fifo", loaded_c_limit)["misses"])
+
+    return {
+        "n_nodes": len(graph.nodes), "n_edges": n_edges, "n_chunks": len(chunk_nodes),
+        "chunk_nodes": distribution(list(chunk_nodes.values())),
+        "chunk_bases": distribution(list(chunk_bases.values())),
+        "edge_cut": n_cut, "edge_cut_fraction": n_cut / n_edges if n_edges else 0,
+        "boundary_fraction": distribution([c["boundary_fraction"] for c in chunks]),
+        "chunk_degree": distribution([c["neighbor_chunks"] for c in chunks]),
+        "n_components": len(component_chunks), "chunks_per_component": distribution(component_chunks),
+        "bfs_chunk_loads": {"seeds": len(seeds), "bfs_size": bfs_size, "loaded_c_limit": loaded_c_limit,
+                            **distribution(loads)},
+        "chunks": chunks,
+    }
+
+
+def write_report(report, output_file):
+    with open(output_file, "w") as f:
+        json.dump(report, f, indent=1)
+    logger.info(f"Partition report: {report['n_chunks']} chunks, edge cut {report['edge_cut']} "
+                f"({report['edge_cut_fraction']:.2%} of the edges), median boundary fraction "
+                f"{report['boundary_fraction'].get('median', 0):.2f}, median chunk loads for a BFS of "
+                f"{report['bfs_chunk_loads']['bfs_size']} nodes {report['bfs_chunk_loads'].get('median', 0)}")
+
+
+def chunked_graph_report(graph_file, **options):
+    """
+    returns the report of an existing chunked graph or container, the chunk ids are read from the cid tags
+    of the reordered GFA
+    """
+    from extgfa.Graph import Graph
+    graph = Graph()
+    if graph_file.endswith(".xgfa"):
+        from extgfa.container import Container
+        # only the chunk data section of a container is GFA: the chunks, then the P and W lines
+        chunk_data = Container(graph_file).section("CHUNKDAT")
+        with io.TextIOWrapper(io.BytesIO(chunk_data), encoding="utf-8") as lines:
+            graph.read_gfa_lines(lines)
+    else:
+        graph.read_gfa(graph_file)
+    for n in graph.nodes.values():
+        n.chunk_id = int(n.tags["cid"][1])
+    return partition_report(graph, **options)
@@ -0,0 +1,90 @@
+"""
+Interval index from the rGFA stable coordinates (SN/SO tags) of the nodes to the node ids and their chunks.
+The index is written next to the chunked graph as a TSV sorted by contig and start, with one line per node:
+contig, start, end, node id, chunk id
+and is loaded by ChGraph to answer region queries without scanning the graph.
+"""
+import logging
+from bisect import bisect_left
+from collections import defaultdict
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+
+def node_interval(node):
+    """
+    returns the (contig, start, end) stable coordinates of a node or None if it has no SN/SO tags
+    """
+    if "SN" not in node.tags or "SO" not in node.tags:
+        return None
+    if "LN" in node.tags:
+        length = int(node.tags["LN"][1])
+    else:
+        length = len(node.seq)
+    start = int(node.tags["SO"][1])
+    return node.tags["SN"][1], start, start + length
+
+
+def write_region_index(graph, output_file):
+    """
+    writes the interval index of all the nodes with stable coordinates in the graph
+    returns the number of nodes indexed
+    """
+    intervals = []
+    for n in graph.nodes.values():
+        interval = node_interval(n)
+        if interval is not None:
+            intervals.append((interval[0], interval[1], interval[2], n.id, n.chunk_id))
+    if not intervals:
+        return 0
+    intervals.sort()
+    with open(output_file, "w") as f:
+        for contig, start, end, n_id, chunk_id in intervals:
+            f.write(f"{contig}\t{start}\t{end}\t{n_id}\t{chunk_id}\n")
+    return len(intervals)
+
+
+class RegionIndex:
+    """
+    In-memory view of the region index, one sorted interval list per contig
+    """
+
+    def __init__(self, index_file, offset=0, length=-1):
+        """
+        offset and length give the byte range of the index in the file, by default the whole file
+        """
+        self.starts = defaultdict(list)
+        self.ends = defaultdict(list)
+        self.nodes = defaultdict(list)
+        self.max_len = defaultdict(int)
+        with open(index_file, "rb") as f:
+            f.seek(offset)
+            for line in f.read(length).decode().splitlines():
+                contig, start, end, n_id, chunk_id = line.split("\t")
+                start, end = int(start), int(end)
+                self.starts[contig].append(start)
+                self.ends[contig].append(end)
+                self.nodes[contig].append((n_id, int(chunk_id)))
+                if end - start > self.max_len[contig]:
+                    self.max_len[contig] = end - start
+
+    def contigs(self):
+        """
+        returns the names of the indexed contigs
+        """
+        return list(self.starts.keys())
+
+    def query(self, contig, start, end):
+        """
+        returns a list of (node_id, chunk_id) of the nodes overlapping the half-open interval [start, end)
+        """
+        if contig not in self.starts:
+            return []
+        starts = self.starts[contig]
+        ends = self.ends[contig]
+        # no interval is longer than max_len, so nothing starting before start - max_len can reach start
+        first = bisect_left(starts, start - self.max_len[contig])
+        last = bisect_left(starts, end)
+        return [self.nodes[contig][i] for i in range(first, last) if ends[i] > start]
@@ -0,0 +1,18 @@
+"""
+Sequence helpers needed at query time, kept apart from utilities.py so the graph classes do not import
+the partitioning dependencies
+"""
+complement = str.maketrans("ACGTN", "TGCAN")
+
+
+def rev_comp(seq):
+    return seq[::-1].translate(complement)
+
+
+def node_length(node):
+    """
+    returns the sequence length of a node, from the LN tag when the sequence is not in the graph
+    """
+    if "LN" in node.tags:
+        return int(node.tags["LN"][1])
+    return len(node.seq)
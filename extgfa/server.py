@@ -0,0 +1,331 @@
+"""
+Query server keeping chunked graphs open with warm chunk caches, started with extgfa serve,
+and the client that talks to it.
+
+The protocol is line-delimited JSON over a Unix domain socket or stdin/stdout, one request per line:
+{"id": 1, "graph": "chr22", "method": "bfs", "params": {"start": "s1", "size": 100}}
+and one response per line with the same id, in the order of the requests of the connection:
+{"id": 1, "result": [...]} or {"id": 1, "error": "..."}
+"graph" can be left out when the server has a single graph. Sets are sent as sorted lists.
+
+Every connection to the socket is handled in its own thread. A ChGraph is not thread safe, so the requests
+to the same graph are answered one at a time, and the requests to different graphs in parallel.
+"""
+import os
+import sys
+import json
+import socket
+import signal
+import logging
+import threading
+import socketserver
+from extgfa.ChGraph import ChGraph
+
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+
+
+def require_node(graph, node_id):
+    """
+    raises a KeyError for a node not in the graph, ChGraph exits on them in some methods
+    """
+    if node_id not in graph.nodes and graph.get_node_chunk(node_id) is None:
+        raise KeyError(f"node {node_id} is not in the graph")
+
+
+def run_neighbors(graph, node_id):
+    require_node(graph, node_id)
+    return graph.neighbors(node_id)
+
+
+def run_children(graph, node_id, direction):
+    require_node(graph, node_id)
+    return graph.children(node_id, direction)
+
+
+def run_bfs(graph, start, size):
+    require_node(graph, start)
+    return graph.bfs(start, size)
+
+
+def run_bfs_many(graph, seeds, size, output_file=None, separate=False):
+    return graph.bfs_many(seeds, size, output_file=output_file, separate=separate)
+
+
+# method: function(graph, **params) answering it
+METHODS = {
+    "neighbors": run_neighbors,
+    "children": run_children,
+    "bfs": run_bfs,
+    "bfs_many": run_bfs_many,
+    "extract_region": lambda graph, contig, start, end, flank=0, output_file=None, include_alt=True:
+        graph.extract_region(contig, start, end, flank=flank, output_file=output_file, include_alt=include_alt),
+    "path_names": lambda graph: graph.path_names(),
+    "extract_path_seq": lambda graph, path: graph.extract_path_seq(path),
+    "write_path_seq": lambda graph, name, output_file, line_width=60:
+        graph.write_path_seq(name, output_file, line_width=line_width),
+    "write_subgraph": lambda graph, nodes, output_file: graph.write_subgraph(set(nodes), output_file=output_file),
+    "get_node_chunk": lambda graph, node_id: graph.get_node_chunk(node_id),
+    "get_node_chunks": lambda graph, node_ids: graph.get_node_chunks(node_ids),
+    "node_length": lambda graph, node_id: graph.node_length(node_id),
+    "degree": lambda graph, node_id, side=None: graph.degree(node_id, side),
+    "distance": lambda graph, a, b: graph.distance(a, b),
+    "shortest_path": lambda graph, a, b: graph.shortest_path(a, b),
+    "graph_stats": lambda graph: graph.graph_stats(),
+    "get_stats": lambda graph: graph.get_stats(),
+}
+
+
+def to_json(obj):
+    """
+    json default for the sets returned by ChGraph
+    """
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+
+def graph_name(graph_file):
+    name = os.path.basename(graph_file)
+    for extension in (".xgfa", ".gfa"):
+        if name.endswith(extension):
+            return name[:-len(extension)]
+    return name
+
+
+class GraphServer:
+    """
+    The open graphs and the answers to the requests, independent of the transport
+    """
+
+    def __init__(self, graph_files, loaded_c_limit=10):
+        """
+        graph_files: dictionary of name: chunked graph file
+        """
+        self.graphs = dict()
+        self.locks = dict()
+        for name, graph_file in graph_files.items():
+            logger.info(f"Opening graph {name} from {graph_file}")
+            graph = ChGraph(graph_file)
+            graph.loaded_c_limit = loaded_c_limit
+            self.graphs[name] = graph
+            self.locks[name] = threading.Lock()
+
+    def answer(self, request):
+        """
+        returns the response to a decoded request
+        """
+        response = {"id": request.get("id")}
+        try:
+            method = request.get("method")
+            params = request.get("params") or dict()
+            if method == "graphs":
+                response["result"] = sorted(self.graphs)
+                return response
+            if method not in METHODS:
+                raise ValueError(f"unknown method {method}")
+            name = request.get("graph")
+            if name is None and len(self.graphs) == 1:
+                name = next(iter(self.graphs))
+            if name not in self.graphs:
+                raise ValueError(f"unknown graph {name}, the graphs are {sorted(self.graphs)}")
+            with self.locks[name]:
+                response["result"] = METHODS[method](self.graphs[name], **params)
+        except (Exception, SystemExit) as e:
+            logger.debug(f"Request {request} failed: {e!r}")
+            response["error"] = f"{type(e).__name__}: {e}"
+        return response
+
+    def answer_line(self, line):
+        """
+        returns the encoded response line of a request line
+        """
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request is a JSON object")
+        except ValueError as e:
+            return json.dumps({"id": None, "error": f"invalid request: {e}"}) + "\n"
+        return json.dumps(self.answer(request), default=to_json) + "\n"
+
+    def serve_stdio(self, stdin=sys.stdin, stdout=sys.stdout):
+        """
+        answers the requests from stdin until it is closed
+        """
+        logger.info(f"Serving {len(self.graphs)} graphs on stdin/stdout")
+        for line in stdin:
+            if not line.strip():
+                continue
+            stdout.write(self.answer_line(line))
+            stdout.flush()
+
+    def serve_socket(self, socket_path):
+        """
+        answers the requests of concurrent clients on a Unix domain socket until interrupted or terminated,
+        the socket file is removed when the server stops
+        """
+        graph_server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    self.wfile.write(graph_server.answer_line(line).encode())
+                    self.wfile.flush()
+
+        class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        def terminate(signum, frame):
+            raise KeyboardInterrupt
+
+        # SIGTERM, e.g. from a service manager, stops the server like ctrl-c; handlers can only be set
+        # in the main thread
+        previous_handler = None
+        if threading.current_thread() is threading.main_thread():
+            previous_handler = signal.signal(signal.SIGTERM, terminate)
+        with Server(socket_path, Handler) as server:
+            logger.info(f"Serving {len(self.graphs)} graphs on {socket_path}")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                logger.info("Stopping the server")
+            finally:
+                os.remove(socket_path)
+                if previous_handler is not None:
+                    signal.signal(signal.SIGTERM, previous_handler)
+
+
+class ServerError(Exception):
+    """
+    error returned by the server for a request
+    """
+
+
+class GraphClient:
+    """
+    Client of extgfa serve with the query methods of ChGraph, answered by the server
+    the client can be shared between threads, the requests are sent one at a time
+    """
+
+    def __init__(self, socket_path=None, graph=None, streams=None):
+        """
+        socket_path: Unix socket of the server
+        graph: name of the graph queried, can be left out when the server has a single graph
+        streams: (reader, writer) text streams to the stdin/stdout of a server instead of a socket,
+        e.g. the stdout and stdin of a subprocess
+        """
+        if streams is not None:
+            self.reader, self.writer = streams
+            self.sock = None
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(socket_path)
+            self.reader = self.sock.makefile("r", encoding="utf-8")
+            self.writer = self.sock.makefile("w", encoding="utf-8")
+        self.graph = graph
+        self.lock = threading.Lock()
+        self.counter = 0
+
+    def close(self):
+        if self.sock is not None:
+            self.reader.close()
+            self.writer.close()
+            self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request(self, method, **params):
+        """
+        sends a request and returns its result, raises ServerError if the server answered with an error
+        """
+        with self.lock:
+            self.counter += 1
+            request = {"id": self.counter, "method": method, "params": params}
+            if self.graph is not None:
+                request["graph"] = self.graph
+            self.writer.write(json.dumps(request, default=to_json) + "\n")
+            self.writer.flush()
+            line = self.reader.readline()
+        if not line:
+            raise ConnectionError("the server closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            raise ServerError(response["error"])
+        return response["result"]
+
+    def graphs(self):
+        return self.request("graphs")
+
+    def neighbors(self, node_id):
+        return self.request("neighbors", node_id=node_id)
+
+    def children(self, node_id, direction):
+        return [tuple(x) for x in self.request("children", node_id=node_id, direction=direction)]
+
+    def bfs(self, start, size):
+        return set(self.request("bfs", start=start, size=size))
+
+    def bfs_many(self, seeds, size, output_file=None, separate=False):
+        result = self.request("bfs_many", seeds=list(seeds), size=size, output_file=output_file, separate=separate)
+        return {seed: set(neighborhood) for seed, neighborhood in result.items()}
+
+    def extract_region(self, contig, start, end, flank=0, output_file=None, include_alt=True):
+        return set(self.request("extract_region", contig=contig, start=start, end=end, flank=flank,
+                                output_file=output_file, include_alt=include_alt))
+
+    def path_names(self):
+        return self.request("path_names")
+
+    def extract_path_seq(self, path):
+        """
+        returns the sequence of a walk like >s1<s2>s3 or of a P or W path of the graph
+        """
+        return self.request("extract_path_seq", path=path)
+
+    def write_path_seq(self, name, output_file, line_width=60):
+        """
+        the file is written by the server
+        """
+        return self.request("write_path_seq", name=name, output_file=output_file, line_width=line_width)
+
+    def write_subgraph(self, set_of_nodes, output_file="output_file.gfa"):
+        """
+        the file is written by the server
+        """
+        return tuple(self.request("write_subgraph", nodes=list(set_of_nodes), output_file=output_file))
+
+    def get_node_chunk(self, node_id):
+        return self.request("get_node_chunk", node_id=node_id)
+
+    def get_node_chunks(self, node_ids):
+        return self.request("get_node_chunks", node_ids=list(node_ids))
+
+    def node_length(self, node_id):
+        return self.request("node_length", node_id=node_id)
+
+    def degree(self, node_id, side=None):
+        return self.request("degree", node_id=node_id, side=side)
+
+    def distance(self, a, b):
+        return self.request("distance", a=a, b=b)
+
+    def shortest_path(self, a, b):
+        result = self.request("shortest_path", a=a, b=b)
+        return None if result is None else tuple(result)
+
+    def graph_stats(self):
+        stats = self.request("graph_stats")
+        if stats is not None:
+            # JSON object keys are strings
+            stats["degrees"] = {int(degree): count for degree, count in stats["degrees"].items()}
+        return stats
+
+    def get_stats(self):
+        return self.request("get_stats")
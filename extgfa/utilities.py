@@ -1,28 +1,88 @@
+import os
 import sys
-import pickle
 import logging
-import shelve
 from extgfa.Graph import Graph
-import networkx as nx
+from extgfa.chunk_ordering import order_chunks
+from extgfa.region_index import write_region_index
+from extgfa.gfa_paths import write_path_index
+from extgfa.container import write_container
+from extgfa.chunk_index import chunk_lengths, write_chunk_index, summarize_chunks
+from extgfa.partition_report import partition_report, write_report
+from extgfa.sequence_utils import complement, rev_comp, node_length
+from extgfa.node_index import write_node_table, write_sqlite_index, write_shelve_index, remove_node_index
+from extgfa.node_filter import write_node_filter
+from extgfa.distance_index import write_distance_index
 from collections import defaultdict
 
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
-complement = str.maketrans("ACGTN", "TGCAN")
+CHUNK_COLORS = ["black", "blue", "green", "red", "yellow", "cyan", "magenta", "purple", "brown"]
+WEIGHT_TYPES = ("nodes", "bases", "cost")
+NODE_INDEX_TYPES = ("dbm", "sqlite")
+# rough resident size in bytes of a loaded Node object and of one edge tuple, used by the cost weight
+NODE_COST = 300
+EDGE_COST = 100
 
 
-def gfa_to_nx(gfa_file):
+def sequence_length(s_line):
+    """
+    returns the sequence length of a split S line, using the LN tag when the sequence is not given
+    """
+    if s_line[2] != "*":
+        return len(s_line[2])
+    for tag in s_line[3:]:
+        if tag.startswith("LN:"):
+            return int(tag.split(":")[2])
+    return 0
+
+
+def node_weight(seq_len, degree, weight="nodes"):
+    """
+    returns the weight of a node, chunk sizes and the thresholds are measured in this unit
+    nodes: every node counts 1
+    bases: the sequence length of the node (at least 1)
+    cost: estimated bytes of the node once loaded, i.e. its sequence plus the node and edges overhead
+    """
+    if weight == "nodes":
+        return 1
+    if weight == "bases":
+        return max(seq_len, 1)
+    if weight == "cost":
+        return seq_len + NODE_COST + EDGE_COST * degree
+    raise ValueError(f"Weight {weight} not supported, use one of {', '.join(WEIGHT_TYPES)}")
+
+
+def node_degree(neighbors, node_id):
+    """
+    returns the degree of a node for the cost weight: the number of distinct other nodes it is connected to,
+    parallel edges and self-loops not counted, the same for every partitioner and for the logged chunk sizes
+    neighbors: the neighbors of the node, with repeats
+    """
+    return len(set(neighbors) - {node_id})
+
+
+def chunk_weight(graph, nodes):
+    """
+    returns the total weight of the given nodes in the nx graph
+    """
+    return sum(graph.nodes[n]['size'] for n in nodes)
+
+
+def gfa_to_nx(gfa_file, weight="nodes"):
     """
     Converts GFA file to NetworkX graph
     :param gfa_file: GFA file
+    :param weight: unit of the node sizes stored in the 'size' attribute, see node_weight
     """
+    # networkx is only needed to partition, so it is not imported with the module
+    import networkx as nx
     graph = nx.Graph()
     with open(gfa_file) as f:
         for line in f:
             if line.startswith('S'):
                 line = line.strip().split()
-                graph.add_node(line[1], chunk=0)
+                graph.add_node(line[1], chunk=0, seq_len=sequence_length(line))
     # reading twice because if I use only add_edge, nodes without edges won't be added to the graph
     # and I don't want to keep all the L lines in a list, this might take too much memory if the graph is big
     with open(gfa_file) as f:
@@ -34,6 +94,9 @@ def gfa_to_nx(gfa_file):
                     graph.nodes[line[1]]['chunk'] = 0
                 if "chunk" not in graph.nodes[line[3]]:
                     graph.nodes[line[3]]['chunk'] = 0
+    for n in graph:
+        graph.nodes[n]['size'] = node_weight(graph.nodes[n].get('seq_len', 0), node_degree(graph.neighbors(n), n),
+                                             weight)
     return graph
 
 
@@ -52,7 +115,7 @@ def output_csv_colors(graph, chunks, outputfile):
     outputfile: output file name
     """
     outputfile = outputfile.replace(".gfa", ".csv")
-    colors = ["black", "blue", "green", "red", "yellow", "cyan", "magenta", "purple", "brown"]
+    colors = CHUNK_COLORS
     chunk_colors = {x:colors[idx % len(colors)] for idx, x in enumerate(list(chunks.keys()))}
     with open(outputfile, 'w') as f:
         f.write("Name,Colour\n")
@@ -60,11 +123,26 @@ def output_csv_colors(graph, chunks, outputfile):
             f.write(f"{n},{chunk_colors[graph.nodes[n]['chunk']]}\n")
 
 
+def output_csv_colors_index(chunk_index, outputfile):
+    """
+    Same as output_csv_colors but takes the chunk index directly, a list of chunks where each chunk is a list of node ids
+    outputfile: output file name
+    """
+    outputfile = outputfile.replace(".gfa", ".csv")
+    with open(outputfile, 'w') as f:
+        f.write("Name,Colour\n")
+        for idx, chunk in enumerate(chunk_index):
+            color = CHUNK_COLORS[idx % len(CHUNK_COLORS)]
+            for n in chunk:
+                f.write(f"{n},{color}\n")
+
+
 def merge_chunk(graph, chunk_sizes, threshold):
     """
     takes a chunk and tries to merge it with the most common neighboring chunk
     chunk_sizes: a dictionary with chunk id and size of chunk
     graph: the nx graph object
+    threshold: minimum chunk size, in the same weight unit as the 'size' node attribute
     """
     # todo I need to add a rule to stop merging with chunks that are too big
     to_merge = set()
@@ -78,7 +156,7 @@ def merge_chunk(graph, chunk_sizes, threshold):
     for chunk_id in to_merge:
         # pdb.set_trace()
         chunk = [x for x in graph if graph.nodes[x]['chunk'] == chunk_id]
-        if len(chunk) > threshold:
+        if chunk_weight(graph, chunk) > threshold:
             continue
 
         neighbor_chunk = defaultdict(int)
@@ -95,12 +173,12 @@ def merge_chunk(graph, chunk_sizes, threshold):
 
         if neighbor_chunk:  # there are neighboring chunks to merge with
             new_chunk_id = int(max(neighbor_chunk, key=neighbor_chunk.get))  # merge with most connected neighbor
-            logger.info(f"Merging chunk {chunk_id} that contains {chunk_sizes[chunk_id]} nodes with chunk {new_chunk_id}")
+            logger.info(f"Merging chunk {chunk_id} that contains {len(chunk)} nodes of size {chunk_sizes[chunk_id]} with chunk {new_chunk_id}")
 
             # logger.info(f"Merging chunk {chunk_id} with {chunk_sizes[new_chunk_id]} nodes")
             for n in chunk:
                 graph.nodes[n]['chunk'] = new_chunk_id
-            chunk_sizes[new_chunk_id] += len(chunk)
+            chunk_sizes[new_chunk_id] += chunk_sizes[chunk_id]
 
             del chunk_sizes[chunk_id]  # removing the old chunk id entry
             # pdb.set_trace()
@@ -119,6 +197,7 @@ def split_chunk(graph, chunk_sizes, top_threshold, CHUNK_COUNTER, algo):
     """
     # I think to do it faster, I can take the components that come out of kl algorithm
     # and merge those together, but for now, I'll just collect them all and do the merging later
+    import networkx as nx
     if algo == "lv":
         algorithm = nx.community.louvain_communities
     elif algo == "gm":
@@ -146,38 +225,108 @@ def split_chunk(graph, chunk_sizes, top_threshold, CHUNK_COUNTER, algo):
             for n in comp:
                 # new_graph.nodes[n]['chunk'] = idx + 1 + max_chunk_id
                 new_graph.nodes[n]['chunk'] = CHUNK_COUNTER
-            chunk_sizes[CHUNK_COUNTER] = len(comp)
+            chunk_sizes[CHUNK_COUNTER] = chunk_weight(new_graph, comp)
 
             CHUNK_COUNTER += 1
         del chunk_sizes[chunk_id]
     return CHUNK_COUNTER
 
 
-def final_output(chunk_index, input_gfa, output_gfa):
+def log_chunk_weights(graph, chunk_index, weight):
+    """
+    logs the distribution of the chunk sizes in the weight unit used for the thresholds
+    """
+    sizes = []
+    for chunk in chunk_index:
+        sizes.append(sum(node_weight(graph.nodes[n].seq_len, node_degree(graph.nodes[n].neighbors(), n), weight)
+                         for n in chunk))
+    if not sizes:
+        return
+    sizes.sort()
+    logger.info(f"Chunk sizes in {weight}: min {sizes[0]}, median {sizes[len(sizes) // 2]}, max {sizes[-1]}, "
+                f"total {sum(sizes)}")
+
+
+def final_output(chunk_index, input_gfa, output_gfa, order="bfs", weight="nodes", container=False, bubbles=False,
+                 node_index="dbm"):
     # now I have the chunk index, I reload the graph with my class, assign the chunk ids and then output a new
     # graph and the offset index
     logger.info(f"Reloading the GFA with all the information now and assigning the node chunks")
     graph = Graph(input_gfa)
+    # chunk ids follow the on-disk order, so neighboring chunks get close ids and close offsets
+    chunk_index = order_chunks(graph, chunk_index, method=order)
     for idx, chunk in enumerate(chunk_index):
         for n in chunk:
             graph.nodes[n].chunk_id = idx + 1
     n_chunks = len(chunk_index)
     logger.info(f"There are {n_chunks} chunks")
+    log_chunk_weights(graph, chunk_index, weight)
     # del chunk_index
 
-    logger.info(f"Creating the node_id:chunk_id DB")
-    outshelve = shelve.open(output_gfa + ".db")
-    for n in graph.nodes.keys():
-        outshelve[n] = graph[n].chunk_id
-    logger.info(f"Shelving the db to {output_gfa}.db")
-    outshelve.close()
+    if node_index == "dbm":
+        remove_node_index(output_gfa + ".sqlite")
+        logger.info(f"Creating the node_id:chunk_id DB")
+        write_shelve_index(output_gfa + ".db", ((n, node.chunk_id) for n, node in graph.nodes.items()))
+        logger.info(f"Shelved the db to {output_gfa}.db")
+    elif node_index == "sqlite":
+        remove_node_index(output_gfa + ".db")
+    else:
+        raise ValueError(f"Node index {node_index} not supported, use one of {', '.join(NODE_INDEX_TYPES)}")
 
     logger.info(f"outputting the chunked GFA into {output_gfa}")
-    graph.write_chunked_gfa(chunk_index, output_gfa + ".gfa")
+    data_end = graph.write_chunked_gfa(chunk_index, output_gfa + ".gfa")
+    lengths = chunk_lengths(graph.chunk_offsets, data_end)
 
     logger.info(f"outputting the chunked GFA offsets into {output_gfa}.index")
-    outindex = open(output_gfa + ".index", "wb")
-    pickle.dump(graph.chunk_offsets, outindex)
+    summaries = summarize_chunks(graph, n_chunks)
+    write_chunk_index(output_gfa + ".index", graph.chunk_offsets, lengths, summaries, sqlite=node_index == "sqlite")
+
+    if node_index == "sqlite":
+        logger.info(f"Writing the node_id:chunk_id index, node tags and chunk summaries into {output_gfa}.sqlite")
+        write_sqlite_index(output_gfa + ".sqlite", graph, graph.chunk_offsets, lengths, summaries)
+
+    logger.info(f"Writing the node lengths and degrees into {output_gfa}.nodes")
+    node_info = [(n, node_length(node), len(node.start), len(node.end)) for n, node in graph.nodes.items()]
+    write_node_table(output_gfa + ".nodes", ((n, node.chunk_id) for n, node in graph.nodes.items()), node_info)
+
+    n_bytes = write_node_filter(graph.nodes.keys(), output_gfa + ".bloom")
+    logger.info(f"Wrote the Bloom filter of the node ids ({n_bytes} bytes) into {output_gfa}.bloom")
+
+    n_sides = write_distance_index(graph, n_chunks, output_gfa + ".dist")
+    logger.info(f"Wrote the distances between the {n_sides} chunk boundary node sides into {output_gfa}.dist")
+
+    if bubbles:
+        from extgfa.bubble_decomposition import bubble_decomposition
+        from extgfa.bubble_index import write_bubble_index
+        logger.info("Finding the bubbles of the graph")
+        graph_bubbles, _ = bubble_decomposition(graph)
+        write_bubble_index(graph, n_chunks, graph_bubbles, output_gfa + ".bubbles")
+        logger.info(f"Wrote the {len(graph_bubbles)} bubbles into {output_gfa}.bubbles")
+    elif os.path.exists(output_gfa + ".bubbles"):
+        # left by an earlier run on another partition, its chunk ids do not match this one
+        os.remove(output_gfa + ".bubbles")
+
+    n_indexed = write_region_index(graph, output_gfa + ".regions")
+    if n_indexed:
+        logger.info(f"Indexed the stable coordinates of {n_indexed} nodes into {output_gfa}.regions")
+    else:
+        logger.info("No nodes with SN/SO tags, skipping the region index")
+
+    if graph.paths:
+        n_paths = write_path_index(graph, output_gfa + ".paths")
+        logger.info(f"Wrote the chunk runs of {n_paths} paths into {output_gfa}.paths")
+
+    logger.info(f"Writing the partition report into {output_gfa}.report.json")
+    write_report(partition_report(graph), output_gfa + ".report.json")
 
-def rev_comp(seq):
-    return seq[::-1].translate(complement)
\ No newline at end of file
+    if container:
+        logger.info(f"Packing the chunked graph and its indices into {output_gfa}.xgfa")
+        stats = {"source": os.path.basename(input_gfa), "n_nodes": len(graph), "n_chunks": n_chunks,
+                 "n_paths": len(graph.paths), "order": order, "weight": weight}
+        extra_files = {"REGIONS": output_gfa + ".regions", "PATHS": output_gfa + ".paths",
+                       "DISTANCE": output_gfa + ".dist", "BLOOM": output_gfa + ".bloom"}
+        if bubbles:
+            extra_files["BUBBLES"] = output_gfa + ".bubbles"
+        write_container(output_gfa + ".xgfa", output_gfa + ".gfa", graph.chunk_offsets, lengths,
+                        ((n, node.chunk_id) for n, node in graph.nodes.items()), stats,
+                        extra_files, summaries, node_info)